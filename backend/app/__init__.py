@@ -1,4 +0,0 @@
-from .plan import Plan
-from .user import User
-from .device import Device
-from .alert import Alert
\ No newline at end of file
@@ -1,19 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import List
-from app.db.session import get_db
+from datetime import datetime
+from app.db.session import get_db, get_read_db, is_sticky
 from app.core.security import get_current_user
-from app.schemas.alert import AlertCreate, AlertOut
+from app.schemas.alert import ESTADO_PATTERN, AlertCreate, AlertOut
 from app.db.models import Alert, Device, User
+from app.services.export import export_response, iter_alert_rows
 
 router = APIRouter()
 
 @router.get("/", response_model=List[AlertOut])
 async def list_alerts(
-    status: str | None = Query(None, regex="^(Aviso|Alerta Menor|Alerta Severa|Alerta Crítica)$"),
+    status: str | None = Query(None, regex=ESTADO_PATTERN),
     limit: int = Query(10, ge=1, le=20),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     query = db.query(Alert).join(Device).filter(Device.usuario_id == current_user.id)
@@ -23,6 +25,27 @@ async def list_alerts(
     
     return query.order_by(Alert.fecha.desc()).offset(offset).limit(limit).all()
 
+@router.get("/export")
+def export_alerts(
+    request: Request,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    gzip: bool = False,
+    equipo_id: int | None = None,
+    status: str | None = Query(None, regex=ESTADO_PATTERN),
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Exporta alertas en streaming (NDJSON o CSV) sin paginar ni construir
+    objetos ORM/Pydantic: memoria constante. `gzip=true` descarga un .gz; si
+    no, se comprime en tránsito cuando el cliente acepta gzip.
+    """
+    rows = iter_alert_rows(
+        current_user.id, equipo_id=equipo_id, estado=status, desde=desde, hasta=hasta, sticky=is_sticky(request)
+    )
+    return export_response(rows, format, gzip, filename="alertas", accept_encoding=request.headers.get("accept-encoding", ""))
+
 @router.post("/", response_model=AlertOut)
 async def create_alert(
     alert: AlertCreate,
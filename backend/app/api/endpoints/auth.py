@@ -24,7 +24,7 @@ async def login(
         )
     
     return {
-        "access_token": create_access_token(user.email),
+        "access_token": create_access_token(user.email, user.id),
         "refresh_token": create_refresh_token(user.email),
         "token_type": "bearer"
     }
@@ -48,7 +48,7 @@ async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
             )
         
         return {
-            "access_token": create_access_token(email),
+            "access_token": create_access_token(email, user.id),
             "refresh_token": create_refresh_token(email),
             "token_type": "bearer"
         }
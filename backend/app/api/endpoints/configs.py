@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from typing import List
+from app.core.celery_app import celery_app
+from app.db.session import get_db, get_read_db
+from app.core.security import get_current_user
+from app.schemas.config import ConfigVersionOut
+from app.db.models import Device, User
+from app.services.config_store import ConfigStore
+
+router = APIRouter()
+
+def _owned_device(db: Session, device_id: int, current_user: User) -> Device:
+    device = db.query(Device).filter(
+        Device.id == device_id,
+        Device.usuario_id == current_user.id
+    ).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    return device
+
+@router.get("/{device_id}/configs", response_model=List[ConfigVersionOut])
+async def list_config_versions(
+    device_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    _owned_device(db, device_id, current_user)
+    return ConfigStore(db).versions(device_id)
+
+@router.post("/{device_id}/configs", status_code=status.HTTP_202_ACCEPTED)
+async def backup_config_now(
+    device_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Encola un respaldo inmediato de la configuración"""
+    _owned_device(db, device_id, current_user)
+    celery_app.send_task("app.worker.backup_config_shard", args=[[device_id]], queue="monitor")
+    return {"ok": True}
+
+@router.get("/{device_id}/configs/diff", response_class=PlainTextResponse)
+async def diff_config_versions(
+    device_id: int,
+    from_version: int | None = Query(None, alias="from"),
+    to_version: int | None = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Diff unificado entre dos versiones (por defecto, las dos últimas)"""
+    _owned_device(db, device_id, current_user)
+    store = ConfigStore(db)
+    if from_version is None or to_version is None:
+        versions = store.versions(device_id)
+        if len(versions) < 2:
+            raise HTTPException(status_code=404, detail="No hay suficientes versiones para comparar")
+        to_version = to_version or versions[0].id
+        from_version = from_version or versions[1].id
+    old = store.get_version(device_id, from_version)
+    new = store.get_version(device_id, to_version)
+    if not old or not new:
+        raise HTTPException(status_code=404, detail="Versión no encontrada")
+    return store.diff(old, new)
+
+@router.get("/{device_id}/configs/{version_id}", response_class=PlainTextResponse)
+async def restore_config_version(
+    device_id: int,
+    version_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Export completo de una versión, listo para importar como .rsc"""
+    _owned_device(db, device_id, current_user)
+    store = ConfigStore(db)
+    version = store.get_version(device_id, version_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Versión no encontrada")
+    return PlainTextResponse(
+        store.restore(version),
+        headers={"Content-Disposition": f'attachment; filename="equipo-{device_id}-v{version_id}.rsc"'},
+    )
@@ -1,37 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from sqlalchemy import func
-from app.db.session import get_db
-from app.core.security import vault, get_current_user
-from app.schemas.device import DeviceCreate, DeviceUpdate, DeviceOut
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.session import get_db, get_read_db, is_sticky
+from app.core.security import vault, get_current_user, get_current_user_id
+from app.schemas.device import DeviceCreate, DeviceOut, DeviceStatusOut
 from app.db.models import Device, User, Plan
+from app.services.device_import import ImportJobStore, parse_csv, remaining_device_slots, validate_rows
+from app.services.device_state import DeviceStateCache
+from app.services.fair_share import FairShareQueue
+from app.services.export import export_response, iter_alert_rows
 
 router = APIRouter()
 
 def check_plan_limit(db: Session, user_id: int):
     """Verifica límite de dispositivos según el plan del usuario"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.plan_id:
-        raise HTTPException(status_code=400, detail="Usuario sin plan asignado")
-    
-    plan = db.query(Plan).filter(Plan.id == user.plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=400, detail="Plan no encontrado")
-        
-    if plan.max_equipos > 0:  # 0 = ilimitado
-        current_count = db.query(Device).filter(
-            Device.usuario_id == user_id
-        ).count()
-        if current_count >= plan.max_equipos:
-            raise HTTPException(
-                status_code=403, 
-                detail=f"Límite de {plan.max_equipos} dispositivos alcanzado"
-            )
+    try:
+        remaining = remaining_device_slots(db, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if remaining == 0:
+        plan = db.query(Plan).join(User, User.plan_id == Plan.id).filter(User.id == user_id).first()
+        raise HTTPException(
+            status_code=403,
+            detail=f"Límite de {plan.max_equipos} dispositivos alcanzado"
+        )
 
 @router.get("/", response_model=List[DeviceOut])
 async def list_devices(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     return db.query(Device).filter(Device.usuario_id == current_user.id).all()
@@ -50,17 +55,167 @@ async def create_device(
         ip=str(device.ip),
         puerto=device.puerto,
         usuario_mk_enc=vault.encrypt(device.usuario_mk),
-        password_mk_enc=vault.encrypt(device.password_mk)
+        password_mk_enc=vault.encrypt(device.password_mk),
+        intervalo_min=device.intervalo_min,
+        intervalo_max=device.intervalo_max,
+        colector=device.colector,
+        snmp_puerto=device.snmp_puerto,
+        raiz=device.raiz,
+        snmp_comunidad_enc=vault.encrypt(device.snmp_comunidad) if device.snmp_comunidad else None
     )
     db.add(db_device)
     db.commit()
     db.refresh(db_device)
     return db_device
 
+@router.post("/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_import_devices(
+    request: Request,
+    test_connections: bool = True,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Importación masiva desde JSON (lista de DeviceCreate o {"devices": [...]})
+    o CSV (text/csv o multipart con campo `file`). Valida aquí y delega la
+    prueba de conexión e inserción a la tarea import_devices.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Falta el archivo CSV en el campo 'file'")
+        rows = parse_csv((await upload.read()).decode("utf-8-sig"))
+    elif "csv" in content_type:
+        rows = parse_csv((await request.body()).decode("utf-8-sig"))
+    else:
+        payload = await request.json()
+        rows = payload.get("devices", []) if isinstance(payload, dict) else payload
+
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=400, detail="No se recibieron dispositivos")
+    if len(rows) > settings.BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {settings.BULK_IMPORT_MAX_ROWS} dispositivos por importación"
+        )
+
+    # Miles de cifrados Fernet y llamadas síncronas a Redis: fuera del event loop
+    return await run_in_threadpool(_queue_import, current_user.id, rows, test_connections)
+
+def _queue_import(usuario_id: int, rows: list, test_connections: bool) -> dict:
+    valid, invalid = validate_rows(rows)
+    job_id = uuid.uuid4().hex
+    ImportJobStore().create(job_id, usuario_id, total=len(rows), invalid=invalid)
+    if valid:
+        # send_task evita importar el worker (y su pila de dependencias) en la API
+        celery_app.send_task(
+            "app.worker.import_devices", args=[job_id, usuario_id, valid, test_connections]
+        )
+    else:
+        ImportJobStore().set_status(job_id, "done")
+    return {"job_id": job_id, "total": len(rows), "invalid": len(invalid)}
+
+def _get_import_job(job_id: str, current_user: User) -> dict:
+    progress = ImportJobStore().progress(job_id)
+    if not progress or progress["usuario_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    return progress
+
+@router.get("/bulk/{job_id}")
+def bulk_import_report(
+    job_id: str,
+    offset: int = 0,
+    current_user: User = Depends(get_current_user)
+):
+    """Progreso y resultado por fila (desde `offset`) de una importación"""
+    progress = _get_import_job(job_id, current_user)
+    return {**progress, "rows": ImportJobStore().results(job_id, offset)}
+
+@router.get("/bulk/{job_id}/stream")
+async def bulk_import_stream(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progreso en NDJSON: una línea por segundo con las filas nuevas hasta terminar"""
+    await run_in_threadpool(_get_import_job, job_id, current_user)
+    store = ImportJobStore()
+
+    async def events():
+        offset = 0
+        while True:
+            # ImportJobStore usa el cliente Redis síncrono: fuera del event loop
+            progress = await run_in_threadpool(store.progress, job_id)
+            if not progress:
+                return
+            rows = await run_in_threadpool(store.results, job_id, offset)
+            offset += len(rows)
+            yield json.dumps({**progress, "rows": rows}) + "\n"
+            if progress["status"] in ("done", "failed"):
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/status", response_model=List[DeviceStatusOut])
+def fleet_status(user_id: int = Depends(get_current_user_id)):
+    """Estado de toda la flota del usuario leído solo de la caché Redis"""
+    cache = DeviceStateCache()
+    return cache.get_many(cache.device_ids_for_user(user_id))
+
+@router.get("/{device_id}/status", response_model=DeviceStatusOut)
+def device_status(device_id: int, user_id: int = Depends(get_current_user_id)):
+    """Último estado del dispositivo sin tocar Postgres ni el router"""
+    state = DeviceStateCache().get(device_id)
+    if not state or state.get("usuario_id") != user_id:
+        raise HTTPException(status_code=404, detail="Sin estado disponible para el dispositivo")
+    return state
+
+@router.post("/{device_id}/ai-analysis", status_code=status.HTTP_202_ACCEPTED)
+async def request_ai_analysis(
+    device_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Encola un análisis de logs con IA en la cola justa del usuario; lo
+    despacha dispatch_ai_analysis según el peso y el cupo de su plan.
+    """
+    exists = db.query(Device.id).filter(
+        Device.id == device_id,
+        Device.usuario_id == current_user.id
+    ).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    pending = FairShareQueue(name="ai").push(current_user.id, device_id)
+    return {"equipo_id": device_id, "pendientes": pending}
+
+@router.get("/{device_id}/history/export")
+def export_device_history(
+    device_id: int,
+    request: Request,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    gzip: bool = False,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Historial de alertas de un dispositivo en streaming (ver /alerts/export)"""
+    exists = db.query(Device.id).filter(
+        Device.id == device_id,
+        Device.usuario_id == current_user.id
+    ).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    rows = iter_alert_rows(
+        current_user.id, equipo_id=device_id, desde=desde, hasta=hasta, sticky=is_sticky(request)
+    )
+    return export_response(
+        rows, format, gzip, filename=f"equipo-{device_id}", accept_encoding=request.headers.get("accept-encoding", "")
+    )
+
 @router.get("/{device_id}", response_model=DeviceOut)
 async def get_device(
     device_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     device = db.query(Device).filter(
@@ -85,4 +240,5 @@ async def delete_device(
         raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
     db.delete(device)
     db.commit()
+    DeviceStateCache().forget(device_id, current_user.id)
     return {"ok": True}
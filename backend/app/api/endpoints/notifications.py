@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import List
+from app.db.session import get_db, get_read_db
+from app.core.security import get_current_user
+from app.schemas.notification import DestinationCreate, DestinationOut
+from app.db.models import NotificationDestination, User
+from app.core.config import settings
+from app.services.notifications import NotificationPipeline, UnsafeDestination, resolve_webhook
+
+router = APIRouter()
+
+@router.get("/destinations", response_model=List[DestinationOut])
+async def list_destinations(
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    return db.query(NotificationDestination).filter(NotificationDestination.usuario_id == current_user.id).all()
+
+@router.post("/destinations", response_model=DestinationOut, status_code=status.HTTP_201_CREATED)
+async def create_destination(
+    destination: DestinationCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if destination.tipo == "webhook":
+        # También se comprueba en cada envío: el DNS puede cambiar después
+        try:
+            await run_in_threadpool(resolve_webhook, destination.destino)
+        except UnsafeDestination:
+            # Sin el motivo: distinguir "no resuelve" de "IP privada" revelaría la red interna
+            raise HTTPException(status_code=400, detail="El webhook debe resolver a una dirección pública")
+    db_destination = NotificationDestination(
+        usuario_id=current_user.id,
+        tipo=destination.tipo,
+        destino=destination.destino,
+        severidad_minima=destination.severidad_minima
+    )
+    db.add(db_destination)
+    db.commit()
+    db.refresh(db_destination)
+    return db_destination
+
+@router.delete("/destinations/{destination_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_destination(
+    destination_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    deleted = db.query(NotificationDestination).filter(
+        NotificationDestination.id == destination_id,
+        NotificationDestination.usuario_id == current_user.id
+    ).delete()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Destino no encontrado")
+    db.commit()
+
+@router.get("/dead-letters")
+async def list_dead_letters(
+    limit: int = Query(100, ge=1, le=settings.NOTIFY_DEAD_LETTER_MAXLEN),
+    current_user: User = Depends(get_current_user)
+):
+    """Digests del usuario que agotaron los reintentos de entrega"""
+    return NotificationPipeline().dead_letters(current_user.id, count=limit)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from .endpoints import auth, users, devices, alerts
+from .endpoints import auth, users, devices, alerts, configs, notifications
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(devices.router, prefix="/devices", tags=["devices"])
 api_router.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
+api_router.include_router(configs.router, prefix="/devices", tags=["configs"])
+api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
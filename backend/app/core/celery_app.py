@@ -4,14 +4,18 @@ from app.core.celery_config import beat_schedule
 
 celery_app = Celery(
     "worker",
-    broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0",
-    backend=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL
 )
 
 celery_app.conf.task_routes = {
     "app.worker.monitor_devices": "main-queue",
     "app.worker.analyze_device_logs_with_ai": "main-queue",
+    "app.worker.dispatch_ai_analysis": "main-queue",
     "app.worker.cleanup_old_alerts": "main-queue",
+    "app.worker.rotate_fernet_keys": "main-queue",
+    "app.worker.import_devices": "main-queue",
+    "app.worker.deliver_notifications": "main-queue",
 }
 
 celery_app.conf.beat_schedule = beat_schedule
\ No newline at end of file
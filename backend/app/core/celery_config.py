@@ -1,9 +1,35 @@
 from celery.schedules import crontab
+from app.core.config import settings
 
 beat_schedule = {
     "monitor-devices": {
         "task": "app.worker.poll_devices",
-        "schedule": crontab(minute="*/3"),  # Cada 3 minutos
+        # Tick del planificador: cada dispositivo se consulta según su propio intervalo
+        "schedule": float(settings.POLL_TICK_SECONDS),
+    },
+    "drain-ingest": {
+        "task": "app.worker.drain_ingest",
+        # Escritores de BD: vacían los streams de ingesta en transacciones por lote
+        "schedule": float(settings.INGEST_DRAIN_SECONDS),
+    },
+    "deliver-notifications": {
+        "task": "app.worker.deliver_notifications",
+        # Ventana de agrupación: un digest por usuario y destino por ejecución
+        "schedule": float(settings.NOTIFY_WINDOW_SECONDS),
+    },
+    "dispatch-ai-analysis": {
+        "task": "app.worker.dispatch_ai_analysis",
+        # Cola justa de análisis con IA: peso del plan y cupo por cliente
+        "schedule": float(settings.AI_DISPATCH_SECONDS),
+    },
+    "discover-topology": {
+        "task": "app.worker.discover_topology",
+        # Reconstruye el índice padre -> hijos para suprimir caídas en cascada
+        "schedule": float(settings.TOPOLOGY_DISCOVERY_INTERVAL),
+    },
+    "backup-device-configs": {
+        "task": "app.worker.backup_device_configs",
+        "schedule": crontab(hour=3, minute=0),  # Diario a las 3:00
     },
 }
 
@@ -7,6 +7,7 @@ class Settings(BaseSettings):
     DEBUG: bool = True
 
     SECRET_KEY: str
+    REFRESH_SECRET_KEY: str | None = None  # None = SECRET_KEY
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 30
     JWT_ALG: str = "HS256"
@@ -15,11 +16,111 @@ class Settings(BaseSettings):
     ARGON2_MEMORY_COST: int = 65536
     ARGON2_PARALLELISM: int = 2
 
-    FERNET_KEY: str
+    FERNET_KEY: str  # Varias claves separadas por comas durante una rotación
+    CREDENTIAL_CACHE_SIZE: int = 10000
+    CREDENTIAL_CACHE_TTL: int = 900
+    KEY_ROTATION_BATCH_SIZE: int = 1000
+
+    # Importación masiva de dispositivos
+    BULK_IMPORT_MAX_ROWS: int = 10000
+    BULK_IMPORT_CONCURRENCY: int = 50
+    BULK_IMPORT_RESULT_TTL: int = 86400
 
     DATABASE_URL: str
+    DATABASE_REPLICA_URL: str | None = None
+    READ_YOUR_WRITES_SECONDS: int = 5
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # Rate limiting (token bucket en Redis). Los límites por usuario salen
+    # del plan; estos son los valores por defecto
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_USER_PER_MINUTE: int = 300
+    RATE_LIMIT_USER_BURST: int = 60
+    RATE_LIMIT_IP_PER_MINUTE: int = 600
+    RATE_LIMIT_IP_BURST: int = 120
+    RATE_LIMIT_AUTH_PER_MINUTE: int = 10
+    RATE_LIMIT_AUTH_BURST: int = 5
+    RATE_LIMIT_TRUST_PROXY: bool = False
+    RATE_LIMIT_PLAN_CACHE_TTL: int = 300
+    RATE_LIMIT_PLAN_CACHE_SIZE: int = 10000
+
+    # Load shedding por espera en el pool de BD de cada proceso
+    LOAD_SHED_POOL_WAIT_MS: int = 200
+    LOAD_SHED_WINDOW: int = 10
+    LOAD_SHED_RETRY_AFTER: int = 5
+
+    # API de RouterOS: timeout de socket por conexión (segundos)
+    MIKROTIK_API_TIMEOUT: float = 10.0
+
+    # Circuit breaker por dispositivo (segundos)
+    CB_FAILURE_THRESHOLD: int = 2
+    CB_BASE_INTERVAL: int = 180
+    CB_MAX_INTERVAL: int = 3600
+    CB_PROBE_TTL: int = 120
+
+    # Reparto del ciclo de monitoreo entre workers
+    POLL_SHARDS: int = 16
+    POLL_ALERT_BATCH_SIZE: int = 200
+
+    # Planificador adaptativo (segundos)
+    POLL_TICK_SECONDS: int = 15
+    POLL_DEFAULT_INTERVAL: int = 180
+    POLL_MIN_INTERVAL: int = 60
+    POLL_MAX_INTERVAL: int = 900
+    POLL_JITTER: float = 0.1
+    POLL_CLAIM_TTL: int = 600
+    POLL_VOLATILITY_CPU_DELTA: int = 20
+
+    # Reparto justo entre clientes (el plan puede fijar peso y concurrencia)
+    FAIR_SHARE_DEFAULT_WEIGHT: float = 1.0
+    POLL_DISPATCH_MAX: int = 5000  # equipos despachados por tick (0 = sin límite)
+    POLL_TENANT_CONCURRENCY: int = 1000  # equipos en curso por cliente
+    AI_DISPATCH_SECONDS: int = 10
+    AI_DISPATCH_MAX: int = 20  # análisis con IA despachados por tick
+    AI_TENANT_CONCURRENCY: int = 2  # análisis en curso por cliente
+    AI_TASK_TTL: int = 300  # tras esto un análisis sin terminar libera su cupo
+
+    # Leases distribuidos (segundos)
+    POLL_CYCLE_LEASE_TTL: int = 60
+    POLL_DEVICE_LEASE_TTL: int = 120
+
+    # Ingesta: streams de Redis entre colectores y escritores de BD
+    INGEST_DRAIN_SECONDS: int = 5
+    INGEST_BATCH_SIZE: int = 500  # entradas del stream por transacción
+    INGEST_STREAM_MAXLEN: int = 50000  # tope duro de entradas por stream
+    INGEST_HIGH_WATERMARK: int = 20000  # por encima se descartan muestras y logs
+    INGEST_CLAIM_IDLE: int = 60
+    INGEST_MAX_DELIVERIES: int = 3  # después se reintenta entrada a entrada
+
+    # Descubrimiento de topología (/ip/neighbor), en segundos
+    TOPOLOGY_DISCOVERY_INTERVAL: int = 3600
+
+    # Colector SNMP (GETBULK v2c)
+    SNMP_TIMEOUT: float = 2.0
+    SNMP_RETRIES: int = 1
+    SNMP_MAX_REPETITIONS: int = 25
+    SNMP_CONCURRENCY: int = 1000
+
+    # Notificaciones: digests por usuario y destino cada NOTIFY_WINDOW_SECONDS
+    NOTIFY_WINDOW_SECONDS: int = 30
+    NOTIFY_BATCH_SIZE: int = 5000
+    NOTIFY_STREAM_MAXLEN: int = 100000
+    NOTIFY_DIGEST_MAX_ALERTS: int = 50
+    NOTIFY_MAX_ATTEMPTS: int = 6
+    NOTIFY_RETRY_BASE: int = 30
+    NOTIFY_RETRY_MAX: int = 3600
+    NOTIFY_CLAIM_IDLE: int = 300
+    NOTIFY_HTTP_TIMEOUT: float = 10.0
+    NOTIFY_CONCURRENCY: int = 20
+    NOTIFY_DEAD_LETTER_MAXLEN: int = 1000  # por usuario
+    NOTIFY_ALLOW_PRIVATE_WEBHOOKS: bool = False  # solo para instalaciones de un único cliente
+    SMTP_HOST: str | None = None
+    SMTP_PORT: int = 587
+    SMTP_USER: str | None = None
+    SMTP_PASSWORD: str | None = None
+    SMTP_FROM: str = "alertas@mikrotik-monitor.local"
+    SMTP_STARTTLS: bool = True
+
     BOOTSTRAP_ADMIN_EMAIL: str | None = None
     BOOTSTRAP_ADMIN_PASSWORD: str | None = None
     BOOTSTRAP_ADMIN_NAME: str | None = None
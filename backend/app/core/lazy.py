@@ -0,0 +1,36 @@
+"""
+Importación diferida de módulos pesados u opcionales.
+
+Cada proceso de uvicorn, cada hijo de Celery y cada contenedor autoescalado
+paga al arrancar todo lo que se importa a nivel de módulo. Las dependencias
+que solo usan algunas tareas (librouteros, requests, httpx...) se declaran con
+lazy_import y se cargan en el primer acceso a un atributo.
+"""
+import importlib
+import threading
+from types import ModuleType
+
+class LazyModule(ModuleType):
+    """Proxy de un módulo que lo importa (una sola vez, con lock) al primer uso"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._module = None
+
+    def _load(self) -> ModuleType:
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+def lazy_import(name: str) -> ModuleType:
+    return LazyModule(name)
@@ -0,0 +1,26 @@
+from typing import Optional
+
+import redis
+import redis.asyncio
+
+from app.core.config import settings
+
+_client: Optional[redis.Redis] = None
+_async_client: Optional[redis.asyncio.Redis] = None
+
+def get_redis() -> redis.Redis:
+    """
+    Cliente Redis compartido por proceso.
+    Se crea en el primer uso para no abrir conexiones al importar.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Cliente asyncio para el camino de las peticiones HTTP (middlewares)"""
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _async_client
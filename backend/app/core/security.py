@@ -2,13 +2,14 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from cryptography.fernet import Fernet, MultiFernet
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from app.core.config import settings
+# El vault vive en su propio módulo para que el worker no cargue FastAPI
+from app.core.vault import CredentialCache, FernetVault, vault  # noqa: F401
 from app.db.session import get_db
 from app.db.models import User
-import pytest
 
 # Configuración de hashing de contraseñas
 pwd_context = CryptContext(
@@ -22,34 +23,6 @@ pwd_context = CryptContext(
 # OAuth2 con soporte para JWT
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-# Fernet para encriptar credenciales
-class FernetVault:
-    def __init__(self, keys: list[bytes]):
-        """
-        Inicializa el vault con rotación de claves.
-        Primera clave = actual para encriptar.
-        Resto de claves = anteriores para decriptar.
-        """
-        if not keys:
-            raise ValueError("Al menos una clave Fernet es requerida")
-        self.fernet = MultiFernet([Fernet(k) for k in keys])
-        self._primary = Fernet(keys[0])
-
-    def encrypt(self, data: str) -> str:
-        """Encripta usando la clave primaria"""
-        return self._primary.encrypt(data.encode()).decode()
-
-    def decrypt(self, token: str) -> str:
-        """Decripta usando todas las claves disponibles"""
-        return self.fernet.decrypt(token.encode()).decode()
-
-    def rotate(self, token: str) -> str:
-        """Rota un token a la clave primaria"""
-        return self.fernet.rotate(token.encode()).decode()
-
-# Instancia global de FernetVault
-vault = FernetVault([settings.FERNET_KEY.encode()])
-
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -60,7 +33,8 @@ def create_token(
     subject: str, 
     expires_delta: timedelta,
     scope: str = "access",
-    secret_key: str = settings.SECRET_KEY
+    secret_key: str = settings.SECRET_KEY,
+    user_id: Optional[int] = None
 ) -> str:
     """Crea un token JWT con claims estándar"""
     now = datetime.now(timezone.utc)
@@ -71,20 +45,23 @@ def create_token(
         "exp": now + expires_delta,
         "nbf": now,
     }
-    return jwt.encode(claims, secret_key, settings.JWT_ALGORITHM)
+    if user_id is not None:
+        claims["uid"] = user_id
+    return jwt.encode(claims, secret_key, settings.JWT_ALG)
 
-def create_access_token(subject: str) -> str:
+def create_access_token(subject: str, user_id: Optional[int] = None) -> str:
     return create_token(
         subject=subject,
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        user_id=user_id
     )
 
 def create_refresh_token(subject: str) -> str:
     return create_token(
         subject=subject,
-        expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        expires_delta=timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES),
         scope="refresh",
-        secret_key=settings.REFRESH_SECRET_KEY
+        secret_key=settings.REFRESH_SECRET_KEY or settings.SECRET_KEY
     )
 
 def decode_token(
@@ -96,7 +73,7 @@ def decode_token(
         return jwt.decode(
             token,
             secret_key,
-            algorithms=[settings.JWT_ALGORITHM],
+            algorithms=[settings.JWT_ALG],
             options={"verify_exp": verify_exp}
         )
     except JWTError as e:
@@ -128,6 +105,22 @@ async def get_current_user(
         raise credentials_exception
     return user
 
+async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """
+    Id del usuario sacado solo del token, sin consultar Postgres. Para
+    endpoints que leen de Redis; los tokens sin claim `uid` (anteriores)
+    se rechazan y el cliente los renueva con /refresh.
+    """
+    payload = decode_token(token)
+    user_id = payload.get("uid")
+    if payload.get("scope") != "access" or not isinstance(user_id, int):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciales inválidas",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
+
 async def get_current_active_user(
     current_user = Depends(get_current_user)
 ):
@@ -140,46 +133,3 @@ async def get_current_active_user(
 
 ACCESS_TOKEN_EXPIRE_MINUTES=30
 REFRESH_TOKEN_EXPIRE_MINUTES=43200  # 30 días
-
-def test_password_hash():
-    password = "secretpassword123"
-    hashed = hash_password(password)
-    assert verify_password(password, hashed)
-    assert not verify_password("wrongpassword", hashed)
-
-def test_access_token():
-    email = "test@example.com"
-    token = create_access_token(email)
-    payload = decode_token(token)
-    assert payload["sub"] == email
-    assert payload["scope"] == "access"
-
-def test_refresh_token():
-    email = "test@example.com"
-    token = create_refresh_token(email)
-    payload = decode_token(
-        token, 
-        secret_key=settings.REFRESH_SECRET_KEY
-    )
-    assert payload["sub"] == email
-    assert payload["scope"] == "refresh"
-
-def test_token_expiration():
-    email = "test@example.com"
-    token = create_token(
-        subject=email,
-        expires_delta=timedelta(seconds=-1)
-    )
-    with pytest.raises(HTTPException):
-        decode_token(token)
-
-def test_fernet_vault():
-    secret = "mysecret123"
-    encrypted = vault.encrypt(secret)
-    assert encrypted != secret
-    decrypted = vault.decrypt(encrypted)
-    assert decrypted == secret
-
-    # Test rotación
-    rotated = vault.rotate(encrypted)
-    assert vault.decrypt(rotated) == secret
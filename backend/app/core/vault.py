@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from cryptography.fernet import Fernet, MultiFernet
+from app.core.config import settings
+
+class CredentialCache:
+    """
+    Caché LRU acotada con TTL de credenciales descifradas.
+    La clave es el propio token cifrado: al rotar la clave Fernet los
+    tokens cambian y las entradas antiguas dejan de usarse y caducan solas.
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return value
+
+    def set(self, token: str, value: str) -> None:
+        with self._lock:
+            self._data[token] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(token)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+# Fernet para encriptar credenciales
+class FernetVault:
+    def __init__(self, keys: list[bytes], cache: Optional[CredentialCache] = None):
+        """
+        Inicializa el vault con rotación de claves.
+        Primera clave = actual para encriptar.
+        Resto de claves = anteriores para decriptar.
+        """
+        if not keys:
+            raise ValueError("Al menos una clave Fernet es requerida")
+        self.fernet = MultiFernet([Fernet(k) for k in keys])
+        self._primary = Fernet(keys[0])
+        self.cache = cache
+
+    def encrypt(self, data: str) -> str:
+        """Encripta usando la clave primaria"""
+        return self._primary.encrypt(data.encode()).decode()
+
+    def decrypt(self, token: str) -> str:
+        """Decripta usando todas las claves disponibles"""
+        return self.fernet.decrypt(token.encode()).decode()
+
+    def decrypt_cached(self, token: str) -> str:
+        """Como decrypt, pero reutiliza el texto plano mientras siga en caché"""
+        if self.cache is None:
+            return self.decrypt(token)
+        value = self.cache.get(token)
+        if value is None:
+            value = self.decrypt(token)
+            self.cache.set(token, value)
+        return value
+
+    def rotate(self, token: str) -> str:
+        """Rota un token a la clave primaria"""
+        return self.fernet.rotate(token.encode()).decode()
+
+# Instancia global de FernetVault. FERNET_KEY admite varias claves separadas
+# por comas (nueva primero) para rotar sin perder acceso a los tokens antiguos
+vault = FernetVault(
+    [key.strip().encode() for key in settings.FERNET_KEY.split(",") if key.strip()],
+    cache=CredentialCache(settings.CREDENTIAL_CACHE_SIZE, settings.CREDENTIAL_CACHE_TTL),
+)
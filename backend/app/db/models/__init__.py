@@ -2,3 +2,7 @@ from .plan import Plan
 from .user import User
 from .device import Device
 from .alert import Alert
+from .config_snapshot import ConfigChunk, ConfigVersion
+from .notification import NotificationDestination
+from .topology import DeviceNeighbor
+from .telemetry import DeviceLog, HealthSample
@@ -11,5 +11,7 @@ class Alert(Base):
     titulo: Mapped[str] = mapped_column(String(100), nullable=False)
     descripcion: Mapped[str | None] = mapped_column(Text)
     fecha: Mapped[str] = mapped_column(TIMESTAMP, server_default=func.now())
+    # Id asignado por el colector: una alerta reprocesada desde el stream no se duplica
+    clave: Mapped[str | None] = mapped_column(String(32), unique=True)
 
     equipo = relationship("Device", back_populates="alertas")
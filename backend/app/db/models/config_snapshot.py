@@ -0,0 +1,23 @@
+from sqlalchemy import Integer, String, Text, LargeBinary, TIMESTAMP, ForeignKey, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base_class import Base
+
+class ConfigChunk(Base):
+    """Fragmento de /export comprimido con zstd, compartido entre versiones y equipos"""
+    __tablename__ = "config_fragmentos"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 del texto sin comprimir
+    datos: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    tamano: Mapped[int] = mapped_column(Integer, nullable=False)
+    lineas: Mapped[int] = mapped_column(Integer, nullable=False)
+
+class ConfigVersion(Base):
+    """Índice de versiones por equipo: lista ordenada de fragmentos"""
+    __tablename__ = "config_versiones"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    equipo_id: Mapped[int] = mapped_column(ForeignKey("equipos.id", ondelete="CASCADE"), index=True)
+    hash: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 del export completo
+    fragmentos: Mapped[str] = mapped_column(Text, nullable=False)  # hashes separados por comas
+    tamano: Mapped[int] = mapped_column(Integer, nullable=False)
+    fecha: Mapped[str] = mapped_column(TIMESTAMP, server_default=func.now())
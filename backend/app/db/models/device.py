@@ -1,19 +1,7 @@
-from sqlalchemy import Integer, String, Text, TIMESTAMP, ForeignKey, func
+from sqlalchemy import Integer, SmallInteger, String, Boolean, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base_class import Base
 
-class Alert(Base):
-    __tablename__ = "alertas"
-    
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    equipo_id: Mapped[int] = mapped_column(ForeignKey("equipos.id", ondelete="CASCADE"))
-    estado: Mapped[str] = mapped_column(String(20), nullable=False)
-    titulo: Mapped[str] = mapped_column(String(100), nullable=False)
-    descripcion: Mapped[str | None] = mapped_column(Text)
-    fecha: Mapped[str] = mapped_column(TIMESTAMP, server_default=func.now())
-
-    equipo = relationship("Device", back_populates="alertas")
-
 class Device(Base):
     __tablename__ = "equipos"
 
@@ -25,6 +13,15 @@ class Device(Base):
     usuario_mk_enc: Mapped[str] = mapped_column(String(255), nullable=False)
     password_mk_enc: Mapped[str] = mapped_column(String(255), nullable=False)
     activo: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Límites del intervalo de consulta en segundos (None = los del plan)
+    intervalo_min: Mapped[int | None] = mapped_column(Integer)
+    intervalo_max: Mapped[int | None] = mapped_column(Integer)
+    # Colector de salud: "api" (RouterOS API) o "snmp" (GETBULK v2c)
+    colector: Mapped[str] = mapped_column(String(10), default="api", server_default="api")
+    snmp_puerto: Mapped[int] = mapped_column(SmallInteger, default=161, server_default="161")
+    snmp_comunidad_enc: Mapped[str | None] = mapped_column(String(255))
+    # Raíz de la topología (uplink/core): los demás equipos cuelgan de ella
+    raiz: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
 
     usuario = relationship("User", back_populates="equipos")
     alertas = relationship("Alert", back_populates="equipo", cascade="all,delete")
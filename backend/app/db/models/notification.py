@@ -0,0 +1,14 @@
+from sqlalchemy import Integer, String, Boolean, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base_class import Base
+
+class NotificationDestination(Base):
+    __tablename__ = "destinos_notificacion"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    usuario_id: Mapped[int] = mapped_column(ForeignKey("usuarios.id", ondelete="CASCADE"), index=True)
+    tipo: Mapped[str] = mapped_column(String(10), nullable=False)  # "webhook" o "email"
+    destino: Mapped[str] = mapped_column(String(255), nullable=False)  # URL o dirección de correo
+    # Solo se notifican alertas de esta severidad o mayor (None = todas)
+    severidad_minima: Mapped[str | None] = mapped_column(String(20))
+    activo: Mapped[bool] = mapped_column(Boolean, default=True)
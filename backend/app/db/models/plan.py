@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, Numeric
+from sqlalchemy import Float, Integer, String, Numeric
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base_class import Base
 
@@ -10,3 +10,13 @@ class Plan(Base):
     max_equipos: Mapped[int] = mapped_column(Integer, nullable=False)  # 0 = ilimitado
     precio: Mapped[float] = mapped_column(Numeric(10,2), nullable=False)
     descripcion: Mapped[str | None] = mapped_column(String(200))
+    # Límites del intervalo de consulta en segundos (None = configuración global)
+    intervalo_min: Mapped[int | None] = mapped_column(Integer)
+    intervalo_max: Mapped[int | None] = mapped_column(Integer)
+    # Rate limit de la API por usuario (None = RATE_LIMIT_USER_*)
+    peticiones_minuto: Mapped[int | None] = mapped_column(Integer)
+    rafaga: Mapped[int | None] = mapped_column(Integer)
+    # Reparto justo (None = FAIR_SHARE_DEFAULT_WEIGHT / POLL_TENANT_CONCURRENCY):
+    # créditos por ronda en monitoreo e IA y equipos en curso del monitoreo
+    peso: Mapped[float | None] = mapped_column(Float)
+    concurrencia: Mapped[int | None] = mapped_column(Integer)
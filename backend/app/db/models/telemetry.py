@@ -0,0 +1,28 @@
+from sqlalchemy import JSON, Float, Integer, SmallInteger, String, Text, TIMESTAMP, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base_class import Base
+
+class HealthSample(Base):
+    """Muestra de salud de una consulta; la clave natural hace idempotente la ingesta"""
+    __tablename__ = "muestras_salud"
+
+    equipo_id: Mapped[int] = mapped_column(ForeignKey("equipos.id", ondelete="CASCADE"), primary_key=True)
+    fecha: Mapped[str] = mapped_column(TIMESTAMP, primary_key=True)
+    cpu_load: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    memoria_pct: Mapped[float] = mapped_column(Float, nullable=False)
+    uptime: Mapped[str | None] = mapped_column(String(50))
+    # [{name, running, rx_bytes, tx_bytes}] del colector SNMP; NULL con la API
+    interfaces: Mapped[list | None] = mapped_column(JSON)
+
+class DeviceLog(Base):
+    """Entrada de /log; `clave` deduplica las entradas repetidas entre consultas"""
+    __tablename__ = "logs_equipo"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    clave: Mapped[str] = mapped_column(String(40), unique=True, nullable=False)  # sha1 de equipo, hora y mensaje
+    equipo_id: Mapped[int] = mapped_column(ForeignKey("equipos.id", ondelete="CASCADE"), index=True)
+    hora: Mapped[str] = mapped_column(String(30), nullable=False)  # tal como la da RouterOS
+    topicos: Mapped[str | None] = mapped_column(String(100))
+    severidad: Mapped[str | None] = mapped_column(String(20))
+    mensaje: Mapped[str] = mapped_column(Text, nullable=False)
+    fecha: Mapped[str] = mapped_column(TIMESTAMP, nullable=False)  # primera consulta que la vio
@@ -0,0 +1,12 @@
+from sqlalchemy import String, TIMESTAMP, ForeignKey, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base_class import Base
+
+class DeviceNeighbor(Base):
+    """Adyacencia descubierta por /ip/neighbor entre dos equipos monitoreados"""
+    __tablename__ = "equipos_vecinos"
+
+    equipo_id: Mapped[int] = mapped_column(ForeignKey("equipos.id", ondelete="CASCADE"), primary_key=True)
+    vecino_id: Mapped[int] = mapped_column(ForeignKey("equipos.id", ondelete="CASCADE"), primary_key=True, index=True)
+    interfaz: Mapped[str | None] = mapped_column(String(50))
+    actualizado: Mapped[str] = mapped_column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
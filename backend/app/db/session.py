@@ -1,9 +1,133 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import redis
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+# fastapi.Request es esta misma clase; importar fastapi costaría ~0,5 s a cada worker
+from starlette.requests import Request
 from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.redis_client import get_async_redis, get_redis
+
+# Solo el camino HTTP decodifica tokens: el worker no paga la importación
+jwt = lazy_import("jose.jwt")
+
+logger = logging.getLogger(__name__)
+
+# Clave Redis por usuario mientras sus lecturas deben ir al primario
+STICKY_KEY = "mm:rw:primary_until:{uid}"
+# Cookie con la marca de tiempo hasta la que las lecturas van al primario
+# (respaldo para peticiones sin token)
+STICKY_COOKIE = "mm_primary_until"
+
+class WaitWindow:
+    """Esperas recientes (ventana deslizante en segundos) para medir saturación"""
+
+    def __init__(self, window: float = settings.LOAD_SHED_WINDOW):
+        self.window = window
+        self._samples: Deque[Tuple[float, float]] = deque()
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds))
+
+    def average_ms(self) -> float:
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            if not self._samples:
+                return 0.0
+            return sum(wait for _, wait in self._samples) / len(self._samples) * 1000
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión libre"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = WaitWindow()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits.add(time.perf_counter() - started)
+
+def _create_engine(url: str) -> Engine:
+    # SQLite usa sus propios pools (sin cola de espera)
+    if url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True)
+    return create_engine(url, pool_pre_ping=True, poolclass=TimedQueuePool)
+
+class DatabaseRouter:
+    """
+    Enruta sesiones entre el primario (escrituras) y una réplica opcional
+    (lecturas). Sin réplica configurada ambas apuntan al primario.
+    """
+
+    def __init__(self, primary_url: str, replica_url: Optional[str] = None):
+        self.engines: Dict[str, Engine] = {"primary": _create_engine(primary_url)}
+        if replica_url:
+            self.engines["replica"] = _create_engine(replica_url)
+        self._counters: Dict[str, Dict[str, int]] = {}
+        for name, engine in self.engines.items():
+            self._track(name, engine)
+
+        self.primary = self.engines["primary"]
+        self.replica = self.engines.get("replica", self.primary)
+        self.write_session = sessionmaker(bind=self.primary, autoflush=False, autocommit=False)
+        self.read_session = sessionmaker(bind=self.replica, autoflush=False, autocommit=False)
+
+    def session(self, readonly: bool = False, sticky: bool = False) -> Session:
+        """Sesión de réplica solo para lecturas sin escrituras recientes del cliente"""
+        if readonly and not sticky:
+            return self.read_session()
+        return self.write_session()
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    def _track(self, name: str, engine: Engine) -> None:
+        counters = self._counters[name] = {"connects": 0, "checkouts": 0}
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(*_):
+            counters["connects"] += 1
+
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(*_):
+            counters["checkouts"] += 1
+
+    def pool_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Estado del pool de cada engine (los pools sin QueuePool no exponen todo)"""
+        metrics = {}
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            metrics[name] = {"pool": type(pool).__name__, **self._counters[name]}
+            for metric, attr in (("size", "size"), ("checked_in", "checkedin"),
+                                 ("checked_out", "checkedout"), ("overflow", "overflow")):
+                value = getattr(pool, attr, None)
+                metrics[name][metric] = value() if callable(value) else value
+            waits = getattr(pool, "waits", None)
+            metrics[name]["wait_ms"] = round(waits.average_ms(), 2) if waits else None
+        return metrics
+
+    def pool_wait_ms(self) -> float:
+        """Espera media reciente por conexión del engine más saturado"""
+        return max(
+            (engine.pool.waits.average_ms() for engine in self.engines.values() if hasattr(engine.pool, "waits")),
+            default=0.0,
+        )
+
+db_router = DatabaseRouter(settings.DATABASE_URL, settings.DATABASE_REPLICA_URL)
+engine = db_router.primary
+SessionLocal = db_router.write_session
+ReadSessionLocal = db_router.read_session
 
 def get_db():
     db = SessionLocal()
@@ -11,3 +135,63 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def token_user_id(request: Request) -> Optional[int]:
+    """`uid` del token Bearer si la firma es válida (sin tocar la BD)"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALG])
+    except jwt.JWTError:
+        return None
+    user_id = payload.get("uid")
+    return user_id if isinstance(user_id, int) else None
+
+def is_sticky(request: Request) -> bool:
+    """
+    True si el cliente escribió hace menos de READ_YOUR_WRITES_SECONDS.
+    Se decide por el usuario del token (los clientes de la API no devuelven
+    cookies); la cookie queda como respaldo para peticiones sin token.
+    """
+    user_id = token_user_id(request)
+    if user_id is not None:
+        try:
+            if get_redis().exists(STICKY_KEY.format(uid=user_id)):
+                return True
+        except redis.RedisError as e:
+            # Sin saber si escribió, el primario es la lectura segura
+            logger.warning(f"Read-your-writes state unavailable, reading from primary: {str(e)}")
+            return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_read_db(request: Request):
+    """Sesión para endpoints de solo lectura: réplica salvo lectura-tras-escritura"""
+    db = db_router.session(readonly=True, sticky=is_sticky(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """Tras una mutación correcta, fija las lecturas de ese usuario al primario"""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        user_id = token_user_id(request)
+        if user_id is not None:
+            try:
+                await get_async_redis().set(
+                    STICKY_KEY.format(uid=user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS
+                )
+            except redis.RedisError as e:
+                logger.warning(f"Could not record write for user {user_id}: {str(e)}")
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(time.time() + settings.READ_YOUR_WRITES_SECONDS),
+            max_age=settings.READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+        )
+    return response
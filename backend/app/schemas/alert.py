@@ -1,11 +1,12 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
 
-ESTADOS = ("Aviso","Alerta Menor","Alerta Severa","Alerta Crítica")
+ESTADOS = ("Aviso", "Alerta Menor", "Alerta Mayor", "Alerta Severa", "Alerta Crítica")
+ESTADO_PATTERN = f"^({'|'.join(ESTADOS)})$"
 
 class AlertCreate(BaseModel):
     equipo_id: int
-    estado: str = Field(..., pattern="^(Aviso|Alerta Menor|Alerta Severa|Alerta Crítica)$")
+    estado: str = Field(..., pattern=ESTADO_PATTERN)
     titulo: str
     descripcion: str | None = None
 
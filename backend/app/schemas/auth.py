@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+class Token(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
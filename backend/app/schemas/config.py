@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class ConfigVersionOut(BaseModel):
+    id: int
+    equipo_id: int
+    hash: str
+    tamano: int
+    fecha: datetime
+    class Config:
+        from_attributes = True
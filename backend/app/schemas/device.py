@@ -1,4 +1,6 @@
-from pydantic import BaseModel, Field, IPvAnyAddress, field_validator
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, Field, IPvAnyAddress, field_validator, model_validator
 
 class DeviceCreate(BaseModel):
     nombre: str = Field(..., min_length=2, max_length=100)
@@ -6,6 +8,18 @@ class DeviceCreate(BaseModel):
     puerto: int = Field(8728, ge=1, le=65535)
     usuario_mk: str = Field(..., min_length=1, max_length=50)
     password_mk: str = Field(..., min_length=1, max_length=255)
+    intervalo_min: int | None = Field(None, ge=30, le=86400)
+    intervalo_max: int | None = Field(None, ge=30, le=86400)
+    colector: Literal["api", "snmp"] = "api"
+    snmp_puerto: int = Field(161, ge=1, le=65535)
+    snmp_comunidad: str | None = Field(None, min_length=1, max_length=64)
+    raiz: bool = False
+
+    @model_validator(mode="after")
+    def check_snmp_community(self):
+        if self.colector == "snmp" and not self.snmp_comunidad:
+            raise ValueError("snmp_comunidad es obligatoria con colector snmp")
+        return self
 
 class DeviceOut(BaseModel):
     id: int
@@ -13,5 +27,33 @@ class DeviceOut(BaseModel):
     ip: str
     puerto: int
     activo: bool
+    intervalo_min: int | None = None
+    intervalo_max: int | None = None
+    colector: str = "api"
+    snmp_puerto: int = 161
+    raiz: bool = False
     class Config:
         from_attributes = True
+
+class InterfaceStatus(BaseModel):
+    name: str
+    running: bool
+    rx_bytes: int | None = None
+    tx_bytes: int | None = None
+
+class DeviceStatusOut(BaseModel):
+    """Último estado cacheado en Redis (ver DeviceStateCache)"""
+    device_id: int
+    reachable: bool
+    cpu_load: int | None = None
+    memory_used_pct: float | None = None
+    uptime: str | None = None
+    version: str | None = None
+    board_name: str | None = None
+    severity: str | None = None
+    last_seen: datetime | None = None
+    checked_at: datetime | None = None
+    # Contadores por interfaz (solo colector SNMP)
+    interfaces: list[InterfaceStatus] | None = None
+    # Id del equipo padre caído: no se consultó por estar detrás de él
+    unreachable_via: int | None = None
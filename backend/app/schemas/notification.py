@@ -0,0 +1,24 @@
+from typing import Literal
+from pydantic import BaseModel, Field, model_validator
+
+class DestinationCreate(BaseModel):
+    tipo: Literal["webhook", "email"]
+    destino: str = Field(..., min_length=3, max_length=255)
+    severidad_minima: Literal["Aviso", "Alerta Menor", "Alerta Mayor", "Alerta Severa", "Alerta Crítica"] | None = None
+
+    @model_validator(mode="after")
+    def check_destino(self):
+        if self.tipo == "webhook" and not self.destino.startswith(("http://", "https://")):
+            raise ValueError("El webhook debe ser una URL http(s)")
+        if self.tipo == "email" and "@" not in self.destino:
+            raise ValueError("Dirección de correo inválida")
+        return self
+
+class DestinationOut(BaseModel):
+    id: int
+    tipo: str
+    destino: str
+    severidad_minima: str | None
+    activo: bool
+    class Config:
+        from_attributes = True
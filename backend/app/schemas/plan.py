@@ -1,10 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class PlanBase(BaseModel):
     nombre: str
     max_equipos: int
     precio: float
     descripcion: str | None = None
+    intervalo_min: int | None = None
+    intervalo_max: int | None = None
+    peticiones_minuto: int | None = None
+    rafaga: int | None = None
+    peso: float | None = Field(None, ge=0.01)
+    concurrencia: int | None = Field(None, ge=1)
 
 class PlanOut(PlanBase):
     id: int
@@ -0,0 +1,127 @@
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Fallo atómico: varios pollers pueden registrar fallos del mismo equipo a la vez.
+# KEYS: estado, permiso de sondeo[, fence del lease]. ARGV: umbral, base,
+# máximo, ahora, ttl del estado[, fence esperado]. Con un fence ajeno no se toca nada
+_RECORD_FAILURE = """
+if KEYS[3] and redis.call('get', KEYS[3]) ~= ARGV[6] then
+    return {0, 0, 0}
+end
+local failures = redis.call('hincrby', KEYS[1], 'failures', 1)
+local opens = 0
+local interval = 0
+if failures >= tonumber(ARGV[1]) then
+    opens = redis.call('hincrby', KEYS[1], 'opens', 1)
+    interval = math.min(tonumber(ARGV[2]) * 2 ^ (opens - 1), tonumber(ARGV[3]))
+    redis.call('hset', KEYS[1], 'open_until', tostring(tonumber(ARGV[4]) + interval))
+end
+redis.call('expire', KEYS[1], ARGV[5])
+redis.call('del', KEYS[2])
+return {failures, opens, math.floor(interval)}
+"""
+
+# KEYS: estado, permiso de sondeo[, fence del lease]. ARGV: [fence esperado]
+_RECORD_SUCCESS = """
+if KEYS[3] and redis.call('get', KEYS[3]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('del', KEYS[1], KEYS[2])
+"""
+
+class DeviceCircuitBreaker:
+    """
+    Circuit breaker por dispositivo con estado compartido en Redis.
+
+    - closed: el dispositivo se consulta normalmente.
+    - open: tras `failure_threshold` fallos consecutivos se omite el
+      dispositivo hasta `open_until`. Cada apertura duplica el intervalo
+      (base * 2^(aperturas-1)) hasta `max_interval`.
+    - half-open: vencido el intervalo, un único worker obtiene el permiso
+      de sondeo (SET NX); si tiene éxito el circuito se cierra, si falla
+      se vuelve a abrir con un intervalo mayor.
+    """
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        failure_threshold: int = settings.CB_FAILURE_THRESHOLD,
+        base_interval: int = settings.CB_BASE_INTERVAL,
+        max_interval: int = settings.CB_MAX_INTERVAL,
+        probe_ttl: int = settings.CB_PROBE_TTL,
+        clock: Callable[[], float] = time.time,
+        prefix: str = "mm:cb",
+    ):
+        self.client = client or get_redis()
+        self.failure_threshold = failure_threshold
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.probe_ttl = probe_ttl
+        self.clock = clock
+        self.prefix = prefix
+        self._record_failure = self.client.register_script(_RECORD_FAILURE)
+        self._record_success = self.client.register_script(_RECORD_SUCCESS)
+
+    def _key(self, device_id: int) -> str:
+        return f"{self.prefix}:{device_id}"
+
+    def _probe_key(self, device_id: int) -> str:
+        return f"{self.prefix}:{device_id}:probe"
+
+    def state(self, device_id: int) -> str:
+        """Devuelve 'closed', 'open' o 'half_open' sin modificar el estado"""
+        open_until = self.client.hget(self._key(device_id), "open_until")
+        if not open_until:
+            return "closed"
+        if self.clock() < float(open_until):
+            return "open"
+        return "half_open"
+
+    def allow(self, device_id: int) -> bool:
+        """
+        Indica si el dispositivo debe consultarse en este ciclo.
+        En half-open solo un worker obtiene True (sondeo único).
+        """
+        state = self.state(device_id)
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        acquired = self.client.set(self._probe_key(device_id), "1", nx=True, ex=self.probe_ttl)
+        if acquired:
+            logger.info(f"Circuit half-open for device {device_id}, probing")
+        return bool(acquired)
+
+    def _keys(self, device_id: int, fence: Optional[Tuple[str, int]]) -> List[str]:
+        keys = [self._key(device_id), self._probe_key(device_id)]
+        return keys + [fence[0]] if fence else keys
+
+    def record_success(self, device_id: int, fence: Optional[Tuple[str, int]] = None) -> None:
+        """
+        Cierra el circuito y reinicia contadores. `fence` (clave, valor) del
+        lease del equipo: si otro worker lo tomó después, no se registra.
+        """
+        self._record_success(keys=self._keys(device_id, fence), args=[fence[1]] if fence else [])
+
+    def record_failure(self, device_id: int, fence: Optional[Tuple[str, int]] = None) -> int:
+        """
+        Registra un fallo y abre el circuito si se alcanza el umbral.
+        Devuelve el número de fallos consecutivos (1 = inicio de la caída),
+        o 0 sin registrar nada si `fence` ya no es el vigente.
+        """
+        # El estado expira solo si el dispositivo deja de consultarse
+        args = [self.failure_threshold, self.base_interval, self.max_interval, self.clock(), self.max_interval * 4]
+        if fence:
+            args.append(fence[1])
+        failures, opens, interval = self._record_failure(keys=self._keys(device_id, fence), args=args)
+        if opens:
+            logger.warning(f"Circuit open for device {device_id} during {interval}s (opening #{opens})")
+        return failures
@@ -0,0 +1,182 @@
+import difflib
+import hashlib
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import zstandard
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db.models import ConfigChunk, ConfigVersion
+
+# Fragmentación por contenido a nivel de línea: un fragmento termina en una
+# línea cuyo hash cumple la máscara. Insertar o borrar líneas solo cambia los
+# fragmentos afectados, el resto conserva su hash y no se vuelve a guardar.
+CHUNK_MASK = 0x1F  # ~32 líneas por fragmento
+MIN_CHUNK_LINES = 8
+MAX_CHUNK_LINES = 256
+
+_compressor = zstandard.ZstdCompressor(level=10)
+_decompressor = zstandard.ZstdDecompressor()
+
+def chunk_lines(lines: Sequence[str]) -> List[List[str]]:
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    for line in lines:
+        current.append(line)
+        boundary = (zlib.crc32(line.encode()) & CHUNK_MASK) == 0
+        if (boundary and len(current) >= MIN_CHUNK_LINES) or len(current) >= MAX_CHUNK_LINES:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+def normalize_export(text: str) -> List[str]:
+    """
+    Líneas del export sin la cabecera con fecha/hora, que cambia en cada
+    ejecución y rompería la deduplicación de versiones idénticas.
+    """
+    lines = text.splitlines(keepends=True)
+    while lines and lines[0].startswith("# ") and (" by RouterOS" in lines[0] or lines[0][2:4].isdigit()):
+        lines.pop(0)
+    return lines
+
+def _sha256(data: str) -> str:
+    return hashlib.sha256(data.encode()).hexdigest()
+
+class ConfigStore:
+    """Almacén de snapshots de configuración deduplicado por fragmentos"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def save(self, device_id: int, export: str) -> ConfigVersion:
+        """
+        Guarda una versión. Si coincide con la última del equipo no crea
+        nada; solo se insertan los fragmentos que no existían.
+        """
+        lines = normalize_export(export)
+        content_hash = _sha256("".join(lines))
+        latest = self.latest(device_id)
+        if latest and latest.hash == content_hash:
+            return latest
+
+        ordered = [(_sha256("".join(chunk)), chunk) for chunk in chunk_lines(lines)]
+        hashes = [chunk_hash for chunk_hash, _ in ordered]
+        chunks = dict(ordered)
+        known = {
+            row.hash for row in self.db.query(ConfigChunk.hash).filter(ConfigChunk.hash.in_(list(chunks)))
+        }
+        new_chunks = []
+        for chunk_hash, chunk in chunks.items():
+            if chunk_hash in known:
+                continue
+            raw = "".join(chunk).encode()
+            new_chunks.append({
+                "hash": chunk_hash, "datos": _compressor.compress(raw), "tamano": len(raw), "lineas": len(chunk)
+            })
+        if new_chunks:
+            self.db.execute(self._insert_ignore(), new_chunks)
+
+        version = ConfigVersion(
+            equipo_id=device_id, hash=content_hash, fragmentos=",".join(hashes),
+            tamano=sum(len(line.encode()) for line in lines),
+        )
+        self.db.add(version)
+        self.db.commit()
+        return version
+
+    def _insert_ignore(self):
+        """INSERT que ignora fragmentos guardados a la vez por otro worker"""
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            return pg_insert(ConfigChunk).on_conflict_do_nothing(index_elements=["hash"])
+        if dialect == "sqlite":
+            return sqlite_insert(ConfigChunk).on_conflict_do_nothing(index_elements=["hash"])
+        return insert(ConfigChunk)
+
+    def latest(self, device_id: int) -> Optional[ConfigVersion]:
+        return (
+            self.db.query(ConfigVersion)
+            .filter(ConfigVersion.equipo_id == device_id)
+            .order_by(ConfigVersion.id.desc())
+            .first()
+        )
+
+    def versions(self, device_id: int) -> List[ConfigVersion]:
+        return (
+            self.db.query(ConfigVersion)
+            .filter(ConfigVersion.equipo_id == device_id)
+            .order_by(ConfigVersion.id.desc())
+            .all()
+        )
+
+    def get_version(self, device_id: int, version_id: int) -> Optional[ConfigVersion]:
+        return self.db.query(ConfigVersion).filter(
+            ConfigVersion.id == version_id, ConfigVersion.equipo_id == device_id
+        ).first()
+
+    def _chunks(self, hashes: Iterable[str]) -> Dict[str, List[str]]:
+        """Descomprime solo los fragmentos pedidos"""
+        wanted = set(hashes)
+        if not wanted:
+            return {}
+        rows = self.db.query(ConfigChunk.hash, ConfigChunk.datos).filter(ConfigChunk.hash.in_(wanted))
+        return {
+            row.hash: _decompressor.decompress(row.datos).decode().splitlines(keepends=True)
+            for row in rows
+        }
+
+    def _line_counts(self, hashes: Iterable[str]) -> Dict[str, int]:
+        rows = self.db.query(ConfigChunk.hash, ConfigChunk.lineas).filter(ConfigChunk.hash.in_(set(hashes)))
+        return {row.hash: row.lineas for row in rows}
+
+    def restore(self, version: ConfigVersion) -> str:
+        """Reconstruye el export completo de una versión"""
+        hashes = version.fragmentos.split(",") if version.fragmentos else []
+        chunks = self._chunks(hashes)
+        return "".join("".join(chunks[chunk_hash]) for chunk_hash in hashes)
+
+    def diff(self, old: ConfigVersion, new: ConfigVersion) -> str:
+        """
+        Diff unificado entre dos versiones. Los fragmentos comunes se comparan
+        por hash y no se descomprimen: solo se leen las zonas que cambian.
+        """
+        old_hashes = old.fragmentos.split(",") if old.fragmentos else []
+        new_hashes = new.fragmentos.split(",") if new.fragmentos else []
+        matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+        opcodes = [op for op in matcher.get_opcodes() if op[0] != "equal"]
+        if not opcodes:
+            return ""
+
+        counts = self._line_counts(old_hashes + new_hashes)
+        changed = [h for _, i1, i2, j1, j2 in opcodes for h in old_hashes[i1:i2] + new_hashes[j1:j2]]
+        chunks = self._chunks(changed)
+
+        output = [f"--- version {old.id}\n", f"+++ version {new.id}\n"]
+        for _, i1, i2, j1, j2 in opcodes:
+            old_offset = sum(counts[h] for h in old_hashes[:i1])
+            new_offset = sum(counts[h] for h in new_hashes[:j1])
+            old_lines = [line for h in old_hashes[i1:i2] for line in chunks[h]]
+            new_lines = [line for h in new_hashes[j1:j2] for line in chunks[h]]
+            output.extend(_hunks(old_lines, new_lines, old_offset, new_offset))
+        return "".join(output)
+
+def _start(offset: int, count: int) -> int:
+    """Línea inicial de un rango del hunk: con 0 líneas es la anterior (como diff -U0)"""
+    return offset + 1 if count else offset
+
+def _hunks(old_lines: List[str], new_lines: List[str], old_offset: int, new_offset: int) -> List[str]:
+    """Hunks de una región cambiada con números de línea absolutos"""
+    output: List[str] = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        output.append(f"@@ -{_start(old_offset + i1, i2 - i1)},{i2 - i1} +{_start(new_offset + j1, j2 - j1)},{j2 - j1} @@\n")
+        output.extend(f"-{line}" if line.endswith("\n") else f"-{line}\n" for line in old_lines[i1:i2])
+        output.extend(f"+{line}" if line.endswith("\n") else f"+{line}\n" for line in new_lines[j1:j2])
+    return output
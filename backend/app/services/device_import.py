@@ -0,0 +1,245 @@
+import csv
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import redis
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.redis_client import get_redis
+from app.core.vault import vault
+from app.db.models import Device, Plan, User
+from app.schemas.device import DeviceCreate
+
+# Solo los usa la validación de conexiones: no se cargan al importar la API
+snmp = lazy_import("app.services.snmp")
+mikrotik = lazy_import("app.services.mikrotik")
+
+logger = logging.getLogger(__name__)
+
+def remaining_device_slots(db: Session, user_id: int) -> Optional[int]:
+    """
+    Dispositivos que el usuario aún puede dar de alta según su plan.
+    None = ilimitado. ValueError si no tiene plan.
+    """
+    row = (
+        db.query(Plan.max_equipos)
+        .join(User, User.plan_id == Plan.id)
+        .filter(User.id == user_id)
+        .first()
+    )
+    if row is None:
+        raise ValueError("Usuario sin plan asignado")
+    if row.max_equipos == 0:  # 0 = ilimitado
+        return None
+    current_count = db.query(Device).filter(Device.usuario_id == user_id).count()
+    return max(row.max_equipos - current_count, 0)
+
+def parse_csv(text: str) -> List[Dict[str, Any]]:
+    """
+    Filas del CSV como dicts; columnas vacías se omiten.
+    Cabecera: nombre,ip,puerto,usuario_mk,password_mk[,intervalo_min,intervalo_max,
+    colector,snmp_puerto,snmp_comunidad,raiz]
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    return [{k.strip(): v.strip() for k, v in row.items() if k and v not in (None, "")} for row in reader]
+
+def validate_rows(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Valida cada fila con DeviceCreate y cifra sus credenciales, para que el
+    mensaje de Celery nunca lleve contraseñas en claro. Una IP y puerto
+    repetidos en el mismo archivo se importan solo la primera vez.
+    Devuelve (filas válidas, informe de filas inválidas).
+    """
+    valid: List[Dict[str, Any]] = []
+    invalid: List[Dict[str, Any]] = []
+    seen: Dict[Tuple[str, int], int] = {}
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            invalid.append({"row": index, "nombre": None, "status": "invalid", "detail": "La fila debe ser un objeto"})
+            continue
+        try:
+            device = DeviceCreate.model_validate(row)
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            invalid.append({"row": index, "nombre": row.get("nombre"), "status": "invalid", "detail": errors})
+            continue
+        address = (str(device.ip), device.puerto)
+        if address in seen:
+            invalid.append({"row": index, "nombre": device.nombre, "status": "duplicate",
+                            "detail": f"Misma IP y puerto que la fila {seen[address]}"})
+            continue
+        seen[address] = index
+        valid.append({
+            "row": index,
+            "nombre": device.nombre,
+            "ip": str(device.ip),
+            "puerto": device.puerto,
+            "usuario_mk_enc": vault.encrypt(device.usuario_mk),
+            "password_mk_enc": vault.encrypt(device.password_mk),
+            "intervalo_min": device.intervalo_min,
+            "intervalo_max": device.intervalo_max,
+            "colector": device.colector,
+            "snmp_puerto": device.snmp_puerto,
+            "snmp_comunidad_enc": vault.encrypt(device.snmp_comunidad) if device.snmp_comunidad else None,
+            "raiz": device.raiz,
+        })
+    return valid, invalid
+
+class ImportJobStore:
+    """Progreso e informe por fila de cada importación en Redis"""
+
+    def __init__(self, client: Optional[redis.Redis] = None, prefix: str = "mm:import"):
+        self.client = client or get_redis()
+        self.prefix = prefix
+        self.ttl = settings.BULK_IMPORT_RESULT_TTL
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _rows_key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}:rows"
+
+    def create(self, job_id: str, usuario_id: int, total: int, invalid: List[Dict[str, Any]]) -> None:
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(job_id), mapping={
+            "usuario_id": usuario_id, "status": "pending", "total": total, "processed": len(invalid),
+        })
+        if invalid:
+            pipe.rpush(self._rows_key(job_id), *(json.dumps(row) for row in invalid))
+        pipe.expire(self._key(job_id), self.ttl)
+        pipe.expire(self._rows_key(job_id), self.ttl)
+        pipe.execute()
+
+    def set_status(self, job_id: str, status: str) -> None:
+        self.client.hset(self._key(job_id), "status", status)
+
+    def add_results(self, job_id: str, results: List[Dict[str, Any]], processed: int = 0) -> None:
+        """Añade filas al informe y avanza el contador de filas procesadas"""
+        pipe = self.client.pipeline()
+        if results:
+            pipe.rpush(self._rows_key(job_id), *(json.dumps(row) for row in results))
+            pipe.expire(self._rows_key(job_id), self.ttl)
+        if processed:
+            pipe.hincrby(self._key(job_id), "processed", processed)
+        pipe.execute()
+
+    def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {
+            "job_id": job_id,
+            "usuario_id": int(raw["usuario_id"]),
+            "status": raw["status"],
+            "total": int(raw["total"]),
+            "processed": int(raw["processed"]),
+        }
+
+    def results(self, job_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        return [json.loads(row) for row in self.client.lrange(self._rows_key(job_id), offset, -1)]
+
+def _existing_addresses(db: Session, usuario_id: int, rows: List[Dict[str, Any]]) -> Set[Tuple[str, int]]:
+    """(ip, puerto) de las filas que el usuario ya tiene dados de alta"""
+    ips = {row["ip"] for row in rows}
+    existing = db.query(Device.ip, Device.puerto).filter(Device.usuario_id == usuario_id, Device.ip.in_(ips))
+    return {(ip, puerto) for ip, puerto in existing}
+
+def _test_row(row: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    try:
+        if row.get("colector") == "snmp":
+            snmp.get_health(SimpleNamespace(
+                id=row["row"], ip=row["ip"], snmp_puerto=row["snmp_puerto"],
+                snmp_comunidad_enc=row["snmp_comunidad_enc"],
+            ))
+            return row, None
+        mikrotik.test_mikrotik_connection(
+            row["ip"], row["puerto"],
+            vault.decrypt(row["usuario_mk_enc"]), vault.decrypt(row["password_mk_enc"]),
+        )
+        return row, None
+    except Exception as e:
+        return row, str(e)
+
+def run_device_import(
+    db: Session,
+    store: ImportJobStore,
+    job_id: str,
+    usuario_id: int,
+    rows: List[Dict[str, Any]],
+    test_connections: bool = True,
+) -> Dict[str, int]:
+    """
+    Descarta los equipos que el usuario ya tiene, prueba credenciales en
+    paralelo (pool acotado), comprueba el plan una sola vez e inserta todas
+    las filas válidas en un único INSERT masivo.
+    """
+    store.set_status(job_id, "running")
+    total = len(rows)
+    try:
+        remaining = remaining_device_slots(db, usuario_id)
+    except ValueError as e:
+        store.add_results(job_id, [
+            {"row": row["row"], "nombre": row["nombre"], "status": "rejected", "detail": str(e)} for row in rows
+        ], processed=len(rows))
+        store.set_status(job_id, "failed")
+        return {"created": 0, "failed": len(rows)}
+
+    existing = _existing_addresses(db, usuario_id, rows)
+    if existing:
+        duplicates = [row for row in rows if (row["ip"], row["puerto"]) in existing]
+        rows = [row for row in rows if (row["ip"], row["puerto"]) not in existing]
+        store.add_results(job_id, [
+            {"row": row["row"], "nombre": row["nombre"], "status": "duplicate",
+             "detail": "Ya existe un dispositivo con esa IP y puerto"}
+            for row in duplicates
+        ], processed=len(duplicates))
+
+    reachable: List[Dict[str, Any]] = []
+    report: List[Dict[str, Any]] = []
+    if test_connections:
+        tested = 0
+        with ThreadPoolExecutor(max_workers=settings.BULK_IMPORT_CONCURRENCY) as pool:
+            for row, error in pool.map(_test_row, rows):
+                tested += 1
+                if error:
+                    report.append({"row": row["row"], "nombre": row["nombre"], "status": "unreachable", "detail": error})
+                else:
+                    reachable.append(row)
+                # Progreso por lotes para no escribir en Redis en cada fila
+                if tested % 50 == 0:
+                    store.add_results(job_id, report, processed=50)
+                    report = []
+        store.add_results(job_id, report, processed=tested % 50)
+        report = []
+    else:
+        reachable = rows
+        store.add_results(job_id, [], processed=len(rows))
+
+    accepted = reachable if remaining is None else reachable[:remaining]
+    for row in reachable[len(accepted):]:
+        report.append({"row": row["row"], "nombre": row["nombre"], "status": "rejected",
+                       "detail": "Límite de dispositivos del plan alcanzado"})
+
+    if accepted:
+        values = [
+            {k: v for k, v in row.items() if k != "row"} | {"usuario_id": usuario_id, "activo": True}
+            for row in accepted
+        ]
+        # Sin sort_by_parameter_order el RETURNING de varias filas no garantiza el orden
+        ids = db.scalars(insert(Device).returning(Device.id, sort_by_parameter_order=True), values).all()
+        db.commit()
+        for row, device_id in zip(accepted, ids):
+            report.append({"row": row["row"], "nombre": row["nombre"], "status": "created", "device_id": device_id})
+
+    store.add_results(job_id, report)
+    store.set_status(job_id, "done")
+    logger.info(f"Import {job_id}: created {len(accepted)} of {total} devices")
+    return {"created": len(accepted), "failed": total - len(accepted)}
@@ -0,0 +1,141 @@
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import redis
+
+from app.core.redis_client import get_redis
+
+# Orden de severidad para quedarnos con la peor alerta del último ciclo
+SEVERITY_RANK = {
+    "Aviso": 1,
+    "Alerta Menor": 2,
+    "Alerta Mayor": 3,
+    "Alerta Severa": 3,
+    "Alerta Crítica": 4,
+}
+
+def worst_severity(estados: Iterable[str]) -> Optional[str]:
+    return max(estados, key=lambda estado: SEVERITY_RANK.get(estado, 0), default=None)
+
+class DeviceStateCache:
+    """
+    Último estado conocido de cada dispositivo en Redis.
+
+    Un hash compacto por dispositivo (`{prefix}:{id}`) más un set por usuario
+    (`{prefix}:user:{usuario_id}`) para resolver la flota sin consultar Postgres.
+    """
+
+    # Métricas del último ciclo: se borran al caer el equipo para no mostrarlas como actuales
+    LIVE_FIELDS = ("cpu_load", "memory_used_pct", "uptime", "interfaces")
+
+    def __init__(self, client: Optional[redis.Redis] = None, prefix: str = "mm:state"):
+        self.client = client or get_redis()
+        self.prefix = prefix
+
+    def _key(self, device_id: int) -> str:
+        return f"{self.prefix}:{device_id}"
+
+    def _user_key(self, usuario_id: int) -> str:
+        return f"{self.prefix}:user:{usuario_id}"
+
+    @staticmethod
+    def build(
+        device_id: int,
+        usuario_id: int,
+        health: Optional[Dict[str, Any]],
+        severity: Optional[str],
+        now: Optional[float] = None,
+        unreachable_via: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Registro compacto a partir del resultado de una consulta (health None =
+        caído). `unreachable_via` es el padre caído por el que no se consultó.
+        """
+        now = now or time.time()
+        record: Dict[str, Any] = {
+            "device_id": device_id,
+            "usuario_id": usuario_id,
+            "reachable": 1 if health else 0,
+            "severity": severity or "",
+            "checked_at": now,
+            # Vacío para limpiar el valor de un ciclo anterior
+            "unreachable_via": unreachable_via or "",
+        }
+        if health:
+            total = health['memory_total'] or 1
+            record.update({
+                "cpu_load": health['cpu_load'],
+                "memory_used_pct": round(health['memory_used'] / total * 100, 1),
+                "uptime": health['uptime'],
+                "version": health['version'],
+                "board_name": health['board_name'],
+                "last_seen": now,
+            })
+            # Solo el colector SNMP trae contadores de interfaz
+            if health.get('interfaces') is not None:
+                record["interfaces"] = json.dumps(health['interfaces'])
+        return record
+
+    def write_many(self, records: List[Dict[str, Any]]) -> None:
+        """Escribe los estados de un shard en un único pipeline"""
+        if not records:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for record in records:
+            fields = {k: v for k, v in record.items() if k != "device_id"}
+            pipe.hset(self._key(record["device_id"]), mapping=fields)
+            if not record["reachable"]:
+                pipe.hdel(self._key(record["device_id"]), *self.LIVE_FIELDS)
+            pipe.sadd(self._user_key(record["usuario_id"]), record["device_id"])
+        pipe.execute()
+
+    def get(self, device_id: int) -> Optional[Dict[str, Any]]:
+        return self._parse(device_id, self.client.hgetall(self._key(device_id)))
+
+    def get_many(self, device_ids: List[int]) -> List[Dict[str, Any]]:
+        pipe = self.client.pipeline(transaction=False)
+        for device_id in device_ids:
+            pipe.hgetall(self._key(device_id))
+        states = (self._parse(device_id, raw) for device_id, raw in zip(device_ids, pipe.execute()))
+        return [state for state in states if state]
+
+    def device_ids_for_user(self, usuario_id: int) -> List[int]:
+        return sorted(int(device_id) for device_id in self.client.smembers(self._user_key(usuario_id)))
+
+    def forget(self, device_id: int, usuario_id: int) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(self._key(device_id))
+        pipe.srem(self._user_key(usuario_id), device_id)
+        pipe.execute()
+
+    def forget_many(self, device_ids: List[int]) -> None:
+        """Olvida equipos que dejaron de consultarse; el usuario sale de su propio hash"""
+        if not device_ids:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for device_id in device_ids:
+            pipe.hget(self._key(device_id), "usuario_id")
+        owners = pipe.execute()
+        for device_id, usuario_id in zip(device_ids, owners):
+            pipe.delete(self._key(device_id))
+            if usuario_id:
+                pipe.srem(self._user_key(int(usuario_id)), device_id)
+        pipe.execute()
+
+    @staticmethod
+    def _parse(device_id: int, raw: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not raw:
+            return None
+        state: Dict[str, Any] = {"device_id": device_id}
+        for field in ("usuario_id", "reachable", "cpu_load", "unreachable_via"):
+            if raw.get(field):
+                state[field] = int(raw[field])
+        for field in ("memory_used_pct", "last_seen", "checked_at"):
+            if raw.get(field):
+                state[field] = float(raw[field])
+        for field in ("uptime", "version", "board_name", "severity"):
+            state[field] = raw.get(field) or None
+        state["interfaces"] = json.loads(raw["interfaces"]) if raw.get("interfaces") else None
+        state["reachable"] = bool(state.get("reachable"))
+        return state
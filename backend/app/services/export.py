@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.db.models import Alert, Device
+from app.db.session import db_router
+
+ALERT_COLUMNS = ("id", "equipo_id", "equipo", "estado", "titulo", "descripcion", "fecha")
+
+def iter_alert_rows(
+    usuario_id: int,
+    equipo_id: Optional[int] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    batch_size: int = 1000,
+    sticky: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Alertas del usuario como dicts planos, leídas con cursor de servidor
+    (stream_results + yield_per): memoria constante sin importar el volumen.
+    Abre su propia sesión (réplica si la hay) porque se consume mientras
+    se envía la respuesta.
+    """
+    stmt = (
+        select(Alert.id, Alert.equipo_id, Device.nombre.label("equipo"), Alert.estado,
+               Alert.titulo, Alert.descripcion, Alert.fecha)
+        .join(Device, Alert.equipo_id == Device.id)
+        .where(Device.usuario_id == usuario_id)
+        .order_by(Alert.fecha, Alert.id)
+    )
+    if equipo_id is not None:
+        stmt = stmt.where(Alert.equipo_id == equipo_id)
+    if estado:
+        stmt = stmt.where(Alert.estado == estado)
+    if desde:
+        stmt = stmt.where(Alert.fecha >= desde)
+    if hasta:
+        stmt = stmt.where(Alert.fecha < hasta)
+
+    db = db_router.session(readonly=True, sticky=sticky)
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for row in result.mappings():
+            yield dict(row)
+    finally:
+        db.close()
+
+def _default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def encode_ndjson(rows: Iterable[Dict[str, Any]], chunk_rows: int = 500) -> Iterator[bytes]:
+    """Una línea JSON por fila, agrupadas en chunks para reducir escrituras"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=_default, ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+def encode_csv(rows: Iterable[Dict[str, Any]], columns: Sequence[str], chunk_rows: int = 500) -> Iterator[bytes]:
+    """CSV con cabecera, reutilizando un único buffer por chunk"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow({k: _default(v) if isinstance(v, datetime) else v for k, v in row.items()})
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compresión gzip incremental sobre un flujo de chunks"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """True si Accept-Encoding admite gzip (o `*`) con q > 0"""
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip()
+        if not quality.startswith("q="):
+            return True
+        try:
+            return float(quality[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+def export_response(
+    rows: Iterable[Dict[str, Any]], fmt: str, compress: bool, filename: str, accept_encoding: str = ""
+) -> StreamingResponse:
+    """
+    StreamingResponse en NDJSON o CSV. `compress` descarga un fichero .gz;
+    si no, se comprime con Content-Encoding cuando el cliente acepta gzip.
+    """
+    if fmt == "csv":
+        body, media_type, extension = encode_csv(rows, ALERT_COLUMNS), "text/csv", "csv"
+    else:
+        body, media_type, extension = encode_ndjson(rows), "application/x-ndjson", "ndjson"
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        body, media_type, extension = gzip_stream(body), "application/gzip", f"{extension}.gz"
+    elif accepts_gzip(accept_encoding):
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return StreamingResponse(body, media_type=media_type, headers=headers)
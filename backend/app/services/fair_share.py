@@ -0,0 +1,259 @@
+"""
+Reparto justo del trabajo de monitoreo e IA entre clientes (tenants).
+
+Cada cliente tiene su propia cola de trabajo pendiente (equipos vencidos en
+el planificador, peticiones de análisis con IA) y el despachador la recorre
+con deficit round robin: en cada ronda un cliente suma `peso` créditos y
+despacha un elemento por crédito. Así un cliente con 10.000 routers no pasa
+por delante de los pequeños: en un tick con presupuesto limitado cada
+cliente con trabajo recibe una parte proporcional a su peso, y los créditos
+no gastados se conservan para el tick siguiente.
+
+- Peso y concurrencia salen del plan (Plan.peso, Plan.concurrencia; None =
+  configuración global).
+- Concurrencia: elementos despachados y aún sin terminar por cliente, en un
+  sorted set con vencimiento para que un worker caído no bloquee el cupo.
+- Métricas: por cliente, cuánto espera su elemento más antiguo, cuántos
+  quedan en cola y cuántos hay en curso (`{prefix}:{nombre}:lag`).
+"""
+import json
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.db.models import Plan, User
+
+# (peso, concurrencia máxima)
+Share = Tuple[float, int]
+# (elemento, esperando desde)
+Pending = Tuple[Hashable, float]
+# Con un peso menor un cliente tarda demasiadas rondas en juntar un crédito
+# (y uno negativo no lo junta nunca)
+MIN_WEIGHT = 0.01
+
+def resolve_share(peso: Optional[float], concurrencia: Optional[int], default_concurrency: int) -> Share:
+    """Peso y concurrencia del plan, con los globales cuando no los fija"""
+    return (max(peso or settings.FAIR_SHARE_DEFAULT_WEIGHT, MIN_WEIGHT), concurrencia or default_concurrency)
+
+def tenant_shares(db: Session, tenant_ids: Iterable[int], concurrency: int) -> Dict[int, Share]:
+    """Peso del plan de cada cliente con un cupo común (Plan.concurrencia es del monitoreo)"""
+    rows = (
+        db.query(User.id, Plan.peso)
+        .outerjoin(Plan, User.plan_id == Plan.id)
+        .filter(User.id.in_(list(tenant_ids)))
+    )
+    return {row.id: resolve_share(row.peso, None, concurrency) for row in rows}
+
+def deficit_round_robin(
+    queues: Dict[int, Sequence[Any]],
+    weights: Dict[int, float],
+    slots: Dict[int, int],
+    budget: Optional[int] = None,
+    deficits: Optional[Dict[int, float]] = None,
+) -> List[Tuple[int, Any]]:
+    """
+    Orden de despacho [(cliente, elemento)] de las colas (cada una ya en
+    orden de llegada). `slots` es el cupo libre de cada cliente y `budget`
+    el total del tick (None/0 = sin límite). `deficits` se actualiza: los
+    clientes que quedan con trabajo conservan sus créditos.
+    """
+    deficits = {} if deficits is None else deficits
+    slots = dict(slots)
+    # Primero quien más créditos acumuló en ticks anteriores
+    order = sorted(
+        (tenant for tenant, queue in queues.items() if queue and slots.get(tenant, 0) > 0),
+        key=lambda tenant: (-deficits.get(tenant, 0.0), tenant),
+    )
+    active = deque(order)
+    positions = dict.fromkeys(order, 0)
+    dispatched: List[Tuple[int, Any]] = []
+
+    while active and not (budget and len(dispatched) >= budget):
+        tenant = active.popleft()
+        queue = queues[tenant]
+        credit = deficits.get(tenant, 0.0) + max(weights.get(tenant, settings.FAIR_SHARE_DEFAULT_WEIGHT), MIN_WEIGHT)
+        position = positions[tenant]
+        while credit >= 1 and position < len(queue) and slots[tenant] > 0:
+            if budget and len(dispatched) >= budget:
+                break
+            dispatched.append((tenant, queue[position]))
+            position += 1
+            credit -= 1
+            slots[tenant] -= 1
+        positions[tenant] = position
+        if position < len(queue) and slots[tenant] > 0:
+            deficits[tenant] = credit
+            active.append(tenant)
+        else:
+            # Cola vacía o sin cupo: no acumula créditos mientras no compite
+            deficits.pop(tenant, None)
+    return dispatched
+
+class FairShareState:
+    """Créditos, elementos en curso y métricas de una cola justa en Redis"""
+
+    def __init__(self, client: Optional[redis.Redis] = None, name: str = "poll", prefix: str = "mm:fair"):
+        self.client = client or get_redis()
+        self.prefix = f"{prefix}:{name}"
+        self.deficit_key = f"{self.prefix}:deficit"
+        self.lag_key = f"{self.prefix}:lag"
+
+    def _inflight_key(self, tenant: int) -> str:
+        return f"{self.prefix}:inflight:{tenant}"
+
+    def inflight(self, tenants: Iterable[int], now: float) -> Dict[int, int]:
+        """Elementos en curso por cliente, descartando los vencidos"""
+        tenants = list(tenants)
+        pipe = self.client.pipeline(transaction=False)
+        for tenant in tenants:
+            pipe.zremrangebyscore(self._inflight_key(tenant), "-inf", now)
+            pipe.zcard(self._inflight_key(tenant))
+        counts = pipe.execute()[1::2]
+        return dict(zip(tenants, counts))
+
+    def acquire(self, assignments: Dict[int, List[Hashable]], now: float, ttl: float) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for tenant, items in assignments.items():
+            if items:
+                pipe.zadd(self._inflight_key(tenant), {str(item): now + ttl for item in items})
+                pipe.expire(self._inflight_key(tenant), int(ttl) + 1)
+        pipe.execute()
+
+    def release(self, assignments: Dict[int, List[Hashable]]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for tenant, items in assignments.items():
+            if items:
+                pipe.zrem(self._inflight_key(tenant), *(str(item) for item in items))
+        pipe.execute()
+
+    def deficits(self) -> Dict[int, float]:
+        return {int(tenant): float(credit) for tenant, credit in self.client.hgetall(self.deficit_key).items()}
+
+    def dispatch(
+        self,
+        pending: Dict[int, List[Pending]],
+        shares: Dict[int, Share],
+        budget: Optional[int],
+        ttl: float,
+        now: Optional[float] = None,
+        backlog: Optional[Dict[int, int]] = None,
+    ) -> List[Tuple[int, Hashable]]:
+        """
+        Elige qué despachar de `pending` ({cliente: [(elemento, esperando
+        desde)]} en orden de llegada), lo marca en curso durante `ttl` y
+        publica las métricas de espera. Los clientes sin share se omiten.
+        `backlog` es el total en cola si `pending` es solo una ventana.
+        """
+        now = now or time.time()
+        pending = {tenant: items for tenant, items in pending.items() if items and tenant in shares}
+        inflight = self.inflight(pending, now)
+        slots = {tenant: shares[tenant][1] - inflight[tenant] for tenant in pending}
+        weights = {tenant: shares[tenant][0] for tenant in pending}
+        deficits = self.deficits()
+        queues = {tenant: [item for item, _ in items] for tenant, items in pending.items()}
+        dispatched = deficit_round_robin(queues, weights, slots, budget, deficits)
+
+        assignments: Dict[int, List[Hashable]] = defaultdict(list)
+        for tenant, item in dispatched:
+            assignments[tenant].append(item)
+        self.acquire(assignments, now, ttl)
+
+        metrics = {
+            tenant: {
+                "lag": round(now - min(since for _, since in items), 1),
+                "queued": (backlog or {}).get(tenant, len(items)) - len(assignments[tenant]),
+                "dispatched": len(assignments[tenant]),
+                "inflight": inflight[tenant] + len(assignments[tenant]),
+            }
+            for tenant, items in pending.items()
+        }
+        pipe = self.client.pipeline()
+        pipe.delete(self.deficit_key, self.lag_key)
+        if deficits:
+            pipe.hset(self.deficit_key, mapping=deficits)
+        if metrics:
+            pipe.hset(self.lag_key, mapping={tenant: json.dumps(m) for tenant, m in metrics.items()})
+            pipe.hset(self.lag_key, "updated", now)
+        pipe.execute()
+        return dispatched
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas del último despacho: {cliente: {lag, queued, dispatched, inflight}}"""
+        raw = self.client.hgetall(self.lag_key)
+        updated = raw.pop("updated", None)
+        return {
+            "updated": float(updated) if updated else None,
+            "tenants": {int(tenant): json.loads(value) for tenant, value in raw.items()},
+        }
+
+# Recorta lo despachado y quita al cliente del índice si su cola quedó vacía,
+# atómico frente a un push concurrente
+_TAKE = """
+redis.call('ltrim', KEYS[1], ARGV[1], -1)
+if redis.call('llen', KEYS[1]) == 0 then
+    redis.call('srem', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+class FairShareQueue:
+    """
+    Cola justa de trabajos: una lista por cliente más un set con los
+    clientes que tienen trabajo pendiente.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None, name: str = "ai", prefix: str = "mm:fair"):
+        self.client = client or get_redis()
+        self.state = FairShareState(self.client, name, prefix)
+        self.tenants_key = f"{self.state.prefix}:tenants"
+        self._take = self.client.register_script(_TAKE)
+
+    def _queue_key(self, tenant: int) -> str:
+        return f"{self.state.prefix}:queue:{tenant}"
+
+    def push(self, tenant: int, item: Hashable, now: Optional[float] = None) -> int:
+        """Encola un trabajo; devuelve cuántos tiene el cliente pendientes"""
+        pipe = self.client.pipeline()
+        pipe.rpush(self._queue_key(tenant), json.dumps([item, now or time.time()]))
+        pipe.sadd(self.tenants_key, tenant)
+        return pipe.execute()[0]
+
+    def pending(self, limit: int) -> Dict[int, List[Pending]]:
+        """Hasta `limit` trabajos por cliente, en orden de llegada"""
+        tenants = [int(tenant) for tenant in self.client.smembers(self.tenants_key)]
+        pipe = self.client.pipeline(transaction=False)
+        for tenant in tenants:
+            pipe.lrange(self._queue_key(tenant), 0, limit - 1)
+        return {
+            tenant: [tuple(json.loads(entry)) for entry in entries]
+            for tenant, entries in zip(tenants, pipe.execute())
+        }
+
+    def dispatch(
+        self,
+        pending: Dict[int, List[Pending]],
+        shares: Dict[int, Share],
+        budget: Optional[int],
+        ttl: float,
+        now: Optional[float] = None,
+    ) -> List[Tuple[int, Hashable]]:
+        """Despacha con FairShareState y saca de las colas lo despachado"""
+        pipe = self.client.pipeline(transaction=False)
+        for tenant in pending:
+            pipe.llen(self._queue_key(tenant))
+        backlog = dict(zip(pending, pipe.execute()))
+        dispatched = self.state.dispatch(pending, shares, budget, ttl, now, backlog)
+        taken: Dict[int, int] = defaultdict(int)
+        for tenant, _ in dispatched:
+            taken[tenant] += 1
+        for tenant, count in taken.items():
+            self._take(keys=[self._queue_key(tenant), self.tenants_key], args=[count, tenant])
+        return dispatched
+
+    def release(self, tenant: int, item: Hashable) -> None:
+        self.state.release({tenant: [item]})
@@ -0,0 +1,324 @@
+"""
+Buffer de ingesta entre colectores y escritores de BD.
+
+Los shards de monitoreo publican muestras de salud, lotes de logs y alertas
+en tres streams de Redis (una entrada = un lote de registros de un shard) y
+siguen consultando aunque Postgres vaya lento o esté caído. La tarea
+drain_ingest lee con el consumer group `writers` y escribe cada stream en una
+transacción por lote.
+
+- Backpressure: los escritores borran (XDEL) lo confirmado, así que XLEN es
+  el atraso real. Por encima de INGEST_HIGH_WATERMARK los productores
+  descartan muestras y logs, nunca alertas; INGEST_STREAM_MAXLEN es el tope
+  duro de memoria de muestras y logs (el de alertas no se recorta).
+- Al menos una vez: se confirma tras el commit. Si el escritor muere antes,
+  otro reclama las entradas pendientes con XAUTOCLAIM y las reprocesa.
+- Entradas envenenadas: un registro que la BD rechaza tumba su lote entero.
+  Las entradas entregadas INGEST_MAX_DELIVERIES veces se reintentan de una
+  en una y, si siguen fallando por los datos (no por una caída de la BD),
+  pasan al stream `mm:ingest:dead` para no bloquear la ingesta.
+- Idempotencia: cada tabla tiene una clave natural o asignada por el
+  colector e INSERT ... ON CONFLICT DO NOTHING, así un reproceso no duplica.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.db.models import Alert, Device, DeviceLog, HealthSample
+from app.db.session import SessionLocal
+from app.services.notifications import AlertStream, alert_event
+
+logger = logging.getLogger(__name__)
+
+STREAMS = {
+    "health": "mm:ingest:health",
+    "logs": "mm:ingest:logs",
+    "alerts": "mm:ingest:alerts",
+}
+DEAD_LETTERS = "mm:ingest:dead"
+GROUP = "writers"
+# Lo que se puede perder bajo presión sin perder alertas
+SHEDDABLE = ("health", "logs")
+
+def health_record(device_id: int, health: Dict[str, Any], now: float) -> Dict[str, Any]:
+    total = health['memory_total'] or 1
+    return {
+        "equipo_id": device_id,
+        "fecha": now,
+        "cpu_load": health['cpu_load'],
+        "memoria_pct": round(health['memory_used'] / total * 100, 1),
+        "uptime": health['uptime'],
+        # Contadores por interfaz (colector SNMP); la API de RouterOS no los da
+        "interfaces": health.get('interfaces'),
+    }
+
+def log_records(device_id: int, logs: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+    # RouterOS omite la fecha en las entradas de hoy: sin ella la misma hora
+    # de dos días distintos daría la misma clave
+    today = date.fromtimestamp(now).isoformat()
+    records = []
+    for log in logs:
+        topics = log.get('topics') or ""
+        if not isinstance(topics, str):
+            topics = ",".join(topics)
+        time_, message = log.get('time', ""), log.get('message', "")
+        stamp = time_ if " " in time_ else f"{today} {time_}"
+        key = f"{device_id}|{stamp}|{topics}|{message}"
+        records.append({
+            "clave": hashlib.sha1(key.encode()).hexdigest(),
+            "equipo_id": device_id,
+            "hora": time_,
+            "topicos": topics[:100],
+            "severidad": (log.get('severity') or "")[:20] or None,
+            "mensaje": message,
+            "fecha": now,
+        })
+    return records
+
+def alert_record(alert: Alert, device: Any, now: float) -> Dict[str, Any]:
+    return {
+        "clave": uuid.uuid4().hex,
+        "equipo_id": device.id,
+        "usuario_id": device.usuario_id,
+        "equipo": device.nombre,
+        "estado": alert.estado,
+        "titulo": alert.titulo,
+        "descripcion": alert.descripcion,
+        "fecha": now,
+    }
+
+class IngestProducer:
+    """Publica lotes en los streams de ingesta (un pipeline por llamada)"""
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        maxlen: int = settings.INGEST_STREAM_MAXLEN,
+        high_watermark: int = settings.INGEST_HIGH_WATERMARK,
+        prefix: str = "",
+    ):
+        self.client = client or get_redis()
+        self.maxlen = maxlen
+        self.high_watermark = high_watermark
+        self.keys = {kind: prefix + key for kind, key in STREAMS.items()}
+
+    def publish(self, batches: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+        """Publica {tipo: registros}; devuelve los tipos descartados por backpressure"""
+        kinds = [kind for kind, records in batches.items() if records]
+        if not kinds:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for kind in kinds:
+            pipe.xlen(self.keys[kind])
+        backlog = dict(zip(kinds, pipe.execute()))
+
+        shed = [kind for kind in kinds if kind in SHEDDABLE and backlog[kind] >= self.high_watermark]
+        pipe = self.client.pipeline(transaction=False)
+        for kind in kinds:
+            if kind not in shed:
+                # Las alertas nunca se recortan
+                maxlen = self.maxlen if kind in SHEDDABLE else None
+                pipe.xadd(self.keys[kind], {"data": json.dumps(batches[kind])}, maxlen=maxlen, approximate=True)
+        pipe.execute()
+        if shed:
+            logger.warning(f"Ingest backlog above {self.high_watermark} entries, shedding {shed}")
+        return shed
+
+def _insert_ignore(db: Session, model):
+    """INSERT que ignora filas ya escritas (reproceso de una entrada)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite_insert(model).on_conflict_do_nothing()
+    return insert(model)
+
+def _timestamps(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(record, fecha=datetime.fromtimestamp(record["fecha"])) for record in records]
+
+def _is_outage(error: Exception) -> bool:
+    """BD o Redis inalcanzables: reintentar más tarde, no culpar a los datos"""
+    return isinstance(error, (sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.DisconnectionError,
+                              redis.RedisError))
+
+class IngestWriter:
+    """Consumidor: vacía cada stream en una transacción por lote"""
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+        consumer: Optional[str] = None,
+        alert_stream: Optional[AlertStream] = None,
+        prefix: str = "",
+    ):
+        self.client = client or get_redis()
+        self.session_factory = session_factory
+        # Nombre estable por proceso para no acumular consumidores en el grupo
+        self.consumer = consumer or f"writer-{socket.gethostname()}-{os.getpid()}"
+        self.alert_stream = alert_stream
+        self.keys = {kind: prefix + key for kind, key in STREAMS.items()}
+        self.dead_key = prefix + DEAD_LETTERS
+
+    def _ensure_group(self, key: str) -> None:
+        try:
+            self.client.xgroup_create(key, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _deliveries(self, key: str, message_ids: List[str]) -> Dict[str, int]:
+        """Veces que se entregó cada entrada (XPENDING)"""
+        pipe = self.client.pipeline(transaction=False)
+        for message_id in message_ids:
+            pipe.xpending_range(key, GROUP, min=message_id, max=message_id, count=1)
+        return {
+            entry[0]["message_id"]: entry[0]["times_delivered"]
+            for entry in pipe.execute() if entry
+        }
+
+    def _read(self, key: str, limit: int) -> List[Tuple[str, List[Dict[str, Any]], int]]:
+        """
+        Primero las entradas abandonadas por un escritor caído, luego las
+        nuevas: [(id, registros, entregas)].
+        """
+        claimed = list(self.client.xautoclaim(
+            key, GROUP, self.consumer, min_idle_time=settings.INGEST_CLAIM_IDLE * 1000, count=limit
+        )[1])
+        deliveries = self._deliveries(key, [message_id for message_id, _ in claimed]) if claimed else {}
+        messages = claimed
+        if len(messages) < limit:
+            batch = self.client.xreadgroup(GROUP, self.consumer, {key: ">"}, count=limit - len(messages))
+            if batch:
+                messages.extend(batch[0][1])
+        # Entradas recortadas por MAXLEN llegan sin campos
+        return [
+            (message_id, json.loads(fields["data"]) if fields else [], deliveries.get(message_id, 1))
+            for message_id, fields in messages
+        ]
+
+    def _existing_devices(self, db: Session, records: Iterable[Dict[str, Any]]) -> Set[int]:
+        """Un equipo borrado entre la consulta y la escritura rompería la FK del lote entero"""
+        device_ids = {record["equipo_id"] for record in records}
+        if not device_ids:
+            return set()
+        return {row.id for row in db.query(Device.id).filter(Device.id.in_(device_ids))}
+
+    def _write(self, kind: str, db: Session, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        existing = self._existing_devices(db, records)
+        records = [record for record in records if record["equipo_id"] in existing]
+        if not records:
+            return []
+        if kind == "health":
+            db.execute(_insert_ignore(db, HealthSample), _timestamps(records))
+        elif kind == "logs":
+            db.execute(_insert_ignore(db, DeviceLog), _timestamps(records))
+        else:
+            columns = ("clave", "equipo_id", "estado", "titulo", "descripcion", "fecha")
+            rows = [{column: record[column] for column in columns} for record in _timestamps(records)]
+            db.execute(_insert_ignore(db, Alert), rows)
+        return records
+
+    def _notify(self, db: Session, records: List[Dict[str, Any]]) -> None:
+        """
+        Eventos de notificación de las alertas del lote, también las que ya
+        existían: si el escritor murió tras el commit aún no se publicaron.
+        """
+        by_key = {record["clave"]: record for record in records}
+        alerts = db.query(Alert).filter(Alert.clave.in_(by_key)).all()
+        events = [
+            alert_event(alert, SimpleNamespace(
+                id=alert.equipo_id, usuario_id=by_key[alert.clave]["usuario_id"], nombre=by_key[alert.clave]["equipo"]
+            ))
+            for alert in alerts
+        ]
+        # Si falla, la entrada queda sin confirmar y se reprocesa
+        (self.alert_stream or AlertStream()).publish(events)
+
+    def _commit(self, kind: str, records: List[Dict[str, Any]]) -> None:
+        db = self.session_factory()
+        try:
+            written = self._write(kind, db, records)
+            db.commit()
+            if kind == "alerts" and written:
+                self._notify(db, written)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _ack(self, key: str, message_ids: List[str]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(key, GROUP, *message_ids)
+        # Borrar lo confirmado deja XLEN = atraso pendiente (backpressure)
+        pipe.xdel(key, *message_ids)
+        pipe.execute()
+
+    def _retry_one_by_one(self, kind: str, key: str, messages: List[Tuple[str, List[Dict[str, Any]], int]]) -> int:
+        """Reintento individual de entradas que ya fallaron en lote; devuelve las consumidas"""
+        consumed = 0
+        for message_id, records, deliveries in messages:
+            try:
+                self._commit(kind, records)
+            except Exception as e:
+                if _is_outage(e):
+                    logger.error(f"Error writing {kind} entry {message_id} from ingest stream: {str(e)}")
+                    return consumed
+                self.client.xadd(self.dead_key, {
+                    "kind": kind, "id": message_id, "data": json.dumps(records), "error": str(e)[:1000],
+                }, maxlen=settings.INGEST_STREAM_MAXLEN, approximate=True)
+                logger.error(
+                    f"Dead-lettered {kind} entry {message_id} after {deliveries} deliveries: {str(e)}"
+                )
+            self._ack(key, [message_id])
+            consumed += 1
+        return consumed
+
+    def drain(self, kind: str, limit: int = settings.INGEST_BATCH_SIZE) -> int:
+        """Escribe hasta `limit` entradas de un stream; devuelve las entradas consumidas"""
+        key = self.keys[kind]
+        self._ensure_group(key)
+        messages = self._read(key, limit)
+        if not messages:
+            return 0
+        suspect = [message for message in messages if message[2] >= settings.INGEST_MAX_DELIVERIES]
+        batch = [message for message in messages if message[2] < settings.INGEST_MAX_DELIVERIES]
+
+        consumed = 0
+        if batch:
+            records = [record for _, entry, _ in batch for record in entry]
+            try:
+                self._commit(kind, records)
+            except Exception as e:
+                # Quedan pendientes; XAUTOCLAIM las reintenta pasado INGEST_CLAIM_IDLE
+                logger.error(f"Error writing {len(records)} {kind} records from ingest stream: {str(e)}")
+                return 0
+            self._ack(key, [message_id for message_id, _, _ in batch])
+            consumed = len(batch)
+        return consumed + self._retry_one_by_one(kind, key, suspect)
+
+    def run(self, limit: int = settings.INGEST_BATCH_SIZE) -> Dict[str, int]:
+        """Una pasada por los tres streams (las alertas primero); entradas consumidas"""
+        return {kind: self.drain(kind, limit) for kind in ("alerts", "health", "logs")}
+
+    def backlog(self) -> Dict[str, int]:
+        pipe = self.client.pipeline(transaction=False)
+        for key in self.keys.values():
+            pipe.xlen(key)
+        return dict(zip(self.keys, pipe.execute()))
@@ -0,0 +1,118 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.vault import FernetVault
+from app.db.models.device import Device
+
+logger = logging.getLogger(__name__)
+
+# Intentos por fila si otra escritura cambia sus credenciales durante la rotación
+CAS_ATTEMPTS = 3
+
+_devices = Device.__table__
+
+# Columnas cifradas con el vault; la comunidad SNMP es NULL en equipos API
+_CREDENTIALS = (Device.id, Device.usuario_mk_enc, Device.password_mk_enc, Device.snmp_comunidad_enc)
+
+# UPDATE condicional (compare-and-set): solo si el cifrado sigue siendo el
+# leído. Si el usuario editó las credenciales mientras tanto no se pisan.
+_ROTATE = (
+    update(_devices)
+    .where(
+        _devices.c.id == bindparam("b_id"),
+        _devices.c.usuario_mk_enc == bindparam("old_usuario"),
+        _devices.c.password_mk_enc == bindparam("old_password"),
+        _devices.c.snmp_comunidad_enc.is_not_distinct_from(bindparam("old_comunidad")),
+    )
+    .values(
+        usuario_mk_enc=bindparam("new_usuario"),
+        password_mk_enc=bindparam("new_password"),
+        snmp_comunidad_enc=bindparam("new_comunidad"),
+    )
+)
+
+def rotate_device_credentials(
+    read_db: Session,
+    write_db: Session,
+    vault: FernetVault,
+    batch_size: int = settings.KEY_ROTATION_BATCH_SIZE,
+    start_after: int = 0,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Re-encripta las credenciales de `equipos` con la clave primaria del vault.
+
+    Lee en streaming (yield_per, cursor de servidor) con `read_db` y escribe
+    por lotes con UPDATE masivo condicionado al cifrado leído en `write_db`,
+    que hace commit tras cada lote. Las filas que cambiaron entretanto se
+    releen y se vuelven a rotar. `on_batch` recibe el último id confirmado
+    para guardar el punto de reanudación; `start_after` reanuda desde ese id.
+    """
+    rows = (
+        read_db.query(*_CREDENTIALS)
+        .filter(Device.id > start_after)
+        .order_by(Device.id)
+        .yield_per(batch_size)
+    )
+
+    batch: List[Dict[str, Any]] = []
+    rotated = 0
+    last_id = start_after
+    for row in rows:
+        batch.append(_rotated(vault, row))
+        if len(batch) >= batch_size:
+            rotated += _flush(write_db, vault, batch)
+            last_id = _checkpoint(batch, on_batch)
+            batch = []
+
+    if batch:
+        rotated += _flush(write_db, vault, batch)
+        last_id = _checkpoint(batch, on_batch)
+
+    logger.info(f"Rotated credentials for {rotated} devices (last id {last_id})")
+    return {"rotated": rotated, "last_id": last_id}
+
+def _rotated(vault: FernetVault, row: Any) -> Dict[str, Any]:
+    comunidad = row.snmp_comunidad_enc
+    return {
+        "b_id": row.id,
+        "old_usuario": row.usuario_mk_enc,
+        "old_password": row.password_mk_enc,
+        "old_comunidad": comunidad,
+        "new_usuario": vault.rotate(row.usuario_mk_enc),
+        "new_password": vault.rotate(row.password_mk_enc),
+        "new_comunidad": vault.rotate(comunidad) if comunidad else comunidad,
+    }
+
+def _written(params: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+    return params["new_usuario"], params["new_password"], params["new_comunidad"]
+
+def _flush(write_db: Session, vault: FernetVault, batch: List[Dict[str, Any]]) -> int:
+    """Aplica el lote y reintenta las filas modificadas entretanto; devuelve las rotadas"""
+    rotated = 0
+    pending = batch
+    for _ in range(CAS_ATTEMPTS):
+        # executemany: el rowcount no dice qué filas no coincidieron, se releen
+        write_db.execute(_ROTATE, pending)
+        expected = {params["b_id"]: _written(params) for params in pending}
+        current = write_db.query(*_CREDENTIALS).filter(Device.id.in_(list(expected))).all()
+        # Las filas borradas entretanto no aparecen y no se reintentan
+        changed = [row for row in current if tuple(row[1:]) != expected[row.id]]
+        rotated += len(current) - len(changed)
+        pending = [_rotated(vault, row) for row in changed]
+        if not pending:
+            break
+    write_db.commit()
+    if pending:
+        logger.warning(f"Credentials of devices {[p['b_id'] for p in pending]} kept changing, not rotated")
+    return rotated
+
+def _checkpoint(batch: List[Dict[str, Any]], on_batch: Optional[Callable[[int], None]]) -> int:
+    last_id = batch[-1]["b_id"]
+    if on_batch:
+        on_batch(last_id)
+    return last_id
@@ -3,18 +3,28 @@ import logging
 from datetime import datetime
 
 from librouteros import connect
-from librouteros.exceptions import ConnectionError, LoginError
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from librouteros.exceptions import ConnectionClosed
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception
 
-from app.core.security import vault
+from app.core.config import settings
+from app.core.vault import vault
 from app.db.models.device import Device
 
 logger = logging.getLogger(__name__)
 
+def _is_transient(error: BaseException) -> bool:
+    """
+    Cierre o conexión rechazada/reseteada. Un timeout no: el router no
+    responde y cada reintento costaría otros MIKROTIK_API_TIMEOUT segundos.
+    Una credencial inválida (TrapError) tampoco mejora reintentando.
+    """
+    return isinstance(error, (ConnectionClosed, OSError)) and not isinstance(error, TimeoutError)
+
 @retry(
     stop=stop_after_attempt(3), 
     wait=wait_fixed(2),
-    retry=retry_if_exception_type((ConnectionError, LoginError))
+    retry=retry_if_exception(_is_transient),
+    reraise=True
 )
 def connect_to_device(device: Device) -> Any:
     """
@@ -22,16 +32,16 @@ def connect_to_device(device: Device) -> Any:
     Implementa reintentos en caso de fallos temporales.
     """
     try:
-        # Desencriptar credenciales
-        username = vault.decrypt(device.usuario_mk_enc)
-        password = vault.decrypt(device.password_mk_enc)
+        # Desencriptar credenciales (caché en proceso por token cifrado)
+        username = vault.decrypt_cached(device.usuario_mk_enc)
+        password = vault.decrypt_cached(device.password_mk_enc)
 
         api = connect(
             username=username,
             password=password,
             host=device.ip,
             port=device.puerto,
-            timeout=10
+            timeout=settings.MIKROTIK_API_TIMEOUT
         )
         
         logger.info(f"Connected to MikroTik device {device.nombre} ({device.ip})")
@@ -100,6 +110,46 @@ def get_logs(device: Device, limit: int = 100) -> List[Dict[str, Any]]:
         if 'api' in locals():
             api.close()
 
+def get_config_export(device: Device) -> str:
+    """
+    Obtiene el script de configuración (/export) del dispositivo.
+    RouterOS devuelve el texto en el atributo 'ret' de la respuesta.
+    """
+    try:
+        api = connect_to_device(device)
+        return "".join(item.get('ret', '') for item in api('/export'))
+
+    except Exception as e:
+        logger.error(f"Error exporting config from device {device.nombre}: {str(e)}")
+        raise ValueError(f"Error exporting config: {str(e)}")
+    finally:
+        if 'api' in locals():
+            api.close()
+
+def get_neighbors(device: Device) -> List[Dict[str, Any]]:
+    """
+    Obtiene los vecinos descubiertos (MNDP/CDP/LLDP) de /ip/neighbor.
+    """
+    try:
+        api = connect_to_device(device)
+
+        return [
+            {
+                'address': neighbor.get('address', ''),
+                'identity': neighbor.get('identity', ''),
+                'mac_address': neighbor.get('mac-address', ''),
+                'interface': neighbor.get('interface', ''),
+            }
+            for neighbor in api.path('ip', 'neighbor')
+        ]
+
+    except Exception as e:
+        logger.error(f"Error getting neighbors from device {device.nombre}: {str(e)}")
+        raise ValueError(f"Error getting neighbors: {str(e)}")
+    finally:
+        if 'api' in locals():
+            api.close()
+
 def test_mikrotik_connection(ip: str, port: int, username: str, password: str) -> bool:
     """
     Prueba credenciales y conexión.
@@ -0,0 +1,415 @@
+"""
+Pipeline de notificaciones salientes.
+
+Las alertas se publican en un stream de Redis al persistirse. La tarea
+periódica deliver_notifications las lee con un consumer group, las agrupa
+por usuario y destino en un digest por ventana y las entrega (webhook con un
+cliente HTTP compartido, email con una sola conexión SMTP). Un fallo
+reprograma el digest con backoff exponencial; agotados los intentos pasa a
+la dead-letter queue del usuario.
+
+Los webhooks los fija cada cliente: el host se resuelve antes de cada envío,
+se rechazan las direcciones no públicas (loopback, privadas, link-local...)
+y la conexión va a la IP validada, para que el worker no sirva de sonda
+hacia la red interna. Al usuario solo le llega la causa genérica del fallo.
+"""
+import ipaddress
+import json
+import logging
+import os
+import random
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.redis_client import get_redis
+from app.db.models import NotificationDestination
+from app.db.session import db_router
+from app.services.device_state import SEVERITY_RANK
+
+# Solo lo usa el envío de digests, no el productor de eventos de los shards
+httpx = lazy_import("httpx")
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "mm:notify:alerts"
+GROUP = "notifier"
+RETRY_KEY = "mm:notify:retry"
+DEAD_LETTER_KEY = "mm:notify:dead"
+
+def alert_event(alert: Any, device: Any) -> Dict[str, Any]:
+    """Evento plano para el stream (la alerta ya debe tener id)"""
+    return {
+        "alert_id": alert.id,
+        "usuario_id": device.usuario_id,
+        "equipo_id": device.id,
+        "equipo": device.nombre,
+        "estado": alert.estado,
+        "titulo": alert.titulo,
+        "descripcion": alert.descripcion or "",
+        "fecha": datetime.utcnow().isoformat(),
+    }
+
+class AlertStream:
+    """Productor: publica eventos de alerta en el stream (un pipeline por lote)"""
+
+    def __init__(self, client: Optional[redis.Redis] = None, key: str = STREAM_KEY,
+                 maxlen: int = settings.NOTIFY_STREAM_MAXLEN):
+        self.client = client or get_redis()
+        self.key = key
+        self.maxlen = maxlen
+
+    def publish(self, events: Iterable[Dict[str, Any]]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        count = 0
+        for event in events:
+            pipe.xadd(self.key, {"data": json.dumps(event)}, maxlen=self.maxlen, approximate=True)
+            count += 1
+        if count:
+            pipe.execute()
+
+def build_digests(
+    events: List[Dict[str, Any]],
+    destinations: Iterable[NotificationDestination],
+    max_alerts: int = settings.NOTIFY_DIGEST_MAX_ALERTS,
+) -> List[Dict[str, Any]]:
+    """
+    Un digest por destino con las alertas de su usuario que superan su
+    severidad mínima. Se incluyen hasta max_alerts; `total` lleva la cuenta.
+    """
+    by_user: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for event in events:
+        by_user[event["usuario_id"]].append(event)
+
+    digests = []
+    for destination in destinations:
+        threshold = SEVERITY_RANK.get(destination.severidad_minima, 0)
+        alerts = [e for e in by_user.get(destination.usuario_id, ()) if SEVERITY_RANK.get(e["estado"], 0) >= threshold]
+        if not alerts:
+            continue
+        digests.append({
+            "id": uuid.uuid4().hex,
+            "destination_id": destination.id,
+            "usuario_id": destination.usuario_id,
+            "tipo": destination.tipo,
+            "destino": destination.destino,
+            "total": len(alerts),
+            "alerts": alerts[:max_alerts],
+            "attempt": 0,
+        })
+    return digests
+
+class UnsafeDestination(ValueError):
+    """Webhook inválido o que resuelve a una dirección no pública"""
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def resolve_webhook(url: str) -> Tuple[str, str]:
+    """
+    (URL con el host sustituido por su IP, host original). Lanza
+    UnsafeDestination si no resuelve o alguna dirección no es pública
+    (salvo NOTIFY_ALLOW_PRIVATE_WEBHOOKS).
+    """
+    parsed = urlsplit(url)
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeDestination("Invalid webhook port")
+    host = parsed.hostname
+    if parsed.scheme not in ("http", "https") or not host:
+        raise UnsafeDestination("Webhook must be an http(s) URL")
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeDestination(f"Cannot resolve webhook host {host}")
+    if not settings.NOTIFY_ALLOW_PRIVATE_WEBHOOKS:
+        for address in addresses:
+            if not _is_public(address):
+                raise UnsafeDestination(f"Webhook host {host} resolves to non-public address {address}")
+    address = addresses[0].split("%")[0]
+    literal = f"[{address}]" if ":" in address else address
+    userinfo = parsed.netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@{literal}:{port}" if userinfo else f"{literal}:{port}"
+    return parsed._replace(netloc=netloc).geturl(), host
+
+def delivery_error(error: Exception) -> str:
+    """Causa del fallo que se guarda para el usuario, sin detalles de red"""
+    if isinstance(error, UnsafeDestination):
+        return "destination not allowed"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code}"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.TransportError):
+        return "connection failed"
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return "recipient refused"
+    if isinstance(error, (smtplib.SMTPException, OSError)):
+        return "mail server error"
+    return "delivery failed"
+
+def _summary(digest: Dict[str, Any]) -> str:
+    devices = {alert["equipo_id"] for alert in digest["alerts"]}
+    return f"{digest['total']} alertas en {len(devices)} equipos"
+
+class NotificationSender:
+    """
+    Entrega de digests. Un único httpx.Client (pool de conexiones keep-alive)
+    para todos los webhooks y una conexión SMTP reutilizada por ejecución.
+    """
+
+    def __init__(self, http: Optional["httpx.Client"] = None, smtp_factory: Optional[Callable[[], Any]] = None):
+        self.http = http or httpx.Client(
+            timeout=settings.NOTIFY_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.NOTIFY_CONCURRENCY),
+        )
+        self.smtp_factory = smtp_factory or self._smtp_connect
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+
+    @staticmethod
+    def _smtp_connect():
+        if not settings.SMTP_HOST:
+            raise RuntimeError("SMTP_HOST no configurado")
+        smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.NOTIFY_HTTP_TIMEOUT)
+        if settings.SMTP_STARTTLS:
+            smtp.starttls()
+        if settings.SMTP_USER:
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+        return smtp
+
+    def send(self, digest: Dict[str, Any]) -> None:
+        """Lanza excepción si la entrega falla"""
+        if digest["tipo"] == "webhook":
+            self._send_webhook(digest)
+        elif digest["tipo"] == "email":
+            self._send_email(digest)
+        else:
+            raise ValueError(f"Unknown destination type {digest['tipo']}")
+
+    def _send_webhook(self, digest: Dict[str, Any]) -> None:
+        payload = {
+            "digest_id": digest["id"],
+            "summary": _summary(digest),
+            "total": digest["total"],
+            "alerts": digest["alerts"],
+        }
+        # Se conecta a la IP validada: un DNS que cambie entre la comprobación
+        # y la conexión no puede redirigir el POST a la red interna
+        url, host = resolve_webhook(digest["destino"])
+        response = self.http.post(
+            url, json=payload,
+            headers={"Host": host, "Idempotency-Key": digest["id"]},
+            extensions={"sni_hostname": host},
+        )
+        response.raise_for_status()
+
+    def _send_email(self, digest: Dict[str, Any]) -> None:
+        message = EmailMessage()
+        message["Subject"] = f"[MikroTik Monitor] {_summary(digest)}"
+        message["From"] = settings.SMTP_FROM
+        message["To"] = digest["destino"]
+        lines = [f"{a['fecha']}  {a['equipo']}  {a['estado']}: {a['titulo']}" for a in digest["alerts"]]
+        if digest["total"] > len(digest["alerts"]):
+            lines.append(f"... y {digest['total'] - len(digest['alerts'])} alertas más")
+        message.set_content("\n".join(lines))
+        # smtplib no es thread-safe: los correos comparten conexión en serie
+        with self._smtp_lock:
+            if self._smtp is None:
+                self._smtp = self.smtp_factory()
+            try:
+                self._smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = self.smtp_factory()
+                self._smtp.send_message(message)
+
+    def close(self) -> None:
+        self.http.close()
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+def retry_delay(attempt: int, base: int = settings.NOTIFY_RETRY_BASE, cap: int = settings.NOTIFY_RETRY_MAX) -> float:
+    """Backoff exponencial (base * 2^(intento-1), hasta cap) con jitter del 50%"""
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class NotificationPipeline:
+    """Consumidor: stream -> digests -> entrega, con reintentos y DLQ"""
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        sender: Optional[NotificationSender] = None,
+        session_factory: Callable[[], Session] = lambda: db_router.session(readonly=True),
+        consumer: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+        prefix: str = "",
+    ):
+        self.client = client or get_redis()
+        self._sender = sender
+        self.session_factory = session_factory
+        # Nombre estable por proceso para no acumular consumidores en el grupo
+        self.consumer = consumer or f"notifier-{socket.gethostname()}-{os.getpid()}"
+        self.clock = clock
+        self.stream_key = prefix + STREAM_KEY
+        self.retry_key = prefix + RETRY_KEY
+        self.dead_letter_key = prefix + DEAD_LETTER_KEY
+
+    @property
+    def sender(self) -> NotificationSender:
+        # Se crea al primer envío: consultar la DLQ no necesita cliente HTTP
+        if self._sender is None:
+            self._sender = NotificationSender()
+        return self._sender
+
+    def close(self) -> None:
+        if self._sender is not None:
+            self._sender.close()
+
+    def _ensure_group(self) -> None:
+        try:
+            self.client.xgroup_create(self.stream_key, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _read(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Mensajes a procesar: primero los que otro consumidor dejó sin
+        confirmar más de NOTIFY_CLAIM_IDLE, luego los nuevos.
+        """
+        messages = []
+        # Redis 7 devuelve también los ids borrados por MAXLEN; 6.2 no
+        claimed = self.client.xautoclaim(
+            self.stream_key, GROUP, self.consumer, min_idle_time=settings.NOTIFY_CLAIM_IDLE * 1000, count=limit
+        )[1]
+        messages.extend(claimed)
+        while len(messages) < limit:
+            batch = self.client.xreadgroup(
+                GROUP, self.consumer, {self.stream_key: ">"}, count=min(1000, limit - len(messages))
+            )
+            if not batch or not batch[0][1]:
+                break
+            messages.extend(batch[0][1])
+        # Entradas recortadas del stream llegan sin campos: se confirman sin procesar
+        return [(message_id, json.loads(fields["data"]) if fields else None) for message_id, fields in messages]
+
+    def _due_retries(self, now: float, limit: int = 1000) -> List[Dict[str, Any]]:
+        due = []
+        for member in self.client.zrangebyscore(self.retry_key, "-inf", now, start=0, num=limit):
+            # ZREM decide qué consumidor se queda cada reintento
+            if self.client.zrem(self.retry_key, member):
+                due.append(json.loads(member))
+        return due
+
+    def _dead_letter_key(self, usuario_id: int) -> str:
+        return f"{self.dead_letter_key}:{usuario_id}"
+
+    def _still_active(self, digests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Descarta reintentos de destinos borrados o desactivados desde el fallo"""
+        if not digests:
+            return []
+        ids = {digest["destination_id"] for digest in digests}
+        db = self.session_factory()
+        try:
+            active = {
+                destination.id for destination in db.query(NotificationDestination).filter(
+                    NotificationDestination.id.in_(ids), NotificationDestination.activo==True
+                ).all()
+            }
+        finally:
+            db.close()
+        dropped = [digest["id"] for digest in digests if digest["destination_id"] not in active]
+        if dropped:
+            logger.info(f"Dropped {len(dropped)} notification retries for removed destinations")
+        return [digest for digest in digests if digest["destination_id"] in active]
+
+    def _destinations(self, user_ids: Iterable[int]) -> List[NotificationDestination]:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return []
+        db = self.session_factory()
+        try:
+            return (
+                db.query(NotificationDestination)
+                .filter(NotificationDestination.usuario_id.in_(user_ids), NotificationDestination.activo==True)
+                .all()
+            )
+        finally:
+            db.close()
+
+    def _deliver(self, digest: Dict[str, Any]) -> Optional[str]:
+        try:
+            self.sender.send(digest)
+            return None
+        except Exception as e:
+            # El detalle queda en el log; el digest solo guarda la causa genérica
+            logger.warning(f"Notification digest {digest['id']} delivery error: {str(e) or type(e).__name__}")
+            return delivery_error(e)
+
+    def _fail(self, digest: Dict[str, Any], error: str, now: float) -> str:
+        digest = dict(digest, attempt=digest["attempt"] + 1, last_error=error)
+        if digest["attempt"] >= settings.NOTIFY_MAX_ATTEMPTS:
+            self.client.xadd(
+                self._dead_letter_key(digest["usuario_id"]),
+                {"data": json.dumps(digest), "error": error, "failed_at": now},
+                maxlen=settings.NOTIFY_DEAD_LETTER_MAXLEN, approximate=True,
+            )
+            logger.error(f"Notification digest {digest['id']} to {digest['destino']} dead-lettered: {error}")
+            return "dead"
+        self.client.zadd(self.retry_key, {json.dumps(digest): now + retry_delay(digest["attempt"])})
+        logger.warning(f"Notification digest {digest['id']} to {digest['destino']} failed, retrying: {error}")
+        return "retry"
+
+    def run(self, limit: int = settings.NOTIFY_BATCH_SIZE) -> Dict[str, int]:
+        """Procesa una ventana: nuevos eventos más reintentos vencidos"""
+        self._ensure_group()
+        now = self.clock()
+        messages = self._read(limit)
+        events = [event for _, event in messages if event]
+        digests = build_digests(events, self._destinations(e["usuario_id"] for e in events))
+        digests.extend(self._still_active(self._due_retries(now)))
+
+        summary = {"events": len(events), "digests": len(digests), "delivered": 0, "retry": 0, "dead": 0}
+        if digests:
+            with ThreadPoolExecutor(max_workers=settings.NOTIFY_CONCURRENCY) as pool:
+                errors = list(pool.map(self._deliver, digests))
+            for digest, error in zip(digests, errors):
+                if error is None:
+                    summary["delivered"] += 1
+                else:
+                    summary[self._fail(digest, error, now)] += 1
+
+        # Confirmar al final: si el proceso muere antes, otro consumidor
+        # reclama los mensajes (entrega al menos una vez)
+        if messages:
+            self.client.xack(self.stream_key, GROUP, *(message_id for message_id, _ in messages))
+        return summary
+
+    def dead_letters(self, usuario_id: int, count: int = 100) -> List[Dict[str, Any]]:
+        """Últimos digests del usuario que agotaron los reintentos"""
+        return [
+            dict(json.loads(fields["data"]), error=fields["error"], failed_at=float(fields["failed_at"]))
+            for _, fields in self.client.xrevrange(self._dead_letter_key(usuario_id), count=count)
+        ]
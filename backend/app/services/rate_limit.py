@@ -0,0 +1,242 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import redis
+import redis.asyncio
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis
+from app.db.models import Plan, User
+from app.db.session import db_router
+
+logger = logging.getLogger(__name__)
+
+# Rutas que nunca se limitan ni se descartan (sondas del balanceador)
+EXEMPT_PATHS = ("/health",)
+AUTH_PREFIX = f"{settings.API_V1_PREFIX}/auth/"
+
+# Varios buckets en una sola llamada atómica: la petición pasa solo si todos
+# tienen un token, y entonces se descuenta de todos.
+# KEYS: buckets. ARGV: now_ms y, por bucket, tasa (tokens/ms) y capacidad.
+# Devuelve {permitido, tokens restantes del bucket más bajo, espera en ms}
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local allowed = 1
+local retry = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        allowed = 0
+        retry = math.max(retry, math.ceil((1 - tokens) / rate))
+    end
+    levels[i] = tokens
+end
+local remaining = nil
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local tokens = levels[i]
+    if allowed == 1 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+    if remaining == nil or tokens < remaining then
+        remaining = tokens
+    end
+end
+return {allowed, math.floor(remaining), retry}
+"""
+
+class Bucket(NamedTuple):
+    key: str
+    per_minute: int
+    burst: int
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float  # segundos
+
+class TokenBucketLimiter:
+    """
+    Token buckets en Redis (un hash tokens/ts por clave). La recarga y el
+    consumo se hacen dentro de un script Lua, así varios procesos de la API
+    comparten el mismo límite sin condiciones de carrera.
+    """
+
+    def __init__(
+        self,
+        client: Optional[redis.asyncio.Redis] = None,
+        prefix: str = "mm:rl",
+        clock: Callable[[], float] = time.time,
+    ):
+        self.client = client or get_async_redis()
+        self.prefix = prefix
+        self.clock = clock
+        self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, buckets: Sequence[Bucket]) -> RateLimitResult:
+        keys = [f"{self.prefix}:{bucket.key}" for bucket in buckets]
+        args = [int(self.clock() * 1000)]
+        for bucket in buckets:
+            args.extend((bucket.per_minute / 60000, bucket.burst))
+        allowed, remaining, retry_ms = await self._script(keys=keys, args=args)
+        return RateLimitResult(bool(allowed), int(remaining), int(retry_ms) / 1000)
+
+class PlanLimits:
+    """
+    Límites por usuario según su plan, cacheados en proceso para no
+    consultar la BD en cada petición: LRU acotada a `max_size` usuarios y
+    con TTL, así un cambio de plan se aplica en `ttl` segundos como mucho.
+    Si la BD falla se aplican los límites por defecto (sin cachearlos): el
+    limitador no debe tumbar la API.
+    """
+
+    def __init__(
+        self,
+        ttl: float = settings.RATE_LIMIT_PLAN_CACHE_TTL,
+        max_size: int = settings.RATE_LIMIT_PLAN_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, Tuple[float, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, email: str) -> Tuple[int, int]:
+        db = db_router.session(readonly=True)
+        try:
+            row = (
+                db.query(Plan.peticiones_minuto, Plan.rafaga)
+                .join(User, User.plan_id == Plan.id)
+                .filter(User.email == email)
+                .first()
+            )
+        finally:
+            db.close()
+        per_minute = row.peticiones_minuto if row and row.peticiones_minuto else settings.RATE_LIMIT_USER_PER_MINUTE
+        burst = row.rafaga if row and row.rafaga else settings.RATE_LIMIT_USER_BURST
+        return per_minute, burst
+
+    def _cached(self, email: str, now: float) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            entry = self._cache.get(email)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._cache[email]
+                return None
+            self._cache.move_to_end(email)
+            return entry[1], entry[2]
+
+    async def get(self, email: str) -> Tuple[int, int]:
+        now = time.monotonic()
+        cached = self._cached(email, now)
+        if cached:
+            return cached
+        try:
+            per_minute, burst = await run_in_threadpool(self._load, email)
+        except SQLAlchemyError as e:
+            logger.warning(f"Plan limits unavailable, using defaults: {str(e)}")
+            return settings.RATE_LIMIT_USER_PER_MINUTE, settings.RATE_LIMIT_USER_BURST
+        with self._lock:
+            self._cache[email] = (now + self.ttl, per_minute, burst)
+            self._cache.move_to_end(email)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return per_minute, burst
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+def client_ip(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def token_subject(request: Request) -> Optional[str]:
+    """Email del token Bearer si la firma es válida (sin tocar la BD)"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALG])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+def _retry_response(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+_limiter: Optional[TokenBucketLimiter] = None
+plan_limits = PlanLimits()
+
+def _get_limiter() -> TokenBucketLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucketLimiter()
+    return _limiter
+
+async def rate_limit_middleware(request: Request, call_next):
+    """
+    1. Load shedding: si la espera media por una conexión del pool supera
+       LOAD_SHED_POOL_WAIT_MS, responde 503 sin tocar la BD. La medida es
+       del pool de este proceso (cada worker de uvicorn tiene el suyo y
+       decide por separado), no un contador compartido entre procesos.
+    2. Token buckets por IP (más estricto en /auth/) y por usuario según
+       su plan; si alguno está vacío responde 429 con Retry-After.
+    Si Redis no responde se deja pasar la petición (fail open); si la BD no
+    responde se usan los límites por defecto del usuario.
+    """
+    if not settings.RATE_LIMIT_ENABLED or request.url.path.startswith(EXEMPT_PATHS):
+        return await call_next(request)
+
+    wait_ms = db_router.pool_wait_ms()
+    if wait_ms > settings.LOAD_SHED_POOL_WAIT_MS:
+        logger.warning(f"Shedding request to {request.url.path}: DB pool wait {wait_ms:.0f} ms")
+        return _retry_response(503, "Servicio saturado, reintente más tarde", settings.LOAD_SHED_RETRY_AFTER)
+
+    ip = client_ip(request)
+    if request.url.path.startswith(AUTH_PREFIX):
+        buckets = [Bucket(f"auth:{ip}", settings.RATE_LIMIT_AUTH_PER_MINUTE, settings.RATE_LIMIT_AUTH_BURST)]
+    else:
+        buckets = [Bucket(f"ip:{ip}", settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_BURST)]
+        email = token_subject(request)
+        if email:
+            per_minute, burst = await plan_limits.get(email)
+            buckets.append(Bucket(f"user:{email}", per_minute, burst))
+
+    try:
+        result = await _get_limiter().hit(buckets)
+    except redis.RedisError as e:
+        logger.warning(f"Rate limiter unavailable, allowing request: {str(e)}")
+        return await call_next(request)
+
+    if not result.allowed:
+        return _retry_response(429, "Demasiadas peticiones", result.retry_after)
+    response = await call_next(request)
+    response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+    return response
@@ -0,0 +1,207 @@
+import heapq
+import random
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+
+Bounds = Tuple[float, float]
+
+class AdaptiveIntervalPolicy:
+    """
+    Calcula el intervalo de consulta de cada dispositivo.
+
+    Mientras el dispositivo alerta o es volátil el intervalo se reduce
+    (`speedup`); cuando está estable crece lentamente (`slowdown`).
+    Siempre queda dentro de los límites (min, max) del dispositivo o plan.
+    """
+
+    def __init__(
+        self,
+        default_interval: float = settings.POLL_DEFAULT_INTERVAL,
+        speedup: float = 0.5,
+        slowdown: float = 1.25,
+        jitter: float = settings.POLL_JITTER,
+        rng: Optional[random.Random] = None,
+    ):
+        self.default_interval = default_interval
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    def initial_interval(self, bounds: Bounds) -> float:
+        return self._clamp(self.default_interval, bounds)
+
+    def next_interval(self, current: float, bounds: Bounds, alerting: bool, volatile: bool) -> float:
+        factor = self.speedup if (alerting or volatile) else self.slowdown
+        return self._clamp(current * factor, bounds)
+
+    def initial_due(self, now: float, interval: float) -> float:
+        """Primera consulta repartida uniformemente dentro del intervalo"""
+        return now + self.rng.uniform(0, interval)
+
+    def next_due(self, now: float, interval: float) -> float:
+        """Próxima consulta con jitter de ±`jitter` para no sincronizar equipos"""
+        return now + interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    def _clamp(interval: float, bounds: Bounds) -> float:
+        low, high = bounds
+        return max(low, min(high, interval))
+
+def resolve_bounds(
+    device_min: Optional[int],
+    device_max: Optional[int],
+    plan_min: Optional[int],
+    plan_max: Optional[int],
+) -> Bounds:
+    """Límites de intervalo: dispositivo > plan > configuración global"""
+    low = device_min or plan_min or settings.POLL_MIN_INTERVAL
+    high = device_max or plan_max or settings.POLL_MAX_INTERVAL
+    return float(low), float(max(low, high))
+
+class DueTimeScheduler:
+    """
+    Planificador en memoria: min-heap de (próxima consulta, dispositivo).
+    Se usa en simulaciones y como referencia del planificador en Redis.
+    """
+
+    def __init__(self, policy: Optional[AdaptiveIntervalPolicy] = None):
+        self.policy = policy or AdaptiveIntervalPolicy()
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, float] = {}
+        self.intervals: Dict[int, float] = {}
+        self.bounds: Dict[int, Bounds] = {}
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def sync(self, devices: Dict[int, Bounds], now: float) -> None:
+        """Alta de dispositivos nuevos y baja de los que ya no están activos"""
+        for device_id in set(self.intervals) - set(devices):
+            self.remove(device_id)
+        for device_id, bounds in devices.items():
+            self.bounds[device_id] = bounds
+            # Los dispositivos en curso (fuera del heap) conservan su intervalo
+            if device_id not in self.intervals:
+                interval = self.policy.initial_interval(bounds)
+                self.intervals[device_id] = interval
+                self._push(device_id, self.policy.initial_due(now, interval))
+
+    def remove(self, device_id: int) -> None:
+        # Borrado perezoso: la entrada del heap se descarta al salir
+        self._due.pop(device_id, None)
+        self.intervals.pop(device_id, None)
+        self.bounds.pop(device_id, None)
+
+    def pop_due(self, now: float, limit: Optional[int] = None) -> List[int]:
+        """Extrae los dispositivos vencidos; quedan fuera del heap hasta complete()"""
+        due: List[int] = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+            due_at, device_id = heapq.heappop(self._heap)
+            if self._due.get(device_id) != due_at:
+                continue
+            del self._due[device_id]
+            due.append(device_id)
+        return due
+
+    def complete(self, device_id: int, now: float, alerting: bool = False, volatile: bool = False) -> float:
+        """Reprograma un dispositivo tras consultarlo; devuelve el nuevo intervalo"""
+        if device_id not in self.intervals:
+            return 0.0
+        interval = self.policy.next_interval(
+            self.intervals[device_id], self.bounds[device_id], alerting, volatile
+        )
+        self.intervals[device_id] = interval
+        self._push(device_id, self.policy.next_due(now, interval))
+        return interval
+
+    def _push(self, device_id: int, due_at: float) -> None:
+        self._due[device_id] = due_at
+        heapq.heappush(self._heap, (due_at, device_id))
+
+class RedisDueTimeScheduler:
+    """
+    Misma lógica que DueTimeScheduler con el estado en Redis para que
+    dispatcher y shards (en distintos workers) lo compartan.
+    El sorted set `due` actúa como min-heap; `interval` y `cpu` son hashes.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        policy: Optional[AdaptiveIntervalPolicy] = None,
+        claim_ttl: float = settings.POLL_CLAIM_TTL,
+        prefix: str = "mm:sched",
+    ):
+        self.client = client
+        self.policy = policy or AdaptiveIntervalPolicy()
+        self.claim_ttl = claim_ttl
+        self.due_key = f"{prefix}:due"
+        self.interval_key = f"{prefix}:interval"
+        self.cpu_key = f"{prefix}:cpu"
+
+    def sync(self, devices: Dict[int, Bounds], now: float) -> List[int]:
+        """Como DueTimeScheduler.sync; devuelve los dispositivos dados de baja"""
+        known = {int(member) for member in self.client.zrange(self.due_key, 0, -1)}
+        removed = known - set(devices)
+        pipe = self.client.pipeline()
+        if removed:
+            pipe.zrem(self.due_key, *removed)
+            pipe.hdel(self.interval_key, *removed)
+            pipe.hdel(self.cpu_key, *removed)
+        for device_id in set(devices) - known:
+            interval = self.policy.initial_interval(devices[device_id])
+            pipe.hset(self.interval_key, device_id, interval)
+            pipe.zadd(self.due_key, {device_id: self.policy.initial_due(now, interval)})
+        pipe.execute()
+        return sorted(removed)
+
+    def due(self, now: float, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Dispositivos vencidos [(id, vencido desde)], los más atrasados primero, sin reclamarlos"""
+        members = self.client.zrangebyscore(
+            self.due_key, "-inf", now, start=0 if limit else None, num=limit, withscores=True
+        )
+        return [(int(member), score) for member, score in members]
+
+    def claim(self, device_ids: List[int], now: float) -> None:
+        """
+        Reclama dispositivos moviéndolos a now + claim_ttl: si el shard
+        muere, vuelven a vencer y se reintentan.
+        """
+        if device_ids:
+            self.client.zadd(self.due_key, {device_id: now + self.claim_ttl for device_id in device_ids}, xx=True)
+
+    def pop_due(self, now: float, limit: Optional[int] = None) -> List[int]:
+        device_ids = [device_id for device_id, _ in self.due(now, limit)]
+        self.claim(device_ids, now)
+        return device_ids
+
+    def complete(
+        self,
+        device_id: int,
+        bounds: Bounds,
+        now: float,
+        alerting: bool = False,
+        cpu_load: Optional[int] = None,
+    ) -> float:
+        """Reprograma tras la consulta; volátil = salto de CPU sobre el umbral"""
+        current = self.client.hget(self.interval_key, device_id)
+        last_cpu = self.client.hget(self.cpu_key, device_id)
+        volatile = (
+            cpu_load is not None and last_cpu is not None
+            and abs(cpu_load - int(last_cpu)) >= settings.POLL_VOLATILITY_CPU_DELTA
+        )
+        interval = self.policy.next_interval(
+            float(current) if current else self.policy.initial_interval(bounds), bounds, alerting, volatile
+        )
+        pipe = self.client.pipeline()
+        pipe.hset(self.interval_key, device_id, interval)
+        if cpu_load is not None:
+            pipe.hset(self.cpu_key, device_id, cpu_load)
+        # XX: no reincorporar un dispositivo dado de baja durante la consulta
+        pipe.zadd(self.due_key, {device_id: self.policy.next_due(now, interval)}, xx=True)
+        pipe.execute()
+        return interval
@@ -0,0 +1,37 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List
+
+def _hash(value: str) -> int:
+    """Hash estable entre procesos (hash() de Python es aleatorio por proceso)"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+class ConsistentHashRing:
+    """
+    Anillo de hashing consistente con nodos virtuales.
+    Al cambiar el número de shards solo se reasigna ~1/N de los dispositivos.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64):
+        if shards < 1:
+            raise ValueError("Se requiere al menos un shard")
+        self.shards = shards
+        self._ring: List[int] = []
+        self._owners: Dict[int, int] = {}
+        for shard in range(shards):
+            for replica in range(replicas):
+                point = _hash(f"shard-{shard}#{replica}")
+                self._owners[point] = shard
+                bisect.insort(self._ring, point)
+
+    def shard_for(self, device_id: int) -> int:
+        point = _hash(f"device-{device_id}")
+        idx = bisect.bisect(self._ring, point) % len(self._ring)
+        return self._owners[self._ring[idx]]
+
+    def partition(self, device_ids: Iterable[int]) -> List[List[int]]:
+        """Agrupa ids por shard, omitiendo shards vacíos"""
+        buckets: List[List[int]] = [[] for _ in range(self.shards)]
+        for device_id in device_ids:
+            buckets[self.shard_for(device_id)].append(device_id)
+        return [bucket for bucket in buckets if bucket]
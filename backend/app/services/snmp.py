@@ -0,0 +1,409 @@
+"""
+Colector de salud por SNMPv2c (GETBULK sobre UDP).
+
+Alternativa ligera a la API de RouterOS: sin login ni sesión TCP, una o dos
+peticiones UDP por equipo. Todas las consultas de un proceso comparten un
+único socket y se emparejan por request-id, así miles de equipos se consultan
+en paralelo desde un solo event loop.
+"""
+import asyncio
+import itertools
+import random
+import socket
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.vault import vault
+
+Oid = Tuple[int, ...]
+
+# Tipos BER / SNMPv2-SMI
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# PDUs
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+RESPONSE = 0xA2
+GET_BULK_REQUEST = 0xA5
+
+VERSION_2C = 1
+
+RECEIVE_BUFFER = 4 * 1024 * 1024
+
+# Escalares (OID del objeto, sin la instancia .0: GETBULK hace GETNEXT)
+SYS_DESCR = (1, 3, 6, 1, 2, 1, 1, 1)
+SYS_UPTIME = (1, 3, 6, 1, 2, 1, 1, 3)
+MTXR_LIC_VERSION = (1, 3, 6, 1, 4, 1, 14988, 1, 1, 4, 4)
+MTXR_BOARD_NAME = (1, 3, 6, 1, 4, 1, 14988, 1, 1, 7, 8)
+
+# Columnas de tablas
+HR_PROCESSOR_LOAD = (1, 3, 6, 1, 2, 1, 25, 3, 3, 1, 2)
+HR_STORAGE_TYPE = (1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 2)
+HR_STORAGE_UNITS = (1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 4)
+HR_STORAGE_SIZE = (1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 5)
+HR_STORAGE_USED = (1, 3, 6, 1, 2, 1, 25, 2, 3, 1, 6)
+HR_STORAGE_RAM = (1, 3, 6, 1, 2, 1, 25, 2, 1, 2)
+IF_OPER_STATUS = (1, 3, 6, 1, 2, 1, 2, 2, 1, 8)
+IF_NAME = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 1)
+IF_HC_IN_OCTETS = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 6)
+IF_HC_OUT_OCTETS = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 10)
+
+HEALTH_SCALARS = (SYS_DESCR, SYS_UPTIME, MTXR_LIC_VERSION, MTXR_BOARD_NAME)
+HEALTH_COLUMNS = (
+    HR_PROCESSOR_LOAD, HR_STORAGE_TYPE, HR_STORAGE_UNITS, HR_STORAGE_SIZE, HR_STORAGE_USED,
+    IF_NAME, IF_OPER_STATUS, IF_HC_IN_OCTETS, IF_HC_OUT_OCTETS,
+)
+
+class SnmpError(Exception):
+    pass
+
+class Message(NamedTuple):
+    """
+    Mensaje SNMPv2c. En GETBULK error_status/error_index son
+    non-repeaters/max-repetitions, como en el PDU.
+    """
+    community: str
+    pdu: int
+    request_id: int
+    error_status: int
+    error_index: int
+    varbinds: List[Tuple[Oid, Any]]
+
+# --- Codificación BER (solo lo que usa SNMPv2c) ---
+
+def _length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes([n])
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(raw)]) + raw
+
+def _tlv(tag: int, payload: bytes) -> bytes:
+    return bytes([tag]) + _length(len(payload)) + payload
+
+def _encode_oid(oid: Oid) -> bytes:
+    body = bytearray()
+    for arc in (oid[0] * 40 + oid[1],) + tuple(oid[2:]):
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        body.extend(reversed(chunk))
+    return bytes(body)
+
+def encode_value(tag: int, value: Any = None) -> bytes:
+    if tag == INTEGER:
+        return _tlv(tag, value.to_bytes((value + (value < 0)).bit_length() // 8 + 1, "big", signed=True))
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return _tlv(tag, value.to_bytes(value.bit_length() // 8 + 1, "big"))
+    if tag == OCTET_STRING:
+        return _tlv(tag, value.encode() if isinstance(value, str) else value)
+    if tag == OBJECT_IDENTIFIER:
+        return _tlv(tag, _encode_oid(value))
+    if tag == IP_ADDRESS:
+        return _tlv(tag, bytes(int(part) for part in value.split(".")))
+    if tag in (NULL, NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW):
+        return _tlv(tag, b"")
+    raise ValueError(f"Unsupported SNMP type 0x{tag:02x}")
+
+def encode_message(
+    community: str, pdu: int, request_id: int, error_status: int, error_index: int,
+    varbinds: Iterable[Tuple[Oid, bytes]],
+) -> bytes:
+    """varbinds: pares (oid, valor ya codificado con encode_value)"""
+    bindings = b"".join(_tlv(SEQUENCE, _tlv(OBJECT_IDENTIFIER, _encode_oid(oid)) + value) for oid, value in varbinds)
+    body = (
+        encode_value(INTEGER, request_id) + encode_value(INTEGER, error_status)
+        + encode_value(INTEGER, error_index) + _tlv(SEQUENCE, bindings)
+    )
+    return _tlv(SEQUENCE, encode_value(INTEGER, VERSION_2C) + encode_value(OCTET_STRING, community) + _tlv(pdu, body))
+
+def _read(data: bytes, pos: int) -> Tuple[int, bytes, int]:
+    """Lee un TLV: (tag, contenido, posición siguiente)"""
+    if pos + 2 > len(data):
+        raise ValueError("Truncated BER data")
+    tag, length = data[pos], data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    if pos + length > len(data):
+        raise ValueError("Truncated BER data")
+    return tag, data[pos:pos + length], pos + length
+
+def _decode_oid(raw: bytes) -> Oid:
+    arcs = []
+    arc = 0
+    for byte in raw:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    first = min(arcs[0] // 40, 2)
+    return (first, arcs[0] - first * 40) + tuple(arcs[1:])
+
+def decode_value(tag: int, raw: bytes) -> Any:
+    """Valor Python; las excepciones de varbind (noSuch*/endOfMibView) son None"""
+    if tag == INTEGER:
+        return int.from_bytes(raw, "big", signed=True)
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return int.from_bytes(raw, "big")
+    if tag == OCTET_STRING:
+        return raw.decode("utf-8", errors="replace")
+    if tag == OBJECT_IDENTIFIER:
+        return _decode_oid(raw)
+    if tag == IP_ADDRESS:
+        return ".".join(str(b) for b in raw)
+    return None
+
+def decode_message(data: bytes) -> Message:
+    try:
+        tag, message, _ = _read(data, 0)
+        if tag != SEQUENCE:
+            raise ValueError("Not an SNMP message")
+        _, version, pos = _read(message, 0)
+        if int.from_bytes(version, "big") != VERSION_2C:
+            raise ValueError("Only SNMPv2c is supported")
+        _, community, pos = _read(message, pos)
+        pdu, body, _ = _read(message, pos)
+        fields = []
+        pos = 0
+        for _ in range(3):
+            _, raw, pos = _read(body, pos)
+            fields.append(int.from_bytes(raw, "big", signed=True))
+        _, bindings, _ = _read(body, pos)
+        varbinds = []
+        pos = 0
+        while pos < len(bindings):
+            _, binding, pos = _read(bindings, pos)
+            _, raw_oid, inner = _read(binding, 0)
+            value_tag, raw_value, _ = _read(binding, inner)
+            varbinds.append((_decode_oid(raw_oid), decode_value(value_tag, raw_value)))
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"Malformed SNMP message: {e}")
+    return Message(community.decode(errors="replace"), pdu, *fields, varbinds)
+
+# --- Transporte ---
+
+class SnmpClient(asyncio.DatagramProtocol):
+    """
+    Cliente SNMPv2c asíncrono sobre un solo socket UDP. Uso:
+
+        async with SnmpClient() as client:
+            await client.bulk_walk(host, 161, "public", columns)
+    """
+
+    def __init__(self, timeout: float = settings.SNMP_TIMEOUT, retries: int = settings.SNMP_RETRIES):
+        self.timeout = timeout
+        self.retries = retries
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(random.randrange(1, 1 << 30))
+
+    async def __aenter__(self) -> "SnmpClient":
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=("0.0.0.0", 0))
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self.transport:
+            self.transport.close()
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        # Con miles de equipos las respuestas llegan en ráfaga: el buffer por
+        # defecto (~200 KB) descarta datagramas y obliga a reintentar
+        sock = transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        except OSError:
+            pass
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            message = decode_message(data)
+        except ValueError:
+            return
+        future = self._pending.get(message.request_id)
+        if future and not future.done():
+            future.set_result(message)
+
+    def error_received(self, exc) -> None:
+        # ICMP port unreachable y similares: la petición expira por timeout
+        pass
+
+    async def request(
+        self, host: str, port: int, community: str, pdu: int, oids: Sequence[Oid],
+        error_status: int = 0, error_index: int = 0,
+    ) -> Message:
+        loop = asyncio.get_running_loop()
+        for _ in range(self.retries + 1):
+            request_id = next(self._ids) & 0x7FFFFFFF
+            future = loop.create_future()
+            self._pending[request_id] = future
+            varbinds = [(oid, encode_value(NULL)) for oid in oids]
+            self.transport.sendto(
+                encode_message(community, pdu, request_id, error_status, error_index, varbinds), (host, port)
+            )
+            try:
+                response = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self._pending.pop(request_id, None)
+            if response.error_status:
+                raise SnmpError(f"SNMP error-status {response.error_status} from {host}")
+            return response
+        raise SnmpError(f"SNMP timeout from {host}:{port}")
+
+    async def bulk_walk(
+        self, host: str, port: int, community: str, columns: Sequence[Oid],
+        scalars: Sequence[Oid] = (), max_repetitions: int = settings.SNMP_MAX_REPETITIONS,
+    ) -> Tuple[Dict[Oid, Any], Dict[Oid, Dict[Oid, Any]]]:
+        """
+        Recorre varias columnas a la vez con GETBULK. Los escalares van como
+        non-repeaters en la primera petición. Devuelve
+        ({escalar: valor}, {columna: {índice: valor}}).
+        """
+        scalar_values: Dict[Oid, Any] = {}
+        tables: Dict[Oid, Dict[Oid, Any]] = {column: {} for column in columns}
+        cursors = {column: column for column in columns}
+        remaining = list(columns)
+        pending_scalars = list(scalars)
+
+        while remaining or pending_scalars:
+            oids = pending_scalars + [cursors[column] for column in remaining]
+            response = await self.request(
+                host, port, community, GET_BULK_REQUEST, oids, len(pending_scalars), max_repetitions
+            )
+            varbinds = response.varbinds
+            for scalar, (oid, value) in zip(pending_scalars, varbinds):
+                scalar_values[scalar] = value if oid == scalar + (0,) else None
+            varbinds = varbinds[len(pending_scalars):]
+            pending_scalars = []
+
+            done = set()
+            progressed = False
+            for position, (oid, value) in enumerate(varbinds):
+                column = remaining[position % len(remaining)] if remaining else None
+                if column is None or column in done:
+                    continue
+                if value is None or oid[:len(column)] != column:
+                    done.add(column)
+                    continue
+                tables[column][oid[len(column):]] = value
+                cursors[column] = oid
+                progressed = True
+            if not progressed:
+                break
+            remaining = [column for column in remaining if column not in done]
+
+        return scalar_values, tables
+
+# --- Salud ---
+
+def format_uptime(ticks: Optional[int]) -> str:
+    """TimeTicks (centésimas) al formato de RouterOS: 1w2d3h4m5s"""
+    if ticks is None:
+        return ""
+    seconds = ticks // 100
+    parts = []
+    for suffix, size in (("w", 604800), ("d", 86400), ("h", 3600), ("m", 60)):
+        value, seconds = divmod(seconds, size)
+        if value:
+            parts.append(f"{value}{suffix}")
+    if seconds or not parts:
+        parts.append(f"{seconds}s")
+    return "".join(parts)
+
+def build_health(scalars: Dict[Oid, Any], tables: Dict[Oid, Dict[Oid, Any]]) -> Dict[str, Any]:
+    """
+    Mismos campos que mikrotik.get_health, más los contadores de interfaz.
+    La memoria es la entrada hrStorageRam de HOST-RESOURCES-MIB.
+    """
+    loads = list(tables.get(HR_PROCESSOR_LOAD, {}).values())
+    memory_total = memory_used = 0
+    for index, storage_type in tables.get(HR_STORAGE_TYPE, {}).items():
+        if storage_type == HR_STORAGE_RAM:
+            units = tables[HR_STORAGE_UNITS].get(index) or 1
+            memory_total = (tables[HR_STORAGE_SIZE].get(index) or 0) * units
+            memory_used = (tables[HR_STORAGE_USED].get(index) or 0) * units
+            break
+
+    interfaces = [
+        {
+            'name': name,
+            'running': tables[IF_OPER_STATUS].get(index) == 1,
+            'rx_bytes': tables[IF_HC_IN_OCTETS].get(index),
+            'tx_bytes': tables[IF_HC_OUT_OCTETS].get(index),
+        }
+        for index, name in tables.get(IF_NAME, {}).items()
+    ]
+
+    descr = scalars.get(SYS_DESCR) or ""
+    return {
+        'cpu_load': round(sum(loads) / len(loads)) if loads else 0,
+        'memory_total': memory_total,
+        'memory_free': memory_total - memory_used,
+        'memory_used': memory_used,
+        'uptime': format_uptime(scalars.get(SYS_UPTIME)),
+        'version': scalars.get(MTXR_LIC_VERSION) or '',
+        # sysDescr en RouterOS es "RouterOS <placa>"
+        'board_name': scalars.get(MTXR_BOARD_NAME) or descr.replace("RouterOS", "").strip(),
+        'interfaces': interfaces,
+        'checked_at': datetime.now().isoformat()
+    }
+
+async def collect_health_many(
+    devices: Iterable[Any], client: Optional[SnmpClient] = None, concurrency: int = settings.SNMP_CONCURRENCY,
+) -> Dict[int, Any]:
+    """
+    Salud de muchos equipos en paralelo. Devuelve {device_id: salud} o
+    {device_id: excepción} para los que fallan, sin abortar el resto.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _collect(snmp: SnmpClient, device) -> Dict[str, Any]:
+        async with semaphore:
+            community = vault.decrypt_cached(device.snmp_comunidad_enc)
+            scalars, tables = await snmp.bulk_walk(
+                device.ip, device.snmp_puerto, community, HEALTH_COLUMNS, HEALTH_SCALARS
+            )
+            if SYS_UPTIME not in scalars or scalars[SYS_UPTIME] is None:
+                raise SnmpError(f"No sysUpTime from {device.ip}")
+            return build_health(scalars, tables)
+
+    async def _run(snmp: SnmpClient) -> Dict[int, Any]:
+        devices_list = list(devices)
+        results = await asyncio.gather(*(_collect(snmp, d) for d in devices_list), return_exceptions=True)
+        return {device.id: result for device, result in zip(devices_list, results)}
+
+    if client is not None:
+        return await _run(client)
+    async with SnmpClient() as snmp:
+        return await _run(snmp)
+
+def collect_health(devices: Iterable[Any]) -> Dict[int, Any]:
+    """Versión síncrona para workers de Celery"""
+    return asyncio.run(collect_health_many(devices))
+
+def get_health(device: Any) -> Dict[str, Any]:
+    """Equivalente SNMP de mikrotik.get_health para un solo equipo"""
+    result = collect_health([device])[device.id]
+    if isinstance(result, Exception):
+        raise ValueError(f"Error getting device health: {str(result)}")
+    return result
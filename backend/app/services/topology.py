@@ -0,0 +1,178 @@
+"""
+Topología de la flota a partir de /ip/neighbor.
+
+Los vecinos descubiertos forman un grafo no dirigido por usuario. Se orienta
+como árbol con un BFS desde los equipos raíz (equipos.raiz); en componentes
+sin raíz marcada se usa el equipo con más vecinos. El resultado es un índice
+padre -> hijos que permite, durante un ciclo, marcar como "inalcanzable vía
+padre" todo lo que cuelga de un equipo caído sin intentar conectar.
+"""
+from array import array
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+
+from app.core.redis_client import get_redis
+
+NO_PARENT = -1
+
+def build_parent_index(
+    nodes: Iterable[int], edges: Iterable[Tuple[int, int]], roots: Iterable[int] = ()
+) -> Dict[int, int]:
+    """
+    {equipo: padre} (NO_PARENT para las raíces) con BFS multi-origen: cada
+    equipo cuelga del vecino por el que está a menos saltos de una raíz.
+    """
+    adjacency: Dict[int, List[int]] = defaultdict(list)
+    nodes = set(nodes)
+    for a, b in edges:
+        if a != b and a in nodes and b in nodes:
+            adjacency[a].append(b)
+            adjacency[b].append(a)
+
+    parents: Dict[int, int] = {}
+
+    def _bfs(starts: Iterable[int]) -> None:
+        queue = deque()
+        for start in starts:
+            if start not in parents:
+                parents[start] = NO_PARENT
+                queue.append(start)
+        while queue:
+            node = queue.popleft()
+            for neighbor in adjacency[node]:
+                if neighbor not in parents:
+                    parents[neighbor] = node
+                    queue.append(neighbor)
+
+    _bfs(root for root in roots if root in nodes)
+    # Componentes sin raíz marcada: el nodo de mayor grado (empate: menor id)
+    for node in sorted(nodes, key=lambda n: (-len(adjacency[n]), n)):
+        if node not in parents:
+            _bfs([node])
+    return parents
+
+class TopologyIndex:
+    """
+    Árbol de dependencias en memoria. Los ids se compactan a posiciones de
+    arrays para que recorridos sobre decenas de miles de equipos sean O(n)
+    sin objetos por nodo.
+    """
+
+    def __init__(self, parents: Dict[int, int]):
+        self.ids = array("q", sorted(parents))
+        self._position = {device_id: i for i, device_id in enumerate(self.ids)}
+        size = len(self.ids)
+        self._parent = array("l", [NO_PARENT]) * size
+        children: List[List[int]] = [[] for _ in range(size)]
+        for device_id, parent in parents.items():
+            if parent != NO_PARENT and parent in self._position:
+                child, parent_pos = self._position[device_id], self._position[parent]
+                self._parent[child] = parent_pos
+                children[parent_pos].append(child)
+        self._children = children
+
+        # Orden BFS desde las raíces: profundidad y tamaño de subárbol en O(n)
+        self._depth = array("l", [0]) * size
+        self._subtree = array("l", [1]) * size
+        order = [i for i in range(size) if self._parent[i] == NO_PARENT]
+        for i in order:
+            for child in children[i]:
+                self._depth[child] = self._depth[i] + 1
+                order.append(child)
+        for i in reversed(order):
+            if self._parent[i] != NO_PARENT:
+                self._subtree[self._parent[i]] += self._subtree[i]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, device_id: int) -> bool:
+        return device_id in self._position
+
+    def parent(self, device_id: int) -> Optional[int]:
+        position = self._position.get(device_id)
+        if position is None or self._parent[position] == NO_PARENT:
+            return None
+        return self.ids[self._parent[position]]
+
+    def depth(self, device_id: int) -> int:
+        position = self._position.get(device_id)
+        return self._depth[position] if position is not None else 0
+
+    def descendant_count(self, device_id: int) -> int:
+        position = self._position.get(device_id)
+        return self._subtree[position] - 1 if position is not None else 0
+
+    def descendants(self, device_id: int) -> List[int]:
+        position = self._position.get(device_id)
+        if position is None:
+            return []
+        found = []
+        stack = list(self._children[position])
+        while stack:
+            i = stack.pop()
+            found.append(self.ids[i])
+            stack.extend(self._children[i])
+        return found
+
+    def down_ancestor(self, device_id: int, down: Set[int]) -> Optional[int]:
+        """Ancestro caído más cercano (None si el camino a la raíz está sano)"""
+        position = self._position.get(device_id)
+        if position is None:
+            return None
+        i = self._parent[position]
+        while i != NO_PARENT:
+            if self.ids[i] in down:
+                return self.ids[i]
+            i = self._parent[i]
+        return None
+
+    def to_parents(self) -> Dict[int, int]:
+        return {
+            self.ids[i]: (self.ids[self._parent[i]] if self._parent[i] != NO_PARENT else NO_PARENT)
+            for i in range(len(self.ids))
+        }
+
+class TopologyStore:
+    """
+    Índice de padres en Redis (hash `{prefix}:parent`) con una versión para
+    que cada proceso lo recargue solo cuando cambia, más el set de equipos
+    caídos que comparten los shards de un ciclo.
+    """
+
+    _cache: Dict[str, Tuple[str, TopologyIndex]] = {}
+
+    def __init__(self, client: Optional[redis.Redis] = None, prefix: str = "mm:topo"):
+        self.client = client or get_redis()
+        self.prefix = prefix
+
+    def save(self, parents: Dict[int, int], chunk: int = 5000) -> None:
+        pipe = self.client.pipeline()
+        pipe.delete(f"{self.prefix}:parent")
+        items = list(parents.items())
+        for start in range(0, len(items), chunk):
+            pipe.hset(f"{self.prefix}:parent", mapping=dict(items[start:start + chunk]))
+        pipe.incr(f"{self.prefix}:version")
+        pipe.execute()
+
+    def load(self) -> TopologyIndex:
+        version = self.client.get(f"{self.prefix}:version") or "0"
+        cached = self._cache.get(self.prefix)
+        if cached and cached[0] == version:
+            return cached[1]
+        raw = self.client.hgetall(f"{self.prefix}:parent")
+        index = TopologyIndex({int(k): int(v) for k, v in raw.items()})
+        self._cache[self.prefix] = (version, index)
+        return index
+
+    def down(self) -> Set[int]:
+        return {int(device_id) for device_id in self.client.smembers(f"{self.prefix}:down")}
+
+    def mark_down(self, device_id: int) -> None:
+        self.client.sadd(f"{self.prefix}:down", device_id)
+
+    def mark_up(self, device_ids: List[int]) -> None:
+        if device_ids:
+            self.client.srem(f"{self.prefix}:down", *device_ids)
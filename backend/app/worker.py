@@ -1,16 +1,41 @@
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
-from celery import shared_task
+from celery import chord, group, shared_task
 from sqlalchemy.orm import Session
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.redis_client import get_redis
+from app.core.vault import vault
 from app.db.session import SessionLocal
 from app.db.models.device import Device
 from app.db.models.alert import Alert
-from app.services.mikrotik import analyze_device_health, get_health, get_logs
-from app.services.ai_analysis import analyze_logs_with_ai, generate_alert_from_ai_analysis
+from app.db.models.plan import Plan
+from app.db.models.user import User
+from app.db.models.topology import DeviceNeighbor
+from app.services.circuit_breaker import DeviceCircuitBreaker
+from app.services.config_store import ConfigStore
+from app.services.device_import import ImportJobStore, run_device_import
+from app.services.device_state import DeviceStateCache, worst_severity
+from app.services.fair_share import FairShareQueue, FairShareState, resolve_share, tenant_shares
+from app.services.ingest import IngestWriter
+from app.services.key_rotation import rotate_device_credentials
+from app.services.locks import Lease, LeaseManager
+from app.services.notifications import NotificationPipeline
+from app.services.polling import PollResultWriter, PollTarget, load_poll_targets
+from app.services.scheduler import RedisDueTimeScheduler, resolve_bounds
+from app.services.sharding import ConsistentHashRing
+from app.services.topology import TopologyStore, build_parent_index
+
+# Colectores y análisis: se cargan en el primer uso, no al arrancar el worker
+mikrotik = lazy_import("app.services.mikrotik")
+snmp = lazy_import("app.services.snmp")
+ai_analysis = lazy_import("app.services.ai_analysis")
 
 logger = logging.getLogger(__name__)
 
@@ -21,15 +46,16 @@ def monitor_devices() -> str:
     try:
         devices = db.query(Device).filter(Device.activo==True).all()
         for device in devices:
-            analyze_device_health(device, db)
+            mikrotik.analyze_device_health(device, db)
         return f"Monitoreados {len(devices)} dispositivos"
     finally:
         db.close()
 
 @celery_app.task
-def analyze_device_logs_with_ai(device_id: int) -> str:
+def analyze_device_logs_with_ai(device_id: int, usuario_id: Optional[int] = None) -> str:
     """
-    Tarea para analizar logs de un dispositivo con IA.
+    Tarea para analizar logs de un dispositivo con IA. Con `usuario_id`
+    viene de la cola justa y libera su cupo al terminar.
     """
     db = SessionLocal()
     try:
@@ -38,28 +64,28 @@ def analyze_device_logs_with_ai(device_id: int) -> str:
         if not device:
             return f"Device with ID {device_id} not found"
         
-        if not device.is_active:
-            return f"Device {device.name} is not active"
+        if not device.activo:
+            return f"Device {device.nombre} is not active"
         
         try:
             # Obtener logs recientes
-            logs = get_logs(device, limit=100)
+            logs = mikrotik.get_logs(device, limit=100)
             
             # Analizar logs con IA
-            analysis = analyze_logs_with_ai(logs, device.name)
+            analysis = ai_analysis.analyze_logs_with_ai(logs, device.nombre)
             
             # Generar alerta basada en análisis
-            alert = generate_alert_from_ai_analysis(analysis, device)
+            alert = ai_analysis.generate_alert_from_ai_analysis(analysis, device)
             
             if alert:
                 db.add(alert)
                 db.commit()
-                return f"Generated AI analysis alert for device {device.name}"
+                return f"Generated AI analysis alert for device {device.nombre}"
             else:
-                return f"No alert generated for device {device.name}"
+                return f"No alert generated for device {device.nombre}"
         
         except Exception as e:
-            logger.error(f"Error analyzing logs for device {device.name}: {str(e)}")
+            logger.error(f"Error analyzing logs for device {device.nombre}: {str(e)}")
             return f"Error: {str(e)}"
     
     except Exception as e:
@@ -68,6 +94,28 @@ def analyze_device_logs_with_ai(device_id: int) -> str:
     
     finally:
         db.close()
+        if usuario_id is not None:
+            FairShareQueue(name="ai").release(usuario_id, device_id)
+
+@celery_app.task
+def dispatch_ai_analysis() -> str:
+    """
+    Cada AI_DISPATCH_SECONDS: reparte los análisis pendientes entre clientes
+    por peso del plan, sin pasar de AI_TENANT_CONCURRENCY en curso por cliente.
+    """
+    queue = FairShareQueue(name="ai")
+    pending = queue.pending(settings.AI_DISPATCH_MAX)
+    if not pending:
+        return "Sin análisis pendientes"
+    db = SessionLocal()
+    try:
+        shares = tenant_shares(db, pending, settings.AI_TENANT_CONCURRENCY)
+    finally:
+        db.close()
+    dispatched = queue.dispatch(pending, shares, settings.AI_DISPATCH_MAX, settings.AI_TASK_TTL)
+    for usuario_id, device_id in dispatched:
+        analyze_device_logs_with_ai.delay(device_id, usuario_id)
+    return f"Despachados {len(dispatched)} análisis de {len(pending)} clientes"
 
 @celery_app.task
 def cleanup_old_alerts(days: int = 30) -> str:
@@ -92,70 +140,549 @@ def cleanup_old_alerts(days: int = 30) -> str:
     finally:
         db.close()
 
-@shared_task(
-    queue="monitor",
-    autoretry_for=(Exception,),
-    retry_backoff=True,
-    retry_backoff_max=600,
-    max_retries=3
-)
+def _health_alerts(device: PollTarget, health: Dict[str, Any], logs: List[Dict[str, Any]]) -> List[Alert]:
+    """Reglas de alerta comunes a ambos colectores (API y SNMP)"""
+    alerts: List[Alert] = []
+    if health['cpu_load'] > 80:
+        alerts.append(Alert(
+            equipo_id=device.id,
+            estado="Alerta Mayor",
+            titulo=f"CPU Alta: {health['cpu_load']}%",
+            descripcion=f"La carga de CPU del dispositivo {device.nombre} está alta"
+        ))
+
+    memory_used_pct = (health['memory_used'] / health['memory_total']) * 100 if health['memory_total'] else 0
+    if memory_used_pct > 90:
+        alerts.append(Alert(
+            equipo_id=device.id,
+            estado="Alerta Crítica",
+            titulo=f"Memoria Crítica: {memory_used_pct:.1f}%",
+            descripcion=f"El uso de memoria en {device.nombre} es crítico"
+        ))
+
+    # Analizar logs críticos recientes (SNMP no da acceso a logs)
+    critical_logs = [log for log in logs if log['severity'] == 'critical']
+    if critical_logs:
+        alerts.append(Alert(
+            equipo_id=device.id,
+            estado="Alerta Crítica",
+            titulo="Logs Críticos Detectados",
+            descripcion=f"Se encontraron {len(critical_logs)} logs críticos"
+        ))
+    return alerts
+
+def _poll_result(
+    device: PollTarget,
+    breaker: DeviceCircuitBreaker,
+    health: Optional[Dict[str, Any]] = None,
+    logs: Optional[List[Dict[str, Any]]] = None,
+    error: Optional[Exception] = None,
+    dependents: int = 0,
+    fence: Optional[Tuple[str, int]] = None,
+) -> Tuple[bool, List[Alert], Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Evalúa el resultado de una consulta y devuelve (éxito, alertas, salud,
+    logs). El shard que llama los publica en lote en los streams de ingesta.
+    `dependents` son los equipos que cuelgan de este en la topología: si cae,
+    su alerta es la causa raíz de todos ellos. `fence` es el del lease del
+    equipo: el circuit breaker ignora resultados de un lease ya superado.
+    """
+    if error is None:
+        try:
+            alerts = _health_alerts(device, health, logs or [])
+            breaker.record_success(device.id, fence)
+            return True, alerts, health, logs or []
+        except Exception as e:
+            error = e
+
+    logger.warning(f"Error polling device {device.id}: {str(error)}")
+    # Una sola alerta por caída: solo en el primer fallo consecutivo
+    alerts = []
+    if breaker.record_failure(device.id, fence) == 1:
+        if dependents:
+            # Sus dependientes no se consultan ni alertan: una sola alerta para toda la rama
+            alerts.append(Alert(
+                equipo_id=device.id,
+                estado="Alerta Crítica",
+                # El nombre va en la descripción: titulo es String(100)
+                titulo="Causa Raíz: Equipo sin respuesta",
+                descripcion=(
+                    f"{device.nombre}: {dependents} equipos dependientes quedan inalcanzables vía este equipo "
+                    f"y no se consultarán hasta que responda. Error: {str(error)}"
+                )
+            ))
+        else:
+            alerts.append(Alert(
+                equipo_id=device.id,
+                estado="Alerta Crítica",
+                titulo="Error de Monitoreo",
+                descripcion=f"Error al monitorear dispositivo: {str(error)}"
+            ))
+    return False, alerts, None, []
+
+def _poll_device(
+    device: PollTarget, breaker: DeviceCircuitBreaker, dependents: int = 0, fence: Optional[Tuple[str, int]] = None
+) -> Tuple[bool, List[Alert], Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Consulta un dispositivo por la API de RouterOS"""
+    try:
+        # Obtener métricas y logs
+        health = mikrotik.get_health(device)
+        logs = mikrotik.get_logs(device, limit=50)
+    except Exception as e:
+        return _poll_result(device, breaker, error=e, dependents=dependents, fence=fence)
+    return _poll_result(device, breaker, health, logs, fence=fence)
+
+def _active_devices_with_bounds(db: Session):
+    """Dispositivos activos con su cliente, su reparto y sus límites de intervalo propios y del plan"""
+    return (
+        db.query(
+            Device.id, Device.usuario_id, Plan.peso, Plan.concurrencia,
+            Device.intervalo_min, Device.intervalo_max, Plan.intervalo_min, Plan.intervalo_max,
+        )
+        .join(User, Device.usuario_id == User.id)
+        .outerjoin(Plan, User.plan_id == Plan.id)
+        .filter(Device.activo==True)
+    )
+
+@shared_task(queue="monitor")
 def poll_devices():
-    """Monitorea todos los dispositivos activos"""
+    """
+    Se ejecuta cada POLL_TICK_SECONDS: sincroniza el planificador con los
+    dispositivos activos y despacha solo los vencidos, repartidos en shards
+    (hashing consistente por id) como un chord en la cola monitor.
+    Los vencidos se eligen por cliente con deficit round robin (peso del
+    plan, POLL_TENANT_CONCURRENCY en curso, POLL_DISPATCH_MAX por tick): un
+    cliente con miles de routers no retrasa a los pequeños.
+    """
+    # Un solo despachador a la vez: un tick solapado o reentregado se omite
+    # y los dispositivos vencidos se recogen en el siguiente tick
+    leases = LeaseManager()
+    cycle = leases.acquire("cycle", settings.POLL_CYCLE_LEASE_TTL)
+    if not cycle:
+        return "Despacho anterior en curso, tick omitido"
+
+    try:
+        db = SessionLocal()
+        try:
+            bounds, tenants, shares = {}, {}, {}
+            for row in _active_devices_with_bounds(db):
+                bounds[row[0]] = resolve_bounds(*row[4:])
+                tenants[row[0]] = row[1]
+                shares[row[1]] = resolve_share(row[2], row[3], settings.POLL_TENANT_CONCURRENCY)
+        finally:
+            db.close()
+
+        scheduler = RedisDueTimeScheduler(get_redis())
+        now = time.time()
+        # Los desactivados (o de usuarios inactivos) dejan de consultarse:
+        # su último estado no debe seguir mostrándose como actual
+        DeviceStateCache().forget_many(scheduler.sync(bounds, now))
+        pending = defaultdict(list)
+        for device_id, due_at in scheduler.due(now):
+            if device_id in tenants:
+                pending[tenants[device_id]].append((device_id, due_at))
+        dispatched = FairShareState(name="poll").dispatch(
+            pending, shares, settings.POLL_DISPATCH_MAX, settings.POLL_CLAIM_TTL, now
+        )
+        # Orden de despacho: dentro de cada shard los clientes van intercalados
+        device_ids = [device_id for _, device_id in dispatched]
+        scheduler.claim(device_ids, now)
+        if not device_ids:
+            return "Sin dispositivos pendientes"
+
+        shards = ConsistentHashRing(settings.POLL_SHARDS).partition(device_ids)
+        header = group(poll_device_shard.s(shard_ids) for shard_ids in shards)
+        chord(header)(summarize_poll_cycle.s(started_at=time.time()))
+        return f"Despachados {len(device_ids)} dispositivos en {len(shards)} shards"
+    finally:
+        leases.release(cycle)
+
+@celery_app.task
+def import_devices(job_id: str, usuario_id: int, rows: List[Dict[str, Any]], test_connections: bool = True) -> str:
+    """
+    Importación masiva en segundo plano. Las filas llegan validadas y con
+    las credenciales ya cifradas desde POST /devices/bulk.
+    """
     db = SessionLocal()
+    store = ImportJobStore()
     try:
-        devices = db.query(Device).filter(Device.activo==True).all()
-        alerts_generated = 0
+        result = run_device_import(db, store, job_id, usuario_id, rows, test_connections)
+        return f"Importados {result['created']} dispositivos, {result['failed']} con error"
 
-        for device in devices:
-            try:
-                # Obtener métricas y logs
-                health = get_health(device)
-                logs = get_logs(device, limit=50)
-
-                # Analizar métricas de salud
-                if health['cpu_load'] > 80:
-                    db.add(Alert(
-                        equipo_id=device.id,
-                        estado="Alerta Mayor",
-                        titulo=f"CPU Alta: {health['cpu_load']}%",
-                        descripcion=f"La carga de CPU del dispositivo {device.nombre} está alta"
-                    ))
-                    alerts_generated += 1
-
-                memory_used_pct = (health['memory_used'] / health['memory_total']) * 100
-                if memory_used_pct > 90:
-                    db.add(Alert(
-                        equipo_id=device.id,
-                        estado="Alerta Crítica", 
-                        titulo=f"Memoria Crítica: {memory_used_pct:.1f}%",
-                        descripcion=f"El uso de memoria en {device.nombre} es crítico"
-                    ))
-                    alerts_generated += 1
-
-                # Analizar logs críticos recientes
-                critical_logs = [log for log in logs if log['severity'] == 'critical']
-                if critical_logs:
-                    db.add(Alert(
-                        equipo_id=device.id,
-                        estado="Alerta Crítica",
-                        titulo="Logs Críticos Detectados",
-                        descripcion=f"Se encontraron {len(critical_logs)} logs críticos"
-                    ))
-                    alerts_generated += 1
+    except Exception as e:
+        logger.error(f"Error in import_devices task: {str(e)}")
+        store.set_status(job_id, "failed")
+        return f"Error: {str(e)}"
 
-                db.commit()
+    finally:
+        db.close()
+
+ROTATION_CHECKPOINT_KEY = "mm:rotation:last_id"
+
+@celery_app.task
+def rotate_fernet_keys(batch_size: int = settings.KEY_ROTATION_BATCH_SIZE) -> str:
+    """
+    Re-encripta las credenciales de todos los dispositivos con la clave
+    Fernet primaria. Si se interrumpe, la siguiente ejecución continúa
+    desde el último lote confirmado.
+    """
+    client = get_redis()
+    start_after = int(client.get(ROTATION_CHECKPOINT_KEY) or 0)
+    read_db = SessionLocal()
+    write_db = SessionLocal()
+    try:
+        result = rotate_device_credentials(
+            read_db, write_db, vault,
+            batch_size=batch_size,
+            start_after=start_after,
+            on_batch=lambda last_id: client.set(ROTATION_CHECKPOINT_KEY, last_id),
+        )
+        client.delete(ROTATION_CHECKPOINT_KEY)
+        return f"Rotadas credenciales de {result['rotated']} dispositivos"
+
+    except Exception as e:
+        logger.error(f"Error in rotate_fernet_keys task: {str(e)}")
+        return f"Error: {str(e)}"
+
+    finally:
+        read_db.close()
+        write_db.close()
+
+@shared_task(queue="monitor")
+def poll_device_shard(device_ids: List[int]) -> Dict[str, int]:
+    """
+    Monitorea un shard de dispositivos. La sesión de BD solo se usa para
+    leer las instantáneas y se cierra antes de conectar con ningún equipo;
+    muestras, logs y alertas se publican en los streams de ingesta.
+    Sin reintento de la tarea: repetir el shard volvería a consultar los
+    equipos ya hechos. Un error con un equipo se registra y el planificador
+    lo vuelve a dar por vencido al expirar su reclamo (POLL_CLAIM_TTL).
+    """
+    db = SessionLocal()
+    try:
+        targets = load_poll_targets(db, device_ids)
+    finally:
+        db.close()
+
+    breaker = DeviceCircuitBreaker()
+    scheduler = RedisDueTimeScheduler(get_redis())
+    leases = LeaseManager()
+    states = DeviceStateCache()
+    topology_store = TopologyStore()
+    topology = topology_store.load()
+    # Caídos conocidos (de este ciclo en otros shards o de ciclos anteriores)
+    down = topology_store.down()
+    recovered: List[int] = []
+    # Padres antes que hijos: un hijo detrás de un padre recién caído se omite.
+    # A igual profundidad, el orden del despachador (clientes intercalados)
+    order = {device_id: position for position, device_id in enumerate(device_ids)}
+    targets.sort(key=lambda target: (topology.depth(target.id), order[target.id]))
+    writer = PollResultWriter(settings.POLL_ALERT_BATCH_SIZE)
+    latest: List[Dict[str, Any]] = []
+    summary = {
+        "devices": len(targets), "polled": 0, "failed": 0, "skipped": 0, "locked": 0, "suppressed": 0,
+        "alerts": 0, "shed": 0, "errors": 0,
+    }
+
+    def _error(target: PollTarget, error: Exception) -> None:
+        logger.error(f"Error processing device {target.id} in shard: {str(error)}")
+        summary["errors"] += 1
+
+    def _claim(target: PollTarget) -> Optional[Lease]:
+        # Solo un worker consulta cada router; una tarea reentregada lo salta
+        lease = leases.acquire(f"device:{target.id}", settings.POLL_DEVICE_LEASE_TTL)
+        if not lease:
+            summary["locked"] += 1
+            return None
+        # Detrás de un padre caído: inalcanzable vía padre, sin conectar ni alertar
+        via = topology.down_ancestor(target.id, down)
+        if via is not None:
+            summary["suppressed"] += 1
+            latest.append(DeviceStateCache.build(target.id, target.usuario_id, None, None, unreachable_via=via))
+            # Intervalo corto: se vuelve a consultar pronto cuando el padre responda
+            scheduler.complete(target.id, target.bounds, time.time(), alerting=True)
+            leases.release(lease)
+            return None
+        # Circuito abierto: no gastar conexión ni reintentos en un equipo caído
+        if not breaker.allow(target.id):
+            summary["skipped"] += 1
+            scheduler.complete(target.id, target.bounds, time.time())
+            leases.release(lease)
+            return None
+        return lease
 
+    def _record(target: PollTarget, lease: Lease, result) -> None:
+        ok, alerts, health, logs = result
+        # Fencing: si el lease expiró y otro worker tomó el equipo, descartar
+        if not leases.is_current(lease):
+            logger.warning(f"Stale lease for device {target.id}, discarding results")
+            summary["locked"] += 1
+            return
+        summary["polled" if ok else "failed"] += 1
+        # Solo interesan en el set los equipos con dependientes
+        if not ok and topology.descendant_count(target.id):
+            down.add(target.id)
+            topology_store.mark_down(target.id)
+        elif ok and target.id in down:
+            down.discard(target.id)
+            recovered.append(target.id)
+        # El fence se comprobó arriba con el lease retenido; al publicar el lote
+        # ya está liberado y otro worker puede haberlo tomado legítimamente
+        writer.add(target, health, logs, alerts)
+        severity = worst_severity(a.estado for a in alerts) if ok else "Alerta Crítica"
+        latest.append(DeviceStateCache.build(target.id, target.usuario_id, health, severity))
+        # Más frecuencia mientras alerta o es volátil, menos si está estable
+        scheduler.complete(
+            target.id, target.bounds, time.time(),
+            alerting=bool(alerts), cpu_load=health['cpu_load'] if health else None
+        )
+
+    # Equipos SNMP: todos a la vez en un event loop, antes de los de la API
+    claimed = []
+    for target in targets:
+        if target.colector == "snmp":
+            try:
+                lease = _claim(target)
+            except Exception as e:
+                _error(target, e)
+                continue
+            if lease:
+                claimed.append((target, lease))
+    if claimed:
+        try:
+            results = snmp.collect_health(target for target, _ in claimed)
+        except Exception as e:
+            results = {}
+            for target, _ in claimed:
+                _error(target, e)
+        for target, lease in claimed:
+            try:
+                try:
+                    result = results.get(target.id)
+                    if isinstance(result, Exception):
+                        dependents = topology.descendant_count(target.id)
+                        _record(target, lease, _poll_result(
+                            target, breaker, error=result, dependents=dependents, fence=leases.fence(lease)
+                        ))
+                    elif result is not None:
+                        _record(target, lease, _poll_result(target, breaker, result, fence=leases.fence(lease)))
+                finally:
+                    leases.release(lease)
             except Exception as e:
-                db.add(Alert(
-                    equipo_id=device.id,
-                    estado="Alerta Crítica",
-                    titulo="Error de Monitoreo",
-                    descripcion=f"Error al monitorear dispositivo: {str(e)}"
+                _error(target, e)
+
+    for target in targets:
+        if target.colector == "snmp":
+            continue
+        try:
+            lease = _claim(target)
+            if not lease:
+                continue
+            try:
+                _record(target, lease, _poll_device(
+                    target, breaker, topology.descendant_count(target.id), fence=leases.fence(lease)
                 ))
-                db.commit()
-                alerts_generated += 1
+            finally:
+                leases.release(lease)
+        except Exception as e:
+            _error(target, e)
+
+    writer.flush()
+    summary["alerts"] = writer.published["alerts"]
+    summary["shed"] = writer.shed
+    # Último estado de todo el shard en un solo pipeline
+    states.write_many(latest)
+    topology_store.mark_up(recovered)
+    # Libera el cupo de concurrencia de cada cliente
+    inflight = defaultdict(list)
+    for target in targets:
+        inflight[target.usuario_id].append(target.id)
+    FairShareState(name="poll").release(inflight)
+    return summary
+
+@shared_task(queue="monitor")
+def backup_device_configs() -> str:
+    """Respaldo diario de /export: reparte los equipos activos en shards"""
+    db = SessionLocal()
+    try:
+        device_ids = [row.id for row in db.query(Device.id).filter(Device.activo==True)]
+    finally:
+        db.close()
+
+    shards = ConsistentHashRing(settings.POLL_SHARDS).partition(device_ids)
+    group(backup_config_shard.s(shard_ids) for shard_ids in shards).apply_async()
+    return f"Respaldo de configuración despachado para {len(device_ids)} dispositivos"
+
+@shared_task(queue="monitor")
+def backup_config_shard(device_ids: List[int]) -> Dict[str, int]:
+    """Guarda una versión deduplicada del export de cada equipo del shard"""
+    db = SessionLocal()
+    try:
+        store = ConfigStore(db)
+        breaker = DeviceCircuitBreaker()
+        summary = {"saved": 0, "unchanged": 0, "failed": 0, "skipped": 0}
+        for device in db.query(Device).filter(Device.id.in_(device_ids), Device.activo==True):
+            if not breaker.allow(device.id):
+                summary["skipped"] += 1
+                continue
+            try:
+                latest = store.latest(device.id)
+                version = store.save(device.id, mikrotik.get_config_export(device))
+                summary["unchanged" if latest and version.id == latest.id else "saved"] += 1
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Error backing up config for device {device.id}: {str(e)}")
+                summary["failed"] += 1
+        return summary
 
-        return f"Monitoreados {len(devices)} dispositivos, generadas {alerts_generated} alertas"
+    finally:
+        db.close()
 
+@shared_task(queue="monitor")
+def discover_topology() -> str:
+    """
+    Lee /ip/neighbor de los equipos activos repartidos en shards y, al
+    terminar todos, reconstruye el índice de topología.
+    """
+    db = SessionLocal()
+    try:
+        device_ids = [
+            row.id for row in db.query(Device.id).filter(Device.activo==True, Device.colector=="api")
+        ]
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+    shards = ConsistentHashRing(settings.POLL_SHARDS).partition(device_ids)
+    chord(group(discover_topology_shard.s(shard_ids) for shard_ids in shards))(rebuild_topology_index.si())
+    return f"Descubrimiento de topología despachado para {len(device_ids)} dispositivos"
+
+@shared_task(queue="monitor")
+def discover_topology_shard(device_ids: List[int]) -> Dict[str, int]:
+    """
+    Guarda las adyacencias entre equipos monitoreados del mismo usuario.
+    El vecino se resuelve por IP y, si no coincide, por nombre (identity).
+    """
+    db = SessionLocal()
+    try:
+        breaker = DeviceCircuitBreaker()
+        devices = db.query(Device).filter(Device.id.in_(device_ids), Device.activo==True).all()
+        by_ip: Dict[Tuple[int, str], int] = {}
+        by_name: Dict[Tuple[int, str], int] = {}
+        user_ids = {device.usuario_id for device in devices}
+        for row in db.query(Device.id, Device.usuario_id, Device.ip, Device.nombre).filter(
+            Device.usuario_id.in_(user_ids), Device.activo==True
+        ):
+            by_ip[(row.usuario_id, row.ip)] = row.id
+            by_name[(row.usuario_id, row.nombre)] = row.id
+
+        summary = {"discovered": 0, "links": 0, "failed": 0, "skipped": 0}
+        for device in devices:
+            if not breaker.allow(device.id):
+                summary["skipped"] += 1
+                continue
+            try:
+                neighbors = mikrotik.get_neighbors(device)
+            except Exception as e:
+                logger.warning(f"Error discovering neighbors for device {device.id}: {str(e)}")
+                summary["failed"] += 1
+                continue
+
+            links: Dict[int, str] = {}
+            for neighbor in neighbors:
+                # /ip/neighbor puede listar varias direcciones separadas por comas
+                addresses = [address.strip() for address in neighbor['address'].split(",")]
+                matches = [by_ip.get((device.usuario_id, address)) for address in addresses]
+                vecino_id = next((m for m in matches if m), None) or by_name.get((device.usuario_id, neighbor['identity']))
+                if vecino_id and vecino_id != device.id:
+                    links.setdefault(vecino_id, neighbor['interface'][:50])
+
+            # Sustituye las adyacencias del equipo por las vistas ahora
+            db.query(DeviceNeighbor).filter(DeviceNeighbor.equipo_id == device.id).delete(synchronize_session=False)
+            db.add_all(
+                DeviceNeighbor(equipo_id=device.id, vecino_id=vecino_id, interfaz=interfaz)
+                for vecino_id, interfaz in links.items()
+            )
+            db.commit()
+            summary["discovered"] += 1
+            summary["links"] += len(links)
+        return summary
+
+    finally:
+        db.close()
+
+@shared_task(queue="monitor")
+def rebuild_topology_index() -> str:
+    """
+    Orienta el grafo de vecinos desde los equipos raíz y publica el índice
+    padre -> hijos que usan los shards de monitoreo.
+    """
+    db = SessionLocal()
+    try:
+        active = {row.id: row.raiz for row in db.query(Device.id, Device.raiz).filter(Device.activo==True)}
+        edges = [
+            (row.equipo_id, row.vecino_id)
+            for row in db.query(DeviceNeighbor.equipo_id, DeviceNeighbor.vecino_id)
+            if row.equipo_id in active and row.vecino_id in active
+        ]
+    finally:
+        db.close()
+
+    # Solo los equipos con vecinos forman parte del índice
+    nodes = {device_id for edge in edges for device_id in edge}
+    parents = build_parent_index(nodes, edges, roots=[device_id for device_id in nodes if active[device_id]])
+    store = TopologyStore()
+    store.save(parents)
+    # Equipos dados de baja o sin vecinos ya no pueden bloquear a nadie
+    store.mark_up([device_id for device_id in store.down() if device_id not in nodes])
+    return f"Índice de topología con {len(parents)} equipos y {len(edges)} adyacencias"
+
+@shared_task(queue="monitor")
+def drain_ingest() -> Dict[str, int]:
+    """
+    Cada INGEST_DRAIN_SECONDS: escribe en BD lo que los shards publicaron en
+    los streams de ingesta, una transacción por stream y lote. Drena hasta
+    vaciarlos o hasta el siguiente tick, que continúa donde quedó. Devuelve
+    las entradas consumidas por stream.
+    """
+    writer = IngestWriter()
+    totals = {"health": 0, "logs": 0, "alerts": 0}
+    deadline = time.time() + settings.INGEST_DRAIN_SECONDS
+    while time.time() < deadline:
+        consumed = writer.run()
+        for kind, count in consumed.items():
+            totals[kind] += count
+        if not any(consumed.values()):
+            break
+    backlog = writer.backlog()
+    if any(backlog.values()):
+        logger.info(f"Ingest drained {totals}, backlog {backlog}")
+    return totals
+
+@celery_app.task
+def deliver_notifications() -> Dict[str, int]:
+    """
+    Cada NOTIFY_WINDOW_SECONDS: agrupa las alertas nuevas del stream en un
+    digest por usuario y destino, las entrega y procesa los reintentos.
+    """
+    pipeline = NotificationPipeline()
+    try:
+        summary = pipeline.run()
+        if summary["digests"]:
+            logger.info(f"Notifications delivered: {summary}")
+        return summary
+    finally:
+        pipeline.close()
+
+@shared_task(queue="monitor")
+def summarize_poll_cycle(results: List[Dict[str, int]], started_at: float) -> Dict[str, Any]:
+    """Agrega los resultados de los shards en un resumen del ciclo"""
+    summary: Dict[str, Any] = {
+        "shards": len(results), "devices": 0, "polled": 0, "failed": 0, "skipped": 0, "locked": 0,
+        "suppressed": 0, "alerts": 0, "shed": 0,
+    }
+    for result in results:
+        for key in ("devices", "polled", "failed", "skipped", "locked", "suppressed", "alerts", "shed"):
+            summary[key] += result.get(key, 0)
+    summary["duration_s"] = round(time.time() - started_at, 2)
+    logger.info(f"Poll cycle finished: {summary}")
+    return summary
@@ -0,0 +1,100 @@
+"""
+Crecimiento del almacén de configuraciones para una flota simulada.
+
+    python -m benchmarks.bench_config_store --devices 500 --days 30
+
+Cada equipo parte de una plantilla común con variaciones propias (identidad,
+direcciones, reglas extra). Cada día una fracción de equipos cambia unas
+pocas líneas. Se compara el texto completo diario con lo que realmente se
+guarda (fragmentos zstd únicos + índice de versiones).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db.base_class import Base  # noqa: E402
+from app.db.models import ConfigChunk, ConfigVersion  # noqa: E402
+from app.services.config_store import ConfigStore  # noqa: E402
+
+def template(rng: random.Random) -> list:
+    lines = ["/interface bridge\n", "add name=bridge-lan\n", "/interface ethernet\n"]
+    lines += [f"set [ find default-name=ether{i} ] comment=port{i}\n" for i in range(1, 11)]
+    lines += ["/ip firewall filter\n"]
+    lines += [
+        f"add action={rng.choice(['accept', 'drop'])} chain={rng.choice(['input', 'forward'])} "
+        f"protocol=tcp dst-port={rng.randint(1, 65535)} comment=rule{i}\n"
+        for i in range(300)
+    ]
+    lines += ["/queue simple\n"]
+    lines += [f"add max-limit={rng.randint(1, 100)}M/{rng.randint(1, 100)}M name=q{i} target=10.{i}.0.0/24\n"
+              for i in range(100)]
+    return lines
+
+def device_config(base: list, device_id: int, extra: list) -> str:
+    header = [f"# {time.strftime('%Y-%m-%d %H:%M:%S')} by RouterOS 7.12\n", "# software id = ABCD-1234\n"]
+    identity = ["/system identity\n", f"set name=router-{device_id}\n",
+                "/ip address\n", f"add address=10.{device_id % 250}.{device_id // 250}.1/24 interface=bridge-lan\n"]
+    return "".join(header + base + identity + extra)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--change-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/configs.db")
+    Base.metadata.create_all(engine, tables=[ConfigChunk.__table__, ConfigVersion.__table__])
+    db = sessionmaker(bind=engine, autoflush=False)()
+    store = ConfigStore(db)
+
+    base = template(rng)
+    extras = {device_id: [] for device_id in range(1, args.devices + 1)}
+    raw_total = 0
+    previous_stored = 0
+    started = time.perf_counter()
+    for day in range(1, args.days + 1):
+        for device_id, extra in extras.items():
+            if day > 1 and rng.random() < args.change_rate:
+                extra.append(f"/ip route\nadd dst-address=172.16.{rng.randint(0, 255)}.0/24 gateway=10.0.0.1\n")
+            config = device_config(base, device_id, extra)
+            raw_total += len(config.encode())
+            store.save(device_id, config)
+
+        chunk_bytes = db.query(func.coalesce(func.sum(func.length(ConfigChunk.datos)), 0)).scalar()
+        index_bytes = db.query(func.coalesce(func.sum(func.length(ConfigVersion.fragmentos)), 0)).scalar()
+        stored = chunk_bytes + index_bytes
+        if day in (1, 2) or day % 5 == 0 or day == args.days:
+            print(f"day {day:3d}: full text {raw_total / 1e6:8.1f} MB | stored {stored / 1e6:6.2f} MB "
+                  f"| growth {(stored - previous_stored) / 1e3:7.1f} KB/day | ratio {raw_total / stored:6.1f}x")
+        previous_stored = stored
+
+    elapsed = time.perf_counter() - started
+    versions = db.query(ConfigVersion).count()
+    chunks = db.query(ConfigChunk).count()
+    print(f"{args.devices * args.days} captures in {elapsed:.1f}s, {versions} versions, {chunks} unique chunks")
+
+    # Diff y restauración sobre el equipo con más cambios
+    device_id = max(extras, key=lambda d: len(extras[d]))
+    history = store.versions(device_id)
+    if len(history) >= 2:
+        started = time.perf_counter()
+        diff = store.diff(history[-1], history[0])
+        restored = store.restore(history[0])
+        print(f"diff ({diff.count(chr(10))} lines) + restore ({len(restored)} bytes) "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Tiempo de arranque en frío de la API y del worker.
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --target app.services.polling --top 15
+    python -m benchmarks.bench_import_time --update
+
+Importa cada objetivo en un intérprete nuevo con `python -X importtime`
+(--runs veces, se toma la mediana del tiempo acumulado del módulo) y lo
+compara con benchmarks/import_budget.json. Sale con código 1 si algún objetivo
+supera su presupuesto más --tolerance, o si no se puede importar, para usarlo
+como paso de CI. --update reescribe el presupuesto con lo medido.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from cryptography.fernet import Fernet
+
+BUDGET_FILE = Path(__file__).with_name("import_budget.json")
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Los carga el intérprete antes del objetivo
+STARTUP_MODULES = {"site", "encodings", "codecs", "io", "abc", "zipimport", "_frozen_importlib_external"}
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "bench-secret")
+    env.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (str(BACKEND_DIR), env.get("PYTHONPATH"))))
+    # Sin .pyc viejos de otra versión ni bytecode deshabilitado
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """{módulo: (propio µs, acumulado µs)} de la salida de -X importtime"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def measure(target: str, env: Dict[str, str]) -> Dict[str, Tuple[int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        error = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError("\n".join(error[-5:]))
+    return parse_importtime(proc.stderr)
+
+def heaviest(modules: Dict[str, Tuple[int, int]], top: int) -> List[Tuple[str, int]]:
+    """Paquetes de primer nivel ordenados por tiempo acumulado"""
+    roots = {
+        name: cumulative for name, (_, cumulative) in modules.items()
+        if "." not in name and name not in STARTUP_MODULES
+    }
+    return sorted(roots.items(), key=lambda item: item[1], reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", action="append", help="módulo a medir (por defecto los del presupuesto)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="margen sobre el presupuesto (0.2 = +20%%)")
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_FILE.read_text()) if BUDGET_FILE.exists() else {}
+    targets = args.target or list(budget)
+    env = _env()
+    measured, failed = {}, []
+
+    for target in targets:
+        try:
+            # La primera importación compila los .pyc; no cuenta
+            measure(target, env)
+            runs = [measure(target, env) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{target}: import failed\n    " + str(e).replace("\n", "\n    "))
+            failed.append(target)
+            continue
+        root = target.split(".")[0]
+        cumulative = statistics.median(run[target][1] for run in runs) / 1000
+        measured[target] = round(cumulative, 1)
+
+        limit = budget.get(target)
+        verdict = ""
+        if limit is not None and not args.update:
+            allowed = limit * (1 + args.tolerance)
+            verdict = f"(budget {limit:.0f} ms) " + ("ok" if cumulative <= allowed else "REGRESSION")
+            if cumulative > allowed:
+                failed.append(target)
+        print(f"{target}: {cumulative:8.1f} ms {verdict}")
+        for name, us in heaviest(runs[-1], args.top):
+            if name != root:
+                print(f"    {name:<24} {us / 1000:8.1f} ms")
+
+    if args.update:
+        budget.update(measured)
+        BUDGET_FILE.write_text(json.dumps(budget, indent=2, sort_keys=True) + "\n")
+        print(f"Budget written to {BUDGET_FILE}")
+    elif failed:
+        print(f"Import time check failed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
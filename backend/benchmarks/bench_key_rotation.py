@@ -0,0 +1,98 @@
+"""
+Benchmark de rotación de claves Fernet y de la caché de credenciales.
+
+    python -m benchmarks.bench_key_rotation --devices 100000
+    python -m benchmarks.bench_key_rotation --database-url postgresql+psycopg2://...
+
+Sin --database-url usa un SQLite temporal (WAL) para poder leer en
+streaming y escribir a la vez.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.vault import CredentialCache, FernetVault  # noqa: E402
+from app.db.base_class import Base  # noqa: E402
+from app.db.models import Device, Plan, User  # noqa: E402
+from app.services.key_rotation import rotate_device_credentials  # noqa: E402
+
+def _engine(url: str):
+    engine = create_engine(url)
+    if url.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _wal(dbapi_connection, _):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+    return engine
+
+def seed(Session, vault: FernetVault, devices: int) -> None:
+    db = Session()
+    plan = Plan(nombre="BENCH", max_equipos=0, precio=0)
+    db.add(plan)
+    db.flush()
+    user = User(email="bench@example.com", password="x", nombre="Bench", plan_id=plan.id)
+    db.add(user)
+    db.flush()
+    # Mismo par de tokens para todos: el coste medido es la rotación, no el seed
+    username, password = vault.encrypt("admin"), vault.encrypt("secret")
+    for start in range(0, devices, 10_000):
+        db.execute(insert(Device), [
+            {
+                "usuario_id": user.id, "nombre": f"router-{i}", "ip": "10.0.0.1", "puerto": 8728,
+                "usuario_mk_enc": username, "password_mk_enc": password, "activo": True,
+            }
+            for i in range(start, min(start + 10_000, devices))
+        ])
+    db.commit()
+    db.close()
+
+def bench_rotation(Session, vault: FernetVault, batch_size: int) -> None:
+    read_db, write_db = Session(), Session()
+    started = time.perf_counter()
+    result = rotate_device_credentials(read_db, write_db, vault, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    read_db.close()
+    write_db.close()
+    print(f"rotation: {result['rotated']} devices in {elapsed:.2f}s "
+          f"({result['rotated'] / elapsed:,.0f} devices/s, batch {batch_size})")
+
+def bench_cache(vault: FernetVault, devices: int, cycles: int = 5) -> None:
+    tokens = [vault.encrypt(f"user-{i}") for i in range(devices)]
+    for label, decrypt in (("decrypt", vault.decrypt), ("decrypt_cached", vault.decrypt_cached)):
+        started = time.perf_counter()
+        for _ in range(cycles):
+            for token in tokens:
+                decrypt(token)
+        elapsed = time.perf_counter() - started
+        print(f"{label}: {devices * cycles / elapsed:,.0f} ops/s over {cycles} cycles of {devices} tokens")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/rotation.db"
+    engine = _engine(url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    seed(Session, FernetVault([old_key]), args.devices)
+    bench_rotation(Session, FernetVault([new_key, old_key]), args.batch_size)
+
+    cache = CredentialCache(max_size=args.devices, ttl=900)
+    bench_cache(FernetVault([new_key], cache=cache), min(args.devices, 20_000))
+
+if __name__ == "__main__":
+    main()
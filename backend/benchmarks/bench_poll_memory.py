@@ -0,0 +1,155 @@
+"""
+Memoria y tiempo de conexión retenida por un shard de monitoreo.
+
+    python -m benchmarks.bench_poll_memory --devices 5000 --latency-ms 2
+
+Compara el bucle anterior (entidades Device del ORM con una sesión abierta
+durante toda la recolección y commits intercalados) con instantáneas
+PollTarget + PollResultWriter, que publica en los streams de ingesta (aquí
+un productor nulo: la escritura en BD ya no forma parte del ciclo). La consulta a cada router se simula con
+`--latency-ms` de espera; uno de cada `--alert-every` equipos genera alerta.
+Usa una SQLite temporal salvo que se pase --database-url.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db.base_class import Base  # noqa: E402
+from app.db.models import Alert, Device, Plan, User  # noqa: E402
+from app.services.polling import PollResultWriter, load_poll_targets  # noqa: E402
+from app.services.scheduler import resolve_bounds  # noqa: E402
+
+class HoldTimer:
+    """Suma el tiempo entre checkout y checkin de cada conexión del pool"""
+
+    def __init__(self, engine):
+        self.total = 0.0
+        self.longest = 0.0
+        self._started = {}
+        event.listen(engine, "checkout", self._checkout)
+        event.listen(engine, "checkin", self._checkin)
+
+    def _checkout(self, dbapi_conn, *_):
+        self._started[id(dbapi_conn)] = time.perf_counter()
+
+    def _checkin(self, dbapi_conn, *_):
+        started = self._started.pop(id(dbapi_conn), None)
+        if started is not None:
+            held = time.perf_counter() - started
+            self.total += held
+            self.longest = max(self.longest, held)
+
+    def reset(self):
+        self.total = self.longest = 0.0
+
+class NullProducer:
+    def publish(self, batches):
+        return []
+
+def seed(Session, devices: int) -> list:
+    db = Session()
+    plan = Plan(nombre="bench", max_equipos=devices, precio=0)
+    db.add(plan)
+    db.flush()
+    user = User(nombre="bench", email="bench@example.com", password="x", plan_id=plan.id)
+    db.add(user)
+    db.flush()
+    token = "gAAAAA" + "x" * 94  # tamaño típico de un token Fernet
+    ids = db.scalars(insert(Device).returning(Device.id), [
+        {"usuario_id": user.id, "nombre": f"router-{i}", "ip": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+         "puerto": 8728, "usuario_mk_enc": token, "password_mk_enc": token, "activo": True}
+        for i in range(devices)
+    ]).all()
+    db.commit()
+    db.close()
+    return ids
+
+def _collect(device, latency: float, alert_every: int):
+    time.sleep(latency)
+    if device.id % alert_every == 0:
+        return [Alert(equipo_id=device.id, estado="Alerta Mayor", titulo="CPU Alta: 95%", descripcion="bench")]
+    return []
+
+def orm_shard(Session, ids, latency, alert_every, batch_size):
+    """Bucle anterior: entidades del ORM y una sesión para todo el shard"""
+    db = Session()
+    try:
+        rows = (
+            db.query(Device, Plan.intervalo_min, Plan.intervalo_max)
+            .join(User, Device.usuario_id == User.id)
+            .outerjoin(Plan, User.plan_id == Plan.id)
+            .filter(Device.id.in_(ids), Device.activo==True)
+            .all()
+        )
+        bounds = {d.id: resolve_bounds(d.intervalo_min, d.intervalo_max, a, b) for d, a, b in rows}
+        pending = []
+        for device, _, _ in rows:
+            pending.extend(_collect(device, latency, alert_every))
+            if len(pending) >= batch_size:
+                db.add_all(pending)
+                db.commit()
+                pending = []
+        if pending:
+            db.add_all(pending)
+            db.commit()
+        return len(bounds)
+    finally:
+        db.close()
+
+def snapshot_shard(Session, ids, latency, alert_every, batch_size):
+    """Bucle nuevo: instantáneas y resultados publicados en lote"""
+    db = Session()
+    try:
+        targets = load_poll_targets(db, ids)
+    finally:
+        db.close()
+    writer = PollResultWriter(batch_size, producer=NullProducer())
+    for target in targets:
+        writer.add(target, alerts=_collect(target, latency, alert_every))
+    writer.flush()
+    return len(targets)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--alert-every", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(args.database_url or f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        ids = seed(Session, args.devices)
+        timer = HoldTimer(engine)
+
+        print(f"{args.devices} devices, {args.latency_ms} ms/device, alert every {args.alert_every}")
+        for name, shard in (("orm + open session", orm_shard), ("snapshot + writer", snapshot_shard)):
+            timer.reset()
+            tracemalloc.start()
+            started = time.perf_counter()
+            shard(Session, ids, args.latency_ms / 1000, args.alert_every, args.batch_size)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:>20}: peak {peak / 1e6:7.2f} MB | connection held {timer.total:6.2f} s "
+                  f"(longest {timer.longest:6.2f} s) | cycle {elapsed:6.2f} s")
+
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Colectores de la API de RouterOS y ciclo de monitoreo contra una flota
+simulada (benchmarks.routeros_api).
+
+    python -m benchmarks.bench_poller --devices 500 --latency-ms 5 --log-lines 1000
+    python -m benchmarks.bench_poller --devices 2000 --fail-rate 0.01 --workers 16
+    python -m benchmarks.bench_poller --worker --devices 2000 --redis-url redis://localhost:6379/15
+
+Sin --worker mide get_health y get_logs de app.services.mikrotik (secuencial
+como dentro de un shard, o con --workers hilos). Con --worker ejecuta
+poll_devices de app.worker con Celery en modo eager (los shards corren uno
+tras otro en este proceso) y después drain_ingest: equipos y usuario se
+siembran en DATABASE_URL (por defecto una SQLite temporal) y se borran al
+terminar; la base Redis de --redis-url debe ser dedicada, porque se vacían
+sus claves mm:* antes y después.
+
+Para cada pasada informa duración del ciclo, equipos por segundo, conexiones
+abiertas contra la flota y memoria por equipo (pico de tracemalloc en una
+segunda pasada, para no distorsionar los tiempos). --save guarda los
+resultados y --baseline los compara: sale con código 1 si los equipos por
+segundo bajan o la memoria por equipo sube más de --tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/bench_poller.db")
+
+from app.core.config import settings  # noqa: E402
+from app.core.lazy import lazy_import  # noqa: E402
+from app.core.redis_client import get_redis  # noqa: E402
+from app.core.vault import vault  # noqa: E402
+from app.db.base_class import Base  # noqa: E402
+from app.db.models import Alert, Device, DeviceLog, HealthSample, Plan, User  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.services import mikrotik  # noqa: E402
+from benchmarks.routeros_api import FleetThread, RouterOsApiServer  # noqa: E402
+
+# Solo con --worker: importa Celery y toda la cadena de tareas
+worker = lazy_import("app.worker")
+
+def _connections(routers: List[RouterOsApiServer]) -> int:
+    return sum(router.connections for router in routers)
+
+def _measure(routers: List[RouterOsApiServer], devices: int, run: Callable[[], int]) -> Dict[str, Any]:
+    """Una pasada cronometrada y otra con tracemalloc; run devuelve los errores"""
+    opened = _connections(routers)
+    started = time.perf_counter()
+    errors = run()
+    elapsed = time.perf_counter() - started
+    opened = _connections(routers) - opened
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "cycle_s": round(elapsed, 3),
+        "devices_per_s": round(devices / elapsed, 1),
+        "connections": opened,
+        "errors": errors,
+        "kib_per_device": round(peak / devices / 1024, 2),
+    }
+
+def collector_pass(fn: Callable[[Any], Any], targets: List[Any], workers: int) -> Callable[[], int]:
+    def _call(target) -> bool:
+        try:
+            fn(target)
+            return True
+        except Exception:
+            return False
+
+    def run() -> int:
+        if workers == 1:
+            results = [_call(target) for target in targets]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_call, targets))
+        return results.count(False)
+
+    return run
+
+def bench_collectors(routers: List[RouterOsApiServer], args) -> Dict[str, Dict[str, Any]]:
+    username, password = vault.encrypt("admin"), vault.encrypt("admin")
+    targets = [
+        SimpleNamespace(id=i, nombre=f"r{i}", ip="127.0.0.1", puerto=router.port,
+                        usuario_mk_enc=username, password_mk_enc=password)
+        for i, router in enumerate(routers, start=1)
+    ]
+    return {
+        "get_health": _measure(routers, len(targets), collector_pass(mikrotik.get_health, targets, args.workers)),
+        "get_logs": _measure(routers, len(targets), collector_pass(
+            lambda target: mikrotik.get_logs(target, limit=50), targets, args.workers
+        )),
+    }
+
+def _clear_redis(client) -> None:
+    keys = list(client.scan_iter("mm:*", count=1000))
+    for start in range(0, len(keys), 1000):
+        client.delete(*keys[start:start + 1000])
+
+def bench_worker(routers: List[RouterOsApiServer], args) -> Dict[str, Dict[str, Any]]:
+    # Antes de crear el cliente Redis compartido
+    settings.REDIS_URL = args.redis_url
+    worker.celery_app.conf.task_always_eager = True
+    worker.celery_app.conf.task_eager_propagates = True
+    client = get_redis()
+    _clear_redis(client)
+    Base.metadata.create_all(engine)
+
+    db = SessionLocal()
+    plan = Plan(nombre=f"bench-{os.getpid()}", max_equipos=0, precio=0)
+    db.add(plan)
+    db.flush()
+    user = User(email=f"bench-{os.getpid()}@example.com", password="x", nombre="bench", plan_id=plan.id)
+    db.add(user)
+    db.flush()
+    username, password = vault.encrypt("admin"), vault.encrypt("admin")
+    devices = [
+        Device(usuario_id=user.id, nombre=f"r{i}", ip="127.0.0.1", puerto=router.port,
+               usuario_mk_enc=username, password_mk_enc=password)
+        for i, router in enumerate(routers)
+    ]
+    db.add_all(devices)
+    db.flush()
+    device_ids = [device.id for device in devices]
+    plan_id, user_id = plan.id, user.id
+    db.commit()
+    db.close()
+
+    def health_samples() -> int:
+        db = SessionLocal()
+        try:
+            return db.query(HealthSample).filter(HealthSample.equipo_id.in_(device_ids)).count()
+        finally:
+            db.close()
+
+    def cycle() -> int:
+        before = health_samples()
+        # Todos vencidos: el dispatcher los reparte en POLL_SHARDS shards
+        client.delete("mm:lease:cycle")
+        client.zadd("mm:sched:due", {device_id: 0 for device_id in device_ids})
+        worker.poll_devices()
+        worker.drain_ingest()
+        # Una muestra de salud escrita por cada equipo consultado con éxito
+        return len(device_ids) - (health_samples() - before)
+
+    try:
+        return {"poll_devices": _measure(routers, len(device_ids), cycle)}
+    finally:
+        db = SessionLocal()
+        for model in (HealthSample, DeviceLog, Alert):
+            db.query(model).filter(model.equipo_id.in_(device_ids)).delete(synchronize_session=False)
+        db.query(Device).filter(Device.id.in_(device_ids)).delete(synchronize_session=False)
+        db.query(User).filter(User.id == user_id).delete()
+        db.query(Plan).filter(Plan.id == plan_id).delete()
+        db.commit()
+        db.close()
+        _clear_redis(client)
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if result["devices_per_s"] < previous["devices_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['devices_per_s']} devices/s (baseline {previous['devices_per_s']})")
+        if result["kib_per_device"] > previous["kib_per_device"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['kib_per_device']} KiB/device (baseline {previous['kib_per_device']})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--log-lines", type=int, default=1000)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="hilos para los colectores (1 = como un shard)")
+    parser.add_argument("--worker", action="store_true", help="medir poll_devices + drain_ingest")
+    parser.add_argument("--redis-url", help="base Redis dedicada (obligatoria con --worker)")
+    parser.add_argument("--save", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if args.worker and not args.redis_url:
+        parser.error("--worker requires --redis-url (its mm:* keys are deleted)")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    fleet = FleetThread(
+        args.devices, log_lines=args.log_lines, latency=args.latency_ms / 1000,
+        fail_rate=args.fail_rate, hang_rate=args.hang_rate,
+    )
+    with fleet as routers:
+        print(f"{args.devices} devices, {args.latency_ms} ms/reply, {args.log_lines} log lines, "
+              f"fail {args.fail_rate:.1%}, hang {args.hang_rate:.1%}")
+        results = bench_worker(routers, args) if args.worker else bench_collectors(routers, args)
+
+    for name, result in results.items():
+        print(f"{name:>14}: cycle {result['cycle_s']:7.2f} s | {result['devices_per_s']:8.1f} devices/s | "
+              f"{result['connections']:6d} connections | {result['errors']:4d} errors | "
+              f"{result['kib_per_device']:7.2f} KiB/device")
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
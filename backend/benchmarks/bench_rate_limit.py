@@ -0,0 +1,91 @@
+"""
+Sobrecoste del middleware de rate limiting por petición.
+
+    python -m benchmarks.bench_rate_limit --requests 5000
+
+Compara la misma app ASGI sin middleware, con peticiones anónimas (bucket
+por IP) y autenticadas (JWT + bucket por IP y por usuario). Usa REDIS_URL si
+responde; si no, fakeredis en proceso (sin latencia de red, solo CPU).
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx  # noqa: E402
+import redis.asyncio  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from jose import jwt  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services import rate_limit  # noqa: E402
+from app.services.rate_limit import TokenBucketLimiter  # noqa: E402
+
+def _app(with_middleware: bool) -> FastAPI:
+    app = FastAPI()
+    if with_middleware:
+        app.middleware("http")(rate_limit.rate_limit_middleware)
+
+    @app.get("/api/alerts/")
+    async def alerts():
+        return []
+
+    return app
+
+async def _redis_client():
+    client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    try:
+        await client.ping()
+        return client, settings.REDIS_URL
+    except (redis.RedisError, OSError):
+        import fakeredis
+        return fakeredis.aioredis.FakeRedis(decode_responses=True), "fakeredis (in-process)"
+
+async def _drive(app: FastAPI, requests: int, concurrency: int, headers: dict) -> float:
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as http:
+        queue = iter(range(requests))
+
+        async def _worker():
+            for _ in queue:
+                response = await http.get("/api/alerts/", headers=headers)
+                assert response.status_code == 200, response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+async def main(args) -> None:
+    client, backend = await _redis_client()
+    rate_limit._limiter = TokenBucketLimiter(client, prefix="bench:rl")
+    # Límites altos: se mide el coste del camino permitido, no los 429
+    settings.RATE_LIMIT_IP_BURST = settings.RATE_LIMIT_USER_BURST = args.requests * 2
+    email = "bench@example.com"
+    rate_limit.plan_limits._cache[email] = (float("inf"), args.requests * 60, args.requests * 2)
+    token = jwt.encode({"sub": email}, settings.SECRET_KEY, settings.JWT_ALG)
+
+    print(f"redis: {backend}, {args.requests} requests, concurrency {args.concurrency}")
+    baseline = await _drive(_app(False), args.requests, args.concurrency, {})
+    scenarios = (
+        ("anonymous", {}),
+        ("authenticated", {"Authorization": f"Bearer {token}"}),
+    )
+    print(f"{'no middleware':>14}: {args.requests / baseline:8.0f} req/s")
+    for name, headers in scenarios:
+        elapsed = await _drive(_app(True), args.requests, args.concurrency, headers)
+        overhead_us = (elapsed - baseline) / args.requests * 1e6
+        print(f"{name:>14}: {args.requests / elapsed:8.0f} req/s | +{overhead_us:6.0f} us/request")
+
+    async for key in client.scan_iter("bench:rl:*"):
+        await client.delete(key)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,240 @@
+"""
+Servidor de la API de RouterOS simulado (protocolo binario del puerto 8728).
+Implementa /login (texto plano y challenge MD5 anterior a 6.43),
+/system/resource/print, /log/print y /quit, con latencia, conexiones
+cortadas o colgadas y volumen de log configurables. Cada equipo escucha en
+su propio puerto; para levantar una flota local:
+
+    python -m benchmarks.routeros_api --devices 1000 --base-port 30000 --log-lines 1000
+
+Con miles de equipos hace falta subir el límite de descriptores (ulimit -n).
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+from librouteros.protocol import decode_length, determine_length, encode_sentence
+
+LOG_TOPICS = (
+    ("system,info", "user admin logged in from 10.0.0.2 via api"),
+    ("dhcp,info", "defconf assigned 192.168.88.254 to 00:11:22:33:44:55"),
+    ("interface,info", "ether2 link up (speed 1G, full duplex)"),
+    ("wireless,info", "00:11:22:33:44:66@wlan1: connected"),
+    ("system,error,critical", "login failure for user admin from 10.0.0.9 via ssh"),
+)
+
+def routeros_resource(
+    cpu_load: int = 12, memory_total: int = 256 * 1024 * 1024, memory_free: int = 192 * 1024 * 1024,
+    uptime: str = "1d2h3m4s", version: str = "7.12 (stable)", board: str = "RB750Gr3",
+) -> Dict[str, Any]:
+    """Respuesta de /system/resource/print"""
+    return {
+        "uptime": uptime, "version": version, "free-memory": memory_free, "total-memory": memory_total,
+        "cpu": "MIPS 1004Kc V2.15", "cpu-count": 4, "cpu-load": cpu_load, "architecture-name": "mmips",
+        "board-name": board, "platform": "MikroTik",
+    }
+
+def routeros_log(lines: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Buffer de /log: `lines` entradas, 1 de cada 50 crítica"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(lines):
+        topics, message = LOG_TOPICS[-1] if i % 50 == 49 else rng.choice(LOG_TOPICS[:-1])
+        seconds = i * 7 % 86400
+        entries.append({
+            ".id": f"*{i + 1:X}",
+            "time": f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+            "topics": topics,
+            "message": message,
+        })
+    return entries
+
+def _words(attributes: Dict[str, Any]) -> List[str]:
+    return [f"={key}={value}" for key, value in attributes.items()]
+
+class RouterOsApiServer:
+    """
+    Un equipo: acepta conexiones, exige login y responde sentencias.
+    fail_rate corta la conexión recién aceptada; hang_rate la deja abierta
+    sin responder (el cliente agota su timeout).
+    """
+
+    def __init__(
+        self, resource: Dict[str, Any], log: List[Dict[str, Any]], username: str = "admin",
+        password: str = "admin", latency: float = 0.0, fail_rate: float = 0.0, hang_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.resource = resource
+        self.log = log
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.hang_rate = hang_rate
+        self.rng = random.Random(seed)
+        self.connections = 0
+        self.commands = 0
+        self.failures = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _read_sentence(self, reader: asyncio.StreamReader) -> List[str]:
+        words = []
+        while True:
+            prefix = await reader.readexactly(1)
+            extra = determine_length(prefix)
+            if extra:
+                prefix += await reader.readexactly(extra)
+            length = decode_length(prefix)
+            if not length:
+                return words
+            words.append((await reader.readexactly(length)).decode())
+
+    def _login(self, attributes: Dict[str, str], challenge: bytes) -> bool:
+        if "password" in attributes:
+            return attributes.get("name") == self.username and attributes["password"] == self.password
+        expected = hashlib.md5(b"\x00" + self.password.encode() + challenge).hexdigest()
+        return attributes.get("name") == self.username and attributes.get("response") == "00" + expected
+
+    def respond(self, command: str, attributes: Dict[str, str], session: Dict[str, Any]) -> List[List[str]]:
+        """Sentencias de respuesta a un comando"""
+        if command == "/login":
+            if not attributes:
+                session["challenge"] = os.urandom(16)
+                return [["!done", f"=ret={session['challenge'].hex()}"]]
+            if self._login(attributes, session.get("challenge", b"")):
+                session["user"] = attributes["name"]
+                return [["!done"]]
+            return [["!trap", "=message=invalid user name or password (6)"], ["!done"]]
+        if "user" not in session:
+            return [["!trap", "=message=not logged in"], ["!done"]]
+        if command == "/system/resource/print":
+            return [["!re", *_words(self.resource)], ["!done"]]
+        if command == "/log/print":
+            return [["!re", *_words(entry)] for entry in self.log] + [["!done"]]
+        return [["!trap", "=message=no such command prefix"], ["!done"]]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        roll = self.rng.random()
+        try:
+            if roll < self.fail_rate:
+                self.failures += 1
+                return
+            if roll < self.fail_rate + self.hang_rate:
+                self.failures += 1
+                await reader.read()
+                return
+            session: Dict[str, Any] = {}
+            while True:
+                sentence = await self._read_sentence(reader)
+                if not sentence:
+                    continue
+                self.commands += 1
+                command, words = sentence[0], sentence[1:]
+                tag = [word for word in words if word.startswith(".tag=")]
+                attributes = dict(word[1:].split("=", 1) for word in words if word.startswith("="))
+                if command == "/quit":
+                    writer.write(encode_sentence("!fatal", "session terminated on request", encoding="utf-8"))
+                    await writer.drain()
+                    return
+                replies = self.respond(command, attributes, session)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(b"".join(encode_sentence(*reply, *tag, encoding="utf-8") for reply in replies))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self) -> None:
+        if self.server:
+            self.server.close()
+
+async def start_router(resource: Dict[str, Any], log: List[Dict[str, Any]], host: str = "127.0.0.1",
+                       port: int = 0, **kwargs) -> RouterOsApiServer:
+    router = RouterOsApiServer(resource, log, **kwargs)
+    router.server = await asyncio.start_server(router.handle, host, port, backlog=128)
+    return router
+
+async def start_fleet(count: int, base_port: int = 0, host: str = "127.0.0.1", log_lines: int = 100,
+                      **kwargs) -> List[RouterOsApiServer]:
+    """count equipos con carga de CPU variada, en puertos consecutivos (0 = efímeros)"""
+    rng = random.Random(count)
+    # El buffer de log es de solo lectura: uno compartido por toda la flota
+    log = routeros_log(log_lines)
+    routers = []
+    for i in range(count):
+        resource = routeros_resource(cpu_load=rng.randint(0, 100), board=f"RB-{i}")
+        routers.append(await start_router(
+            resource, log, host, base_port + i if base_port else 0, seed=i, **kwargs
+        ))
+    return routers
+
+class FleetThread:
+    """
+    Flota en un event loop propio en segundo plano, para clientes bloqueantes
+    como librouteros:
+
+        with FleetThread(500, latency=0.005) as routers:
+            ...
+    """
+
+    def __init__(self, count: int, **kwargs):
+        self.count = count
+        self.kwargs = kwargs
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.routers: List[RouterOsApiServer] = []
+
+    def __enter__(self) -> List[RouterOsApiServer]:
+        self._thread.start()
+        self.routers = asyncio.run_coroutine_threadsafe(
+            start_fleet(self.count, **self.kwargs), self.loop
+        ).result()
+        return self.routers
+
+    def __exit__(self, *exc) -> None:
+        async def _close():
+            for router in self.routers:
+                router.close()
+            for router in self.routers:
+                await router.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(_close(), self.loop).result(timeout=30)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+async def _serve(args) -> None:
+    routers = await start_fleet(
+        args.devices, args.base_port, args.host, log_lines=args.log_lines,
+        latency=args.latency, fail_rate=args.fail_rate, hang_rate=args.hang_rate,
+    )
+    print(f"{len(routers)} RouterOS API servers on {args.host}:{routers[0].port}-{routers[-1].port}")
+    await asyncio.Event().wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--base-port", type=int, default=30000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--log-lines", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Agente SNMPv2c simulado con la MIB que expone RouterOS (HOST-RESOURCES,
+IF-MIB y MIKROTIK-MIB). Responde GET, GETNEXT y GETBULK con latencia y
+pérdida de paquetes configurables. Para levantar una flota local:
+
+    python -m benchmarks.snmp_agent --devices 1000 --base-port 20000
+"""
+import argparse
+import asyncio
+import bisect
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services import snmp
+from app.services.snmp import Oid
+
+def routeros_mib(
+    cpu_loads=(12,), memory_total: int = 256 * 1024 * 1024, memory_used: int = 64 * 1024 * 1024,
+    uptime_seconds: int = 93784, version: str = "7.12", board: str = "RB750Gr3", interfaces: int = 5,
+) -> Dict[Oid, Tuple[int, Any]]:
+    """MIB de un router: {oid de instancia: (tipo BER, valor)}"""
+    mib: Dict[Oid, Tuple[int, Any]] = {
+        snmp.SYS_DESCR + (0,): (snmp.OCTET_STRING, f"RouterOS {board}"),
+        snmp.SYS_UPTIME + (0,): (snmp.TIMETICKS, uptime_seconds * 100),
+        snmp.MTXR_LIC_VERSION + (0,): (snmp.OCTET_STRING, version),
+        snmp.MTXR_BOARD_NAME + (0,): (snmp.OCTET_STRING, board),
+    }
+    for index, load in enumerate(cpu_loads, start=1):
+        mib[snmp.HR_PROCESSOR_LOAD + (index,)] = (snmp.INTEGER, load)
+    # RouterOS: 65536 = memoria principal, 131072 = disco
+    storages = ((65536, snmp.HR_STORAGE_RAM, 1024, memory_total // 1024, memory_used // 1024),
+                (131072, snmp.HR_STORAGE_RAM[:-1] + (4,), 1024, 16384, 4096))
+    for index, storage_type, units, size, used in storages:
+        mib[snmp.HR_STORAGE_TYPE + (index,)] = (snmp.OBJECT_IDENTIFIER, storage_type)
+        mib[snmp.HR_STORAGE_UNITS + (index,)] = (snmp.INTEGER, units)
+        mib[snmp.HR_STORAGE_SIZE + (index,)] = (snmp.INTEGER, size)
+        mib[snmp.HR_STORAGE_USED + (index,)] = (snmp.INTEGER, used)
+    for index in range(1, interfaces + 1):
+        mib[snmp.IF_OPER_STATUS + (index,)] = (snmp.INTEGER, 1 if index % 4 else 2)
+        mib[snmp.IF_NAME + (index,)] = (snmp.OCTET_STRING, f"ether{index}")
+        mib[snmp.IF_HC_IN_OCTETS + (index,)] = (snmp.COUNTER64, index * 10 ** 9)
+        mib[snmp.IF_HC_OUT_OCTETS + (index,)] = (snmp.COUNTER64, index * 10 ** 8)
+    return mib
+
+class SnmpAgent(asyncio.DatagramProtocol):
+    """Agente de un solo equipo; la MIB se puede modificar en caliente"""
+
+    def __init__(self, mib: Dict[Oid, Tuple[int, Any]], community: str = "public",
+                 latency: float = 0.0, loss: float = 0.0):
+        self.community = community
+        self.latency = latency
+        self.loss = loss
+        self.requests = 0
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.set_mib(mib)
+
+    def set_mib(self, mib: Dict[Oid, Tuple[int, Any]]) -> None:
+        self.mib = dict(mib)
+        self._oids: List[Oid] = sorted(self.mib)
+
+    @property
+    def port(self) -> int:
+        return self.transport.get_extra_info("sockname")[1]
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def _next(self, oid: Oid) -> Tuple[Oid, bytes]:
+        position = bisect.bisect_right(self._oids, oid)
+        if position >= len(self._oids):
+            return oid, snmp.encode_value(snmp.END_OF_MIB_VIEW)
+        found = self._oids[position]
+        return found, snmp.encode_value(*self.mib[found])
+
+    def _get(self, oid: Oid) -> Tuple[Oid, bytes]:
+        if oid in self.mib:
+            return oid, snmp.encode_value(*self.mib[oid])
+        return oid, snmp.encode_value(snmp.NO_SUCH_INSTANCE)
+
+    def respond(self, request: snmp.Message) -> bytes:
+        oids = [oid for oid, _ in request.varbinds]
+        if request.pdu == snmp.GET_REQUEST:
+            varbinds = [self._get(oid) for oid in oids]
+        elif request.pdu == snmp.GET_NEXT_REQUEST:
+            varbinds = [self._next(oid) for oid in oids]
+        else:
+            non_repeaters = max(request.error_status, 0)
+            varbinds = [self._next(oid) for oid in oids[:non_repeaters]]
+            cursors = oids[non_repeaters:]
+            for _ in range(max(request.error_index, 0) if cursors else 0):
+                row = [self._next(oid) for oid in cursors]
+                varbinds.extend(row)
+                cursors = [oid for oid, _ in row]
+                if all(oid == self._oids[-1] for oid in cursors):
+                    break
+        return snmp.encode_message(request.community, snmp.RESPONSE, request.request_id, 0, 0, varbinds)
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.requests += 1
+        try:
+            request = snmp.decode_message(data)
+        except ValueError:
+            return
+        # Comunidad incorrecta: un agente real no responde
+        if request.community != self.community or random.random() < self.loss:
+            return
+        response = self.respond(request)
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+async def start_agent(mib: Dict[Oid, Tuple[int, Any]], host: str = "127.0.0.1", port: int = 0,
+                      **kwargs) -> SnmpAgent:
+    loop = asyncio.get_running_loop()
+    _, agent = await loop.create_datagram_endpoint(lambda: SnmpAgent(mib, **kwargs), local_addr=(host, port))
+    return agent
+
+async def start_fleet(count: int, base_port: int = 0, host: str = "127.0.0.1", **kwargs) -> List[SnmpAgent]:
+    """count agentes con carga de CPU variada, en puertos consecutivos (0 = efímeros)"""
+    rng = random.Random(count)
+    agents = []
+    for i in range(count):
+        mib = routeros_mib(cpu_loads=(rng.randint(0, 100),), board=f"RB-{i}")
+        agents.append(await start_agent(mib, host, base_port + i if base_port else 0, **kwargs))
+    return agents
+
+async def _serve(args) -> None:
+    agents = await start_fleet(args.devices, args.base_port, args.host, latency=args.latency, loss=args.loss)
+    print(f"{len(agents)} SNMP agents on {args.host}:{agents[0].port}-{agents[-1].port}")
+    await asyncio.Event().wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--base-port", type=int, default=20000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
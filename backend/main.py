@@ -2,12 +2,28 @@ from fastapi import FastAPI
 from app.core.config import settings
 from app.core.logging import configure_logging
 from app.api.router import api_router
+from app.db.session import db_router, read_your_writes_middleware
+from app.services.fair_share import FairShareState
+from app.services.rate_limit import rate_limit_middleware
 
 app = FastAPI(title=settings.APP_NAME, debug=settings.DEBUG)
 configure_logging(app)
+app.middleware("http")(read_your_writes_middleware)
+# Registrado al final: es el más externo y corta antes de tocar la BD
+app.middleware("http")(rate_limit_middleware)
 
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
 @app.get("/health", tags=["system"])
 def health():
     return {"status": "ok", "env": settings.ENV}
+
+@app.get("/health/db", tags=["system"])
+def health_db():
+    """Métricas del pool de conexiones por engine (primario/réplica)"""
+    return db_router.pool_metrics()
+
+@app.get("/health/scheduler", tags=["system"])
+def health_scheduler():
+    """Espera por cliente en el último despacho del monitoreo y de la cola de IA"""
+    return {name: FairShareState(name=name).metrics() for name in ("poll", "ai")}
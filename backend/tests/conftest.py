@@ -1,5 +1,43 @@
+import os
+
+import fakeredis
 import pytest
+import redis
+import redis.asyncio
+from cryptography.fernet import Fernet
+
+# Settings requiere estas variables; valores de prueba si no vienen del entorno
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+# Con REDIS_URL los tests de Redis usan ese servidor; sin ella, fakeredis (Lua incluido)
+REDIS_URL = os.environ.get("REDIS_URL")
 
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+@pytest.fixture
+def redis_client():
+    if not REDIS_URL:
+        return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip("Redis no disponible en REDIS_URL")
+    return client
+
+@pytest.fixture
+async def async_redis_client():
+    if not REDIS_URL:
+        client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    else:
+        client = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            await client.ping()
+        except redis.ConnectionError:
+            pytest.skip("Redis no disponible en REDIS_URL")
+    yield client
+    await client.aclose()
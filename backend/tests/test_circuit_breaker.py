@@ -0,0 +1,57 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.circuit_breaker import DeviceCircuitBreaker
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def breaker(redis_client):
+    prefix = f"test:cb:{uuid.uuid4().hex}"
+    yield DeviceCircuitBreaker(
+        redis_client, failure_threshold=2, base_interval=180, max_interval=600, probe_ttl=60,
+        clock=FakeClock(), prefix=prefix,
+    )
+    for key in redis_client.scan_iter(f"{prefix}:*"):
+        redis_client.delete(key)
+
+def test_closed_open_half_open_transitions(breaker):
+    assert breaker.record_failure(1) == 1
+    assert breaker.state(1) == "closed" and breaker.allow(1)
+
+    assert breaker.record_failure(1) == 2
+    assert breaker.state(1) == "open" and not breaker.allow(1)
+
+    breaker.clock.now += 180
+    assert breaker.state(1) == "half_open"
+    # Un solo sondeo por apertura
+    assert breaker.allow(1)
+    assert not breaker.allow(1)
+
+    breaker.record_success(1)
+    assert breaker.state(1) == "closed" and breaker.allow(1)
+
+def test_failed_probes_back_off_up_to_the_cap(breaker):
+    intervals = []
+    breaker.record_failure(1)
+    for _ in range(4):
+        opened_at = breaker.clock.now
+        breaker.record_failure(1)
+        open_until = float(breaker.client.hget(breaker._key(1), "open_until"))
+        intervals.append(open_until - opened_at)
+        breaker.clock.now = open_until
+        assert breaker.allow(1)
+    assert intervals == [180, 360, 600, 600]
+
+def test_concurrent_failures_are_counted_once_each(breaker):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = sorted(pool.map(lambda _: breaker.record_failure(1), range(20)))
+    assert counts == list(range(1, 21))
+    assert int(breaker.client.hget(breaker._key(1), "opens")) == 19
@@ -0,0 +1,98 @@
+import re
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base_class import Base
+from app.db.models import ConfigChunk
+from app.services.config_store import ConfigStore, chunk_lines, normalize_export
+
+HEADER = "# 2024-01-01 10:00:00 by RouterOS 7.14\n# software id = ABCD-1234\n"
+
+def _export(n=400, header=HEADER):
+    return header + "".join(f"/ip address add address=10.0.{i // 250}.{i % 250}/32 comment=\"l{i}\"\n" for i in range(n))
+
+@pytest.fixture
+def store(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/config.db")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    yield ConfigStore(db)
+    db.close()
+    engine.dispose()
+
+def _apply(old: str, diff: str) -> str:
+    """Aplica un diff unificado sin contexto (-U0) para comprobar sus números de línea"""
+    lines = old.splitlines(keepends=True)
+    shift = 0
+    hunks = re.split(r"^(@@ .* @@\n)", diff, flags=re.M)[1:]
+    for header, body in zip(hunks[::2], hunks[1::2]):
+        start, count = map(int, re.match(r"@@ -(\d+),(\d+)", header).groups())
+        removed = [line[1:] for line in body.splitlines(keepends=True) if line.startswith("-")]
+        added = [line[1:] for line in body.splitlines(keepends=True) if line.startswith("+")]
+        # Con 0 líneas borradas, `start` es la línea tras la que se inserta
+        index = (start if count == 0 else start - 1) + shift
+        assert lines[index:index + count] == removed
+        lines[index:index + count] = added
+        shift += len(added) - count
+    return "".join(lines)
+
+def test_restore_is_byte_exact_without_the_dated_header(store):
+    export = _export().replace("l7\"\n", "l7\"\r\n") + "/system identity set name=\"sin salto final\""
+    version = store.save(1, export)
+    assert store.restore(version) == "".join(normalize_export(export))
+    assert store.restore(version) == export[len("# 2024-01-01 10:00:00 by RouterOS 7.14\n"):]
+
+def test_chunks_are_shared_across_versions_and_devices(store):
+    first = store.save(1, _export())
+    # Solo cambia la cabecera con fecha: misma versión
+    assert store.save(1, _export(header="# 2024-01-02 11:00:00 by RouterOS 7.14\n# software id = ABCD-1234\n")) is first
+    stored = store.db.query(ConfigChunk).count()
+    assert stored == len(set(first.fragmentos.split(",")))
+
+    lines = _export().splitlines(keepends=True)
+    lines[200] = "/ip address add address=192.168.1.1/24\n"
+    second = store.save(1, "".join(lines))
+    assert second.id != first.id
+    # Un cambio de una línea solo añade el fragmento que la contiene
+    assert store.db.query(ConfigChunk).count() - stored <= 1
+    assert len(set(first.fragmentos.split(",")) - set(second.fragmentos.split(","))) == 1
+
+    # Otro equipo con la misma configuración no guarda fragmentos nuevos
+    total = store.db.query(ConfigChunk).count()
+    store.save(2, _export())
+    assert store.db.query(ConfigChunk).count() == total
+
+@pytest.mark.parametrize("edit", ["replace", "insert", "delete", "append"])
+def test_diff_line_numbers_are_absolute(store, edit):
+    old = _export()
+    lines = old.splitlines(keepends=True)
+    if edit == "replace":
+        lines[150] = "/ip route add gateway=10.9.9.9\n"
+    elif edit == "insert":
+        lines[300:300] = ["/ip dns set servers=1.1.1.1\n", "/ip dns set allow-remote-requests=yes\n"]
+    elif edit == "delete":
+        del lines[10:13]
+    else:
+        lines.append("/system note set note=fin\n")
+    old_version, new_version = store.save(1, old), store.save(1, "".join(lines))
+
+    diff = store.diff(old_version, new_version)
+    assert diff.startswith(f"--- version {old_version.id}\n+++ version {new_version.id}\n")
+    assert _apply(store.restore(old_version), diff) == store.restore(new_version)
+    assert store.diff(new_version, new_version) == ""
+
+def test_insert_hunk_uses_the_preceding_line_number(store):
+    old = store.save(1, _export(n=20, header=""))
+    lines = _export(n=20, header="").splitlines(keepends=True)
+    lines.insert(5, "/ip dns set servers=1.1.1.1\n")
+    new = store.save(1, "".join(lines))
+    assert "@@ -5,0 +6,1 @@\n" in store.diff(old, new)
+
+def test_chunk_sizes_are_bounded():
+    lines = [f"line {i}\n" for i in range(2000)]
+    chunks = chunk_lines(lines)
+    assert [line for chunk in chunks for line in chunk] == lines
+    assert all(len(chunk) <= 256 for chunk in chunks)
+    assert all(len(chunk) >= 8 for chunk in chunks[:-1])
@@ -0,0 +1,96 @@
+import os
+import time
+
+import fakeredis
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from starlette.requests import Request
+
+from app.core import redis_client as redis_module
+from app.core.security import create_access_token
+from app.db.session import STICKY_COOKIE, DatabaseRouter, is_sticky, read_your_writes_middleware
+
+@pytest.fixture
+def router(tmp_path):
+    """
+    Dos bases distintas como primario y réplica. Con TEST_PRIMARY_DATABASE_URL
+    y TEST_REPLICA_DATABASE_URL apunta a dos Postgres locales; si no, SQLite.
+    """
+    primary_url = os.environ.get("TEST_PRIMARY_DATABASE_URL", f"sqlite:///{tmp_path}/primary.db")
+    replica_url = os.environ.get("TEST_REPLICA_DATABASE_URL", f"sqlite:///{tmp_path}/replica.db")
+    router = DatabaseRouter(primary_url, replica_url)
+    for name, engine in router.engines.items():
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS routing_probe"))
+            conn.execute(text("CREATE TABLE routing_probe (origin VARCHAR(20))"))
+            conn.execute(text("INSERT INTO routing_probe VALUES (:origin)"), {"origin": name})
+    yield router
+    for engine in router.engines.values():
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE routing_probe"))
+        engine.dispose()
+
+def _origin(session) -> str:
+    try:
+        return session.execute(text("SELECT origin FROM routing_probe")).scalar_one()
+    finally:
+        session.close()
+
+def _request(cookies: str = "") -> Request:
+    headers = [(b"cookie", cookies.encode())] if cookies else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+def test_reads_go_to_replica_and_writes_to_primary(router):
+    assert _origin(router.session(readonly=True)) == "replica"
+    assert _origin(router.session()) == "primary"
+
+def test_sticky_reads_go_to_primary(router):
+    assert _origin(router.session(readonly=True, sticky=True)) == "primary"
+
+def test_without_replica_everything_goes_to_primary(tmp_path):
+    router = DatabaseRouter(f"sqlite:///{tmp_path}/only.db")
+    assert router.replica is router.primary
+    assert set(router.pool_metrics()) == {"primary"}
+
+def test_pool_metrics_per_engine(router):
+    _origin(router.session(readonly=True))
+    metrics = router.pool_metrics()
+
+    assert set(metrics) == {"primary", "replica"}
+    assert metrics["replica"]["checkouts"] >= 1
+    assert metrics["replica"]["checked_out"] in (0, None)
+
+def test_sticky_cookie_expires():
+    assert is_sticky(_request(f"{STICKY_COOKIE}={time.time() + 5}"))
+    assert not is_sticky(_request(f"{STICKY_COOKIE}={time.time() - 1}"))
+    assert not is_sticky(_request())
+
+@pytest.mark.anyio
+async def test_write_then_read_with_only_the_bearer_token(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_module, "_client", fakeredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(
+        redis_module, "_async_client", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    )
+    app = FastAPI()
+    app.middleware("http")(read_your_writes_middleware)
+
+    @app.post("/devices")
+    def create():
+        return {"ok": True}
+
+    @app.get("/devices")
+    def read(request: Request):
+        return {"sticky": is_sticky(request)}
+
+    mine = {"Authorization": f"Bearer {create_access_token('a@b.c', user_id=7)}"}
+    other = {"Authorization": f"Bearer {create_access_token('c@d.e', user_id=8)}"}
+    async with httpx.AsyncClient(app=app, base_url="http://test") as http:
+        assert (await http.get("/devices", headers=mine)).json() == {"sticky": False}
+        await http.post("/devices", headers=mine)
+        # Cliente sin cookies: solo el token identifica al que escribió
+        http.cookies.clear()
+        assert (await http.get("/devices", headers=mine)).json() == {"sticky": True}
+        assert (await http.get("/devices", headers=other)).json() == {"sticky": False}
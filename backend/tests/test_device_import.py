@@ -0,0 +1,52 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base_class import Base
+from app.db.models import Device, Plan, User
+from app.services.device_import import ImportJobStore, run_device_import, validate_rows
+
+def _row(nombre, ip, **extra):
+    return {"nombre": nombre, "ip": ip, "usuario_mk": "admin", "password_mk": "secret", **extra}
+
+def test_invalid_and_duplicate_rows_are_reported():
+    rows = [_row("r1", "10.0.0.1"), "no es un objeto", _row("r2", "10.0.0.1"), _row("r3", "10.0.0.1", puerto=8729),
+            {"nombre": "x"}]
+    valid, invalid = validate_rows(rows)
+
+    assert [row["nombre"] for row in valid] == ["r1", "r3"]
+    assert "secret" not in str(valid)
+    assert [(row["row"], row["status"]) for row in invalid] == [(2, "invalid"), (3, "duplicate"), (5, "invalid")]
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/import.db")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    plan = Plan(nombre="p", max_equipos=4, precio=0)
+    db.add(plan)
+    db.flush()
+    db.add(User(id=1, email="a@b.c", password="x", nombre="a", plan_id=plan.id))
+    db.add(Device(usuario_id=1, nombre="old", ip="10.0.0.1", puerto=8728, usuario_mk_enc="u", password_mk_enc="p"))
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
+
+def test_import_skips_existing_devices_and_maps_ids_in_order(db, redis_client):
+    store = ImportJobStore(redis_client, prefix=f"test:{uuid.uuid4().hex}")
+    valid, invalid = validate_rows([_row(f"r{i}", f"10.0.0.{i}") for i in range(1, 6)])
+    store.create("job", 1, total=5, invalid=invalid)
+
+    # Plan de 4 equipos con uno ya dado de alta: caben 3 de los 4 nuevos
+    assert run_device_import(db, store, "job", 1, valid, test_connections=False) == {"created": 3, "failed": 2}
+    report = {row["row"]: row for row in store.results("job")}
+    assert report[1]["status"] == "duplicate"
+    assert report[5]["status"] == "rejected"
+    names = {device.id: device.nombre for device in db.query(Device)}
+    for row in (2, 3, 4):
+        assert report[row]["status"] == "created"
+        assert names[report[row]["device_id"]] == report[row]["nombre"]
+    assert store.progress("job")["processed"] == 5
@@ -0,0 +1,72 @@
+import uuid
+
+import pytest
+
+from app.services.device_state import DeviceStateCache, worst_severity
+
+HEALTH = {
+    "cpu_load": 12, "memory_total": 200, "memory_used": 50,
+    "uptime": "1d2h", "version": "7.14", "board_name": "RB5009",
+}
+
+@pytest.fixture
+def cache(redis_client):
+    prefix = f"test:state:{uuid.uuid4().hex}"
+    yield DeviceStateCache(redis_client, prefix=prefix)
+    for key in redis_client.scan_iter(f"{prefix}:*"):
+        redis_client.delete(key)
+
+def test_round_trip_and_user_index(cache):
+    cache.write_many([
+        DeviceStateCache.build(1, 7, HEALTH, "Aviso", now=100.0),
+        DeviceStateCache.build(2, 7, None, None, now=100.0, unreachable_via=1),
+        DeviceStateCache.build(3, 8, HEALTH, None, now=100.0),
+    ])
+
+    assert cache.device_ids_for_user(7) == [1, 2]
+    state = cache.get(1)
+    assert state["reachable"] and state["cpu_load"] == 12 and state["memory_used_pct"] == 25.0
+    assert state["severity"] == "Aviso" and state["last_seen"] == 100.0
+    assert [s["device_id"] for s in cache.get_many([1, 2, 99])] == [1, 2]
+
+    cache.forget(1, 7)
+    assert cache.get(1) is None
+    assert cache.device_ids_for_user(7) == [2]
+
+def test_deactivated_devices_are_forgotten(cache):
+    cache.write_many([
+        DeviceStateCache.build(1, 7, HEALTH, None, now=100.0),
+        DeviceStateCache.build(2, 7, HEALTH, None, now=100.0),
+        DeviceStateCache.build(3, 8, HEALTH, None, now=100.0),
+    ])
+
+    # 99 nunca tuvo estado: no falla
+    cache.forget_many([1, 3, 99])
+    assert cache.get(1) is None and cache.get(3) is None
+    assert cache.device_ids_for_user(7) == [2]
+    assert cache.device_ids_for_user(8) == []
+
+def test_unreachable_device_drops_stale_metrics(cache):
+    cache.write_many([DeviceStateCache.build(1, 7, HEALTH, None, now=100.0)])
+    cache.write_many([DeviceStateCache.build(1, 7, None, None, now=200.0, unreachable_via=5)])
+
+    state = cache.get(1)
+    assert not state["reachable"] and state["unreachable_via"] == 5
+    assert "cpu_load" not in state and state["uptime"] is None
+    # Sigue sabiéndose cuándo respondió por última vez
+    assert state["last_seen"] == 100.0 and state["checked_at"] == 200.0
+
+    cache.write_many([DeviceStateCache.build(1, 7, HEALTH, None, now=300.0)])
+    assert "unreachable_via" not in cache.get(1)
+
+def test_worst_severity():
+    assert worst_severity(["Aviso", "Alerta Crítica", "Alerta Menor"]) == "Alerta Crítica"
+    assert worst_severity([]) is None
+
+def test_snmp_interface_counters_are_cached(cache):
+    interfaces = [{"name": "ether1", "running": True, "rx_bytes": 10 ** 9, "tx_bytes": 10 ** 8}]
+    cache.write_many([DeviceStateCache.build(1, 7, dict(HEALTH, interfaces=interfaces), None, now=100.0)])
+    assert cache.get(1)["interfaces"] == interfaces
+
+    cache.write_many([DeviceStateCache.build(1, 7, None, None, now=200.0)])
+    assert cache.get(1)["interfaces"] is None
@@ -0,0 +1,104 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from app.db.base_class import Base
+from app.db.models import Alert, Device, Plan, User
+from app.db.session import DatabaseRouter
+from app.schemas.alert import AlertCreate
+from app.services import export
+from app.services.export import (
+    ALERT_COLUMNS, accepts_gzip, encode_csv, encode_ndjson, export_response, gzip_stream, iter_alert_rows
+)
+
+ROWS = [
+    {"id": i, "equipo_id": 1, "equipo": "r1", "estado": "Alerta Mayor", "titulo": f"t{i}",
+     "descripcion": "a, \"b\"\nc", "fecha": datetime(2024, 1, 1, 0, 0, i)}
+    for i in range(5)
+]
+
+async def _body(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+def test_ndjson_and_csv_round_trip_in_chunks():
+    chunks = list(encode_ndjson(ROWS, chunk_rows=2))
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["fecha"] for line in lines] == [row["fecha"].isoformat() for row in ROWS]
+
+    chunks = list(encode_csv(ROWS, ALERT_COLUMNS, chunk_rows=2))
+    assert len(chunks) == 3
+    parsed = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert [row["descripcion"] for row in parsed] == [ROWS[0]["descripcion"]] * 5
+    assert parsed[0]["fecha"] == "2024-01-01T00:00:00"
+
+def test_gzip_stream_is_a_single_valid_member():
+    data = b"".join(gzip_stream(encode_ndjson(ROWS, chunk_rows=1)))
+    assert gzip.decompress(data) == b"".join(encode_ndjson(ROWS))
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True), ("br, gzip;q=0.5", True), ("*", True),
+    ("", False), ("identity", False), ("gzip;q=0", False), ("gzip;q=0.0, br", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+@pytest.mark.anyio
+async def test_export_response_negotiates_compression():
+    plain = export_response(ROWS, "csv", False, "alertas")
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["content-disposition"].endswith('alertas.csv"')
+
+    encoded = export_response(ROWS, "ndjson", False, "alertas", accept_encoding="gzip, deflate")
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert encoded.media_type == "application/x-ndjson"
+    assert len(gzip.decompress(await _body(encoded)).splitlines()) == 5
+
+    # El fichero .gz explícito no se vuelve a codificar en tránsito
+    download = export_response(ROWS, "ndjson", True, "alertas", accept_encoding="gzip")
+    assert "content-encoding" not in download.headers
+    assert download.headers["content-disposition"].endswith('alertas.ndjson.gz"')
+    assert len(gzip.decompress(await _body(download)).splitlines()) == 5
+
+@pytest.mark.anyio
+async def test_export_response_consumes_rows_lazily():
+    pulled = []
+
+    def rows():
+        for row in ROWS * 400:
+            pulled.append(row)
+            yield row
+
+    response = export_response(rows(), "ndjson", False, "alertas")
+    assert pulled == []
+    first = await response.body_iterator.__anext__()
+    assert first and len(pulled) == 500
+
+def test_iter_alert_rows_filters_by_owner_and_status(tmp_path, monkeypatch):
+    router = DatabaseRouter(f"sqlite:///{tmp_path}/export.db")
+    Base.metadata.create_all(router.primary)
+    db = router.session()
+    db.add(Plan(id=1, nombre="p", max_equipos=0, precio=0))
+    db.add_all([User(id=u, email=f"{u}@b.c", password="x", nombre="u", plan_id=1) for u in (1, 2)])
+    db.add_all([Device(id=d, usuario_id=d, nombre=f"r{d}", ip="10.0.0.1", usuario_mk_enc="u", password_mk_enc="p")
+                for d in (1, 2)])
+    db.add_all([
+        Alert(equipo_id=1, estado="Alerta Mayor", titulo="a", fecha=datetime(2024, 1, 2)),
+        Alert(equipo_id=1, estado="Aviso", titulo="b", fecha=datetime(2024, 1, 1)),
+        Alert(equipo_id=2, estado="Alerta Mayor", titulo="c", fecha=datetime(2024, 1, 1)),
+    ])
+    db.commit()
+    db.close()
+    monkeypatch.setattr(export, "db_router", router)
+
+    assert [row["titulo"] for row in iter_alert_rows(1, batch_size=1)] == ["b", "a"]
+    assert [row["titulo"] for row in iter_alert_rows(1, estado="Alerta Mayor")] == ["a"]
+    assert list(iter_alert_rows(1, desde=datetime(2024, 1, 3))) == []
+    router.primary.dispose()
+
+def test_alerta_mayor_is_a_valid_status():
+    assert AlertCreate(equipo_id=1, estado="Alerta Mayor", titulo="x").estado == "Alerta Mayor"
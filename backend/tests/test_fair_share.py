@@ -0,0 +1,70 @@
+import uuid
+from collections import Counter
+
+import pytest
+
+from app.services.fair_share import FairShareQueue, FairShareState, deficit_round_robin, resolve_share
+
+def test_budget_split_by_weight():
+    queues = {1: list(range(10_000)), 2: list(range(100)), 3: list(range(100))}
+    dispatched = deficit_round_robin(queues, {1: 2, 2: 1, 3: 1}, {1: 10_000, 2: 100, 3: 100}, budget=400)
+    assert Counter(tenant for tenant, _ in dispatched) == {1: 200, 2: 100, 3: 100}
+    # Cada cola se despacha en orden de llegada
+    assert [item for tenant, item in dispatched if tenant == 2] == list(range(100))
+
+def test_small_tenants_first_round_under_heavy_load():
+    queues = {1: list(range(10_000))} | {tenant: [tenant] for tenant in range(2, 52)}
+    slots = dict.fromkeys(queues, 1_000)
+    dispatched = deficit_round_robin(queues, {}, slots, budget=100)
+    # 50 clientes pequeños con un equipo cada uno: ninguno espera al grande
+    assert {tenant for tenant, _ in dispatched} == set(queues)
+    assert sum(tenant == 1 for tenant, _ in dispatched) == 50
+
+def test_concurrency_cap_and_carried_credit():
+    deficits = {}
+    dispatched = deficit_round_robin({1: list(range(50)), 2: list(range(50))}, {1: 1.5, 2: 1}, {1: 5, 2: 50},
+                                     budget=20, deficits=deficits)
+    assert Counter(tenant for tenant, _ in dispatched) == {1: 5, 2: 15}
+    # Sin cupo no acumula créditos; el que quedó a medias conserva los suyos
+    assert 1 not in deficits and 2 in deficits
+
+def test_non_positive_weight_cannot_stall_dispatch():
+    assert resolve_share(-1.0, None, 10)[0] > 0
+    dispatched = deficit_round_robin({1: [1, 2], 2: [3]}, {1: -1.0, 2: 1e-12}, {1: 10, 2: 10})
+    assert sorted(dispatched) == [(1, 1), (1, 2), (2, 3)]
+
+@pytest.fixture
+def client(redis_client):
+    client = redis_client
+    prefix = f"test:{uuid.uuid4().hex}"
+    yield client, prefix
+    for key in client.scan_iter(f"{prefix}*"):
+        client.delete(key)
+
+def test_inflight_slots_expire_and_release(client):
+    client, prefix = client
+    state = FairShareState(client, "poll", prefix=prefix)
+    pending = {1: [(device_id, 0.0) for device_id in range(10)]}
+    assert len(state.dispatch(pending, {1: (1.0, 4)}, None, ttl=60, now=100)) == 4
+    # Cupo lleno hasta que el shard libera o vence el TTL
+    assert state.dispatch(pending, {1: (1.0, 4)}, None, ttl=60, now=110) == []
+    state.release({1: [0, 1]})
+    assert len(state.dispatch(pending, {1: (1.0, 4)}, None, ttl=60, now=120)) == 2
+    assert len(state.dispatch(pending, {1: (1.0, 4)}, None, ttl=60, now=200)) == 4
+    assert state.metrics()["tenants"][1] == {"lag": 200.0, "queued": 6, "dispatched": 4, "inflight": 4}
+
+def test_queue_dispatches_fairly_and_drains(client):
+    client, prefix = client
+    queue = FairShareQueue(client, "ai", prefix=prefix)
+    for device_id in range(20):
+        queue.push(1, device_id, now=10)
+    queue.push(2, 100, now=50)
+
+    pending = queue.pending(10)
+    dispatched = queue.dispatch(pending, {1: (1.0, 2), 2: (1.0, 2)}, budget=3, ttl=60, now=60)
+    assert sorted(dispatched) == [(1, 0), (1, 1), (2, 100)]
+    assert queue.pending(10) == {1: [(device_id, 10) for device_id in range(2, 12)]}
+    assert queue.state.metrics()["tenants"][2]["lag"] == 10.0
+
+    queue.release(1, 0)
+    assert queue.dispatch(queue.pending(10), {1: (1.0, 2)}, budget=3, ttl=60, now=61) == [(1, 2)]
@@ -0,0 +1,153 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base_class import Base
+from app.db.models import Alert, Device, DeviceLog, HealthSample, Plan, User
+from app.services.ingest import GROUP, IngestProducer, IngestWriter, alert_record, health_record, log_records
+
+class ListStream:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, events):
+        self.events.extend(events)
+
+@pytest.fixture
+def client(redis_client):
+    client = redis_client
+    prefix = f"test:{uuid.uuid4().hex}:"
+    yield client, prefix
+    for key in client.scan_iter(f"{prefix}*"):
+        client.delete(key)
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/ingest.db")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    plan = Plan(nombre="p", max_equipos=0, precio=0)
+    db.add(plan)
+    db.flush()
+    user = User(email="a@b.c", password="x", nombre="a", plan_id=plan.id)
+    db.add(user)
+    db.flush()
+    db.add(Device(usuario_id=user.id, nombre="r1", ip="10.0.0.1", usuario_mk_enc="u", password_mk_enc="p"))
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+def _batches(now=1_700_000_000.0):
+    device = type("Target", (), {"id": 1, "usuario_id": 1, "nombre": "r1"})
+    health = {"cpu_load": 5, "memory_total": 100, "memory_used": 40, "uptime": "1d"}
+    logs = [{"time": "10:00:00", "topics": "system,info", "message": "ok", "severity": "info"}]
+    return {
+        "health": [health_record(1, health, now)],
+        "logs": log_records(1, logs, now),
+        "alerts": [alert_record(Alert(estado="Aviso", titulo="a"), device, now)],
+    }
+
+def _counts(Session):
+    db = Session()
+    try:
+        return tuple(db.query(model).count() for model in (HealthSample, DeviceLog, Alert))
+    finally:
+        db.close()
+
+def test_replay_after_writer_crash_is_idempotent(client, Session, monkeypatch):
+    client, prefix = client
+    producer = IngestProducer(client, prefix=prefix)
+    producer.publish(_batches())
+    # El mismo log visto en la consulta siguiente
+    producer.publish({"logs": _batches(1_700_000_180.0)["logs"]})
+
+    # Un escritor lee y muere sin confirmar
+    crashed = IngestWriter(client, Session, consumer="crashed", prefix=prefix)
+    for kind, key in crashed.keys.items():
+        crashed._ensure_group(key)
+        crashed._read(key, 100)
+
+    stream = ListStream()
+    writer = IngestWriter(client, Session, consumer="survivor", alert_stream=stream, prefix=prefix)
+    # Las entradas aún no llevan INGEST_CLAIM_IDLE pendientes: nada que hacer
+    assert writer.run() == {"alerts": 0, "health": 0, "logs": 0}
+
+    monkeypatch.setattr(settings, "INGEST_CLAIM_IDLE", 0)
+    assert writer.run() == {"alerts": 1, "health": 1, "logs": 2}
+    assert _counts(Session) == (1, 1, 1)
+    assert [e["equipo"] for e in stream.events] == ["r1"]
+    assert writer.backlog() == {"health": 0, "logs": 0, "alerts": 0}
+    assert client.xpending(writer.keys["alerts"], GROUP)["pending"] == 0
+
+def test_database_outage_keeps_entries_pending(client, Session, monkeypatch):
+    client, prefix = client
+
+    # Base inalcanzable: falla al conectar, como un Postgres caído
+    broken = sessionmaker(bind=create_engine("sqlite:////nonexistent/dir/ingest.db"))
+
+    IngestProducer(client, prefix=prefix).publish(_batches())
+    writer = IngestWriter(client, broken, consumer="w", prefix=prefix)
+    assert writer.run() == {"alerts": 0, "health": 0, "logs": 0}
+    assert writer.backlog() == {"health": 1, "logs": 1, "alerts": 1}
+
+    # Vuelve la BD: el mismo consumidor reclama sus pendientes
+    monkeypatch.setattr(settings, "INGEST_CLAIM_IDLE", 0)
+    writer.session_factory = Session
+    writer.alert_stream = ListStream()
+    assert writer.run() == {"alerts": 1, "health": 1, "logs": 1}
+    assert _counts(Session) == (1, 1, 1)
+
+def test_backpressure_sheds_samples_but_not_alerts(client):
+    client, prefix = client
+    producer = IngestProducer(client, high_watermark=2, prefix=prefix)
+    for _ in range(2):
+        assert producer.publish(_batches()) == []
+
+    assert sorted(producer.publish(_batches())) == ["health", "logs"]
+    assert client.xlen(producer.keys["alerts"]) == 3
+    assert client.xlen(producer.keys["health"]) == 2
+
+def test_poison_entry_is_dead_lettered_without_blocking_the_stream(client, Session, monkeypatch):
+    client, prefix = client
+    monkeypatch.setattr(settings, "INGEST_CLAIM_IDLE", 0)
+    producer = IngestProducer(client, prefix=prefix)
+    producer.publish({"alerts": _batches()["alerts"]})
+    broken = dict(_batches()["alerts"][0], fecha="not-a-timestamp")
+    producer.publish({"alerts": [broken]})
+
+    writer = IngestWriter(client, Session, consumer="w", alert_stream=ListStream(), prefix=prefix)
+    # El lote entero falla mientras la entrada mala viaja con la buena
+    for _ in range(settings.INGEST_MAX_DELIVERIES - 1):
+        assert writer.drain("alerts") == 0
+    # Después se reintentan de una en una: la buena se escribe, la mala al dead-letter
+    assert writer.drain("alerts") == 2
+    assert _counts(Session) == (0, 0, 1)
+    assert writer.backlog()["alerts"] == 0
+    dead = client.xrange(writer.dead_key)
+    assert [fields["kind"] for _, fields in dead] == ["alerts"]
+
+def test_log_key_includes_the_day_for_undated_entries():
+    logs = [{"time": "10:00:00", "topics": "system", "message": "ok"}]
+    dated = [{"time": "jan/05 10:00:00", "topics": "system", "message": "ok"}]
+    day = 1_700_000_000.0
+
+    assert log_records(1, logs, day)[0]["clave"] != log_records(1, logs, day + 86400)[0]["clave"]
+    assert log_records(1, dated, day)[0]["clave"] == log_records(1, dated, day + 86400)[0]["clave"]
+
+def test_interface_counters_are_stored_with_the_sample(client, Session):
+    client, prefix = client
+    interfaces = [{"name": "ether1", "running": True, "rx_bytes": 10 ** 12, "tx_bytes": 10 ** 8}]
+    health = {"cpu_load": 5, "memory_total": 100, "memory_used": 40, "uptime": "1d", "interfaces": interfaces}
+    IngestProducer(client, prefix=prefix).publish({"health": [health_record(1, health, 1_700_000_000.0)]})
+
+    IngestWriter(client, Session, consumer="w", prefix=prefix).drain("health")
+    db = Session()
+    try:
+        assert db.query(HealthSample.interfaces).scalar() == interfaces
+    finally:
+        db.close()
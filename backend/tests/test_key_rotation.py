@@ -0,0 +1,92 @@
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.vault import FernetVault
+from app.db.base_class import Base
+from app.db.models import Device, Plan, User
+from app.services.key_rotation import rotate_device_credentials
+
+OLD_KEY, NEW_KEY = Fernet.generate_key(), Fernet.generate_key()
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/rotation.db")
+
+    @event.listens_for(engine, "connect")
+    def _wal(connection, _):
+        # Lector en streaming y escritor a la vez, como con Postgres
+        connection.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    old = FernetVault([OLD_KEY])
+    db = Session()
+    db.add(Plan(id=1, nombre="p", max_equipos=0, precio=0))
+    db.add(User(id=1, email="a@b.c", password="x", nombre="a", plan_id=1))
+    db.add_all([
+        Device(id=i, usuario_id=1, nombre=f"r{i}", ip="10.0.0.1",
+               usuario_mk_enc=old.encrypt(f"user{i}"), password_mk_enc=old.encrypt(f"pass{i}"),
+               # El 4 es un equipo SNMP: su comunidad también va cifrada
+               colector="snmp" if i == 4 else "api", snmp_comunidad_enc=old.encrypt("public") if i == 4 else None)
+        for i in range(1, 6)
+    ])
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+class EditingVault(FernetVault):
+    """Simula un usuario que cambia la contraseña del equipo 3 a mitad de la rotación"""
+
+    def __init__(self, keys, Session):
+        super().__init__(keys)
+        self.Session = Session
+        self.calls = 0
+
+    def rotate(self, token):
+        self.calls += 1
+        # 5ª llamada: el equipo 3 ya se leyó pero su lote aún no se ha escrito
+        if self.calls == 5:
+            db = self.Session()
+            device = db.get(Device, 3)
+            device.password_mk_enc = self.encrypt("cambiada")
+            db.commit()
+            db.close()
+        return super().rotate(token)
+
+def test_rotation_does_not_overwrite_concurrent_edits(Session):
+    vault = EditingVault([NEW_KEY, OLD_KEY], Session)
+    read_db, write_db = Session(), Session()
+    checkpoints = []
+    try:
+        result = rotate_device_credentials(read_db, write_db, vault, batch_size=2, on_batch=checkpoints.append)
+    finally:
+        read_db.close()
+        write_db.close()
+
+    assert result == {"rotated": 5, "last_id": 5}
+    assert checkpoints == [2, 4, 5]
+    new_only = FernetVault([NEW_KEY])
+    db = Session()
+    devices = {device.id: device for device in db.query(Device)}
+    assert new_only.decrypt(devices[3].password_mk_enc) == "cambiada"
+    assert [new_only.decrypt(devices[i].usuario_mk_enc) for i in range(1, 6)] == [f"user{i}" for i in range(1, 6)]
+    db.close()
+
+def test_snmp_community_is_rotated(Session):
+    read_db, write_db = Session(), Session()
+    try:
+        result = rotate_device_credentials(read_db, write_db, FernetVault([NEW_KEY, OLD_KEY]), batch_size=10)
+    finally:
+        read_db.close()
+        write_db.close()
+
+    assert result == {"rotated": 5, "last_id": 5}
+    db = Session()
+    communities = {device.id: device.snmp_comunidad_enc for device in db.query(Device)}
+    db.close()
+    # Retirada la clave antigua, la comunidad sigue descifrándose
+    assert FernetVault([NEW_KEY]).decrypt(communities.pop(4)) == "public"
+    assert set(communities.values()) == {None}
@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.core.lazy import lazy_import
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Dependencias que el worker no debe pagar al arrancar
+HEAVY = ("fastapi", "httpx", "librouteros", "pandas", "pytest", "requests")
+
+def test_lazy_module_imports_on_first_use():
+    json_module = lazy_import("json")
+    assert json_module._module is None
+    assert json_module.dumps([1]) == "[1]"
+    assert json_module._module is json
+
+@pytest.mark.parametrize("module", [
+    "app.services.polling", "app.services.ingest", "app.services.notifications",
+    "app.services.device_import", "app.services.topology",
+])
+def test_worker_modules_do_not_load_heavy_dependencies(module):
+    code = f"import sys, json, {module}; print(json.dumps(sorted(m for m in {HEAVY!r} if m in sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=dict(os.environ), capture_output=True, text=True, check=True
+    )
+    assert json.loads(proc.stdout) == []
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import pytest
+import redis
+
+from app.services.circuit_breaker import DeviceCircuitBreaker
+from app.services.locks import LeaseManager
+
+DEVICES = 10
+WORKERS = 4
+
+@pytest.fixture
+def client(redis_client):
+    return redis_client
+
+@pytest.fixture
+def prefix(client):
+    prefix = f"test:lease:{uuid.uuid4().hex}"
+    yield prefix
+    for key in client.scan_iter(f"{prefix}:*"):
+        client.delete(key)
+
+def _worker(pool: redis.ConnectionPool, prefix: str, rounds: int, results: queue.Queue) -> None:
+    """Simula un worker de Celery, con su propio cliente, que intenta consultar todos los equipos"""
+    leases = LeaseManager(redis.Redis(connection_pool=pool), prefix=prefix)
+    for _ in range(rounds):
+        for device_id in range(DEVICES):
+            lease = leases.acquire(f"device:{device_id}", ttl=5)
+            if not lease:
+                continue
+            start = time.monotonic()
+            time.sleep(0.002)
+            results.put((device_id, start, time.monotonic(), lease.fence))
+            leases.release(lease)
+
+def test_only_one_worker_holds_a_device_lease(client, prefix):
+    # Hilos con clientes propios sobre el mismo servidor (fakeredis o REDIS_URL)
+    results = queue.Queue()
+    errors = []
+
+    def run() -> None:
+        try:
+            _worker(client.connection_pool, prefix, 20, results)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=run) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert not worker.is_alive()
+    assert errors == []
+
+    holds = defaultdict(list)
+    while not results.empty():
+        device_id, start, end, fence = results.get()
+        holds[device_id].append((start, end, fence))
+
+    assert len(holds) == DEVICES
+    for device_holds in holds.values():
+        device_holds.sort()
+        for (_, prev_end, prev_fence), (start, _, fence) in zip(device_holds, device_holds[1:]):
+            # Sin solapamiento y fencing tokens estrictamente crecientes
+            assert start >= prev_end
+            assert fence > prev_fence
+
+def test_expired_lease_is_fenced_off(client, prefix):
+    leases = LeaseManager(client, prefix=prefix)
+    first = leases.acquire("device:1", ttl=0.05)
+    time.sleep(0.1)
+    second = leases.acquire("device:1", ttl=5)
+
+    assert second and second.fence > first.fence
+    assert not leases.is_current(first)
+    assert leases.is_current(second)
+    # El dueño anterior no puede liberar el lease ajeno
+    assert not leases.release(first)
+    assert leases.release(second)
+
+def test_busy_lease_is_not_acquired(client, prefix):
+    leases = LeaseManager(client, prefix=prefix)
+    lease = leases.acquire("cycle", ttl=5)
+
+    assert lease
+    assert leases.acquire("cycle", ttl=5) is None
+    assert leases.extend(lease, ttl=10)
+    leases.release(lease)
+    assert leases.acquire("cycle", ttl=5)
+
+def test_stale_lease_cannot_write(client, prefix):
+    leases = LeaseManager(client, prefix=prefix)
+    breaker = DeviceCircuitBreaker(client, failure_threshold=1, prefix=f"{prefix}:cb")
+    stale = leases.acquire("device:1", ttl=0.05)
+    time.sleep(0.1)
+    current = leases.acquire("device:2", ttl=5)
+    leases.acquire("device:1", ttl=5)
+
+    # El breaker no registra nada con un fence superado
+    assert breaker.record_failure(1, leases.fence(stale)) == 0
+    assert breaker.state(1) == "closed"
+    assert breaker.record_failure(2, leases.fence(current)) == 1
+    assert breaker.state(2) == "open"
+    breaker.record_success(2, leases.fence(stale))
+    assert breaker.state(2) == "open"
+    breaker.record_success(2, leases.fence(current))
+    assert breaker.state(2) == "closed"
+
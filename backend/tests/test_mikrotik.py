@@ -0,0 +1,44 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.core.vault import vault
+from app.services import mikrotik
+from benchmarks.routeros_api import FleetThread
+
+def _device(port: int, password: str = "admin"):
+    return SimpleNamespace(
+        id=1, nombre="r1", ip="127.0.0.1", puerto=port,
+        usuario_mk_enc=vault.encrypt("admin"), password_mk_enc=vault.encrypt(password),
+    )
+
+def test_collectors_against_simulator():
+    with FleetThread(1, log_lines=120) as routers:
+        device = _device(routers[0].port)
+        health = mikrotik.get_health(device)
+        logs = mikrotik.get_logs(device, limit=50)
+        assert routers[0].connections == 2
+
+    assert health["memory_used"] == health["memory_total"] - health["memory_free"]
+    assert health["board_name"] == "RB-0"
+    assert len(logs) == 50
+    assert logs[49]["topics"] == "system,error,critical"
+
+def test_invalid_credentials_are_not_retried():
+    with FleetThread(1) as routers:
+        started = time.monotonic()
+        with pytest.raises(ValueError, match="invalid user name or password"):
+            mikrotik.get_health(_device(routers[0].port, password="wrong"))
+        assert routers[0].connections == 1
+    assert time.monotonic() - started < 1
+
+def test_unresponsive_router_is_not_retried(monkeypatch):
+    monkeypatch.setattr(settings, "MIKROTIK_API_TIMEOUT", 0.3)
+    with FleetThread(1, hang_rate=1.0) as routers:
+        started = time.monotonic()
+        with pytest.raises(ValueError, match="timed out"):
+            mikrotik.get_health(_device(routers[0].port))
+        assert routers[0].connections == 1
+    assert time.monotonic() - started < 1.5
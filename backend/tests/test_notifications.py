@@ -0,0 +1,164 @@
+import json
+import socket
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services.notifications import (
+    AlertStream, NotificationPipeline, UnsafeDestination, build_digests, resolve_webhook,
+)
+
+class WebhookSink:
+    """Servidor HTTP local que registra los POST; `fail` fuerza respuestas 500"""
+
+    def __init__(self):
+        self.requests = []
+        self.fail = False
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                sink.requests.append((self.path, json.loads(body)))
+                self.send_response(500 if sink.fail else 204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _destination(id, usuario_id, url, severidad_minima=None):
+    return SimpleNamespace(
+        id=id, usuario_id=usuario_id, tipo="webhook", destino=url, severidad_minima=severidad_minima
+    )
+
+def _event(alert_id, usuario_id, equipo_id, estado="Alerta Crítica"):
+    return {
+        "alert_id": alert_id, "usuario_id": usuario_id, "equipo_id": equipo_id, "equipo": f"router-{equipo_id}",
+        "estado": estado, "titulo": "Error de Monitoreo", "descripcion": "", "fecha": "2024-01-01T00:00:00",
+    }
+
+def test_digests_group_per_destination_and_filter_severity():
+    events = [_event(1, 1, 10), _event(2, 1, 11, "Aviso"), _event(3, 2, 20)]
+    destinations = [
+        _destination(1, 1, "http://a"), _destination(2, 1, "http://b", "Alerta Mayor"), _destination(3, 3, "http://c"),
+    ]
+    digests = {d["destination_id"]: d for d in build_digests(events, destinations)}
+
+    assert set(digests) == {1, 2}
+    assert digests[1]["total"] == 2
+    assert [a["alert_id"] for a in digests[2]["alerts"]] == [1]
+
+def test_webhooks_to_internal_addresses_are_rejected(monkeypatch):
+    for url in ("http://127.0.0.1:8080/x", "http://169.254.169.254/latest/meta-data", "http://10.0.0.5/",
+                "http://[::ffff:192.168.1.1]/", "ftp://example.com/"):
+        with pytest.raises(UnsafeDestination):
+            resolve_webhook(url)
+
+    # El POST va a la IP validada, con el host original en Host y SNI
+    monkeypatch.setattr(socket, "getaddrinfo", lambda *a, **k: [(0, 0, 0, "", ("93.184.216.34", 443))])
+    assert resolve_webhook("https://hooks.example.com/a?b=1") == ("https://93.184.216.34:443/a?b=1", "hooks.example.com")
+
+@pytest.fixture
+def client(redis_client):
+    return redis_client
+
+@pytest.fixture
+def sink():
+    sink = WebhookSink()
+    yield sink
+    sink.close()
+
+@pytest.fixture
+def destinations(sink):
+    return [_destination(1, 1, f"{sink.url}/hook-a"), _destination(2, 2, f"{sink.url}/hook-b")]
+
+@pytest.fixture
+def pipeline(client, destinations, monkeypatch):
+    # El sink escucha en loopback
+    monkeypatch.setattr(settings, "NOTIFY_ALLOW_PRIVATE_WEBHOOKS", True)
+    prefix = f"test:{uuid.uuid4().hex}:"
+
+    class FakeSession:
+        def query(self, *_):
+            return self
+
+        def filter(self, *_):
+            return self
+
+        def all(self):
+            return destinations
+
+        def close(self):
+            pass
+
+    pipeline = NotificationPipeline(client, session_factory=FakeSession, consumer="test", prefix=prefix)
+    yield pipeline
+    pipeline.close()
+    for key in client.scan_iter(f"{prefix}*"):
+        client.delete(key)
+
+def test_outage_storm_becomes_one_digest_per_destination(client, pipeline, sink):
+    # 300 equipos caen a la vez en dos usuarios
+    events = [_event(i, 1 if i % 3 else 2, i) for i in range(300)]
+    AlertStream(client, key=pipeline.stream_key).publish(events)
+
+    summary = pipeline.run()
+
+    assert summary == {"events": 300, "digests": 2, "delivered": 2, "retry": 0, "dead": 0}
+    payloads = dict(sink.requests)
+    assert payloads["/hook-a"]["total"] == 200
+    assert payloads["/hook-b"]["total"] == 100
+    assert len(payloads["/hook-a"]["alerts"]) == settings.NOTIFY_DIGEST_MAX_ALERTS
+    # Todo confirmado: una segunda ventana no reenvía nada
+    assert pipeline.run()["events"] == 0
+
+def test_failed_delivery_retries_then_dead_letters(client, pipeline, sink, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_MAX_ATTEMPTS", 2)
+    AlertStream(client, key=pipeline.stream_key).publish([_event(1, 1, 10)])
+    sink.fail = True
+
+    assert pipeline.run()["retry"] == 1
+    # Sin vencer el backoff no se reintenta
+    assert pipeline.run()["digests"] == 0
+
+    pipeline.clock = lambda: float("inf")
+    assert pipeline.run()["dead"] == 1
+    dead = pipeline.dead_letters(1)
+    assert len(dead) == 1 and dead[0]["attempt"] == 2 and dead[0]["error"] == "HTTP 500"
+    assert len(sink.requests) == 2
+    # Cada usuario ve solo su propia DLQ
+    assert pipeline.dead_letters(2) == []
+
+def test_internal_webhook_is_not_contacted_nor_explained(client, pipeline, sink, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_ALLOW_PRIVATE_WEBHOOKS", False)
+    monkeypatch.setattr(settings, "NOTIFY_MAX_ATTEMPTS", 1)
+    AlertStream(client, key=pipeline.stream_key).publish([_event(1, 1, 10)])
+
+    assert pipeline.run()["dead"] == 1
+    assert sink.requests == []
+    assert pipeline.dead_letters(1)[0]["error"] == "destination not allowed"
+
+def test_retries_to_deleted_destination_are_dropped(client, pipeline, sink, destinations):
+    AlertStream(client, key=pipeline.stream_key).publish([_event(1, 1, 10)])
+    sink.fail = True
+    assert pipeline.run()["retry"] == 1
+
+    destinations.clear()
+    pipeline.clock = lambda: float("inf")
+    assert pipeline.run()["digests"] == 0
+    assert len(sink.requests) == 1
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base_class import Base
+from app.db.models import Alert, Device, Plan, User
+from app import worker
+from app.core import redis_client as redis_module
+from app.services.device_state import DeviceStateCache
+from app.services.ingest import IngestProducer
+from app.services.locks import LeaseManager
+from app.services.polling import PollResultWriter, load_poll_targets
+
+class ListProducer:
+    def __init__(self):
+        self.batches = []
+        self.shed = []
+
+    def publish(self, batches):
+        self.batches.append(batches)
+        return [kind for kind in self.shed if kind in batches]
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/polling.db")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    plan = Plan(nombre="p", max_equipos=0, precio=0, intervalo_min=120)
+    db.add(plan)
+    db.flush()
+    user = User(email="a@b.c", password="x", nombre="a", plan_id=plan.id)
+    db.add(user)
+    db.flush()
+    db.add_all([
+        Device(usuario_id=user.id, nombre=f"r{i}", ip=f"10.0.0.{i}", puerto=8728,
+               usuario_mk_enc="u", password_mk_enc="p", activo=i != 3)
+        for i in range(1, 6)
+    ])
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+def test_targets_are_detached_snapshots(Session):
+    db = Session()
+    targets = load_poll_targets(db, [1, 2, 3, 4])
+    db.close()
+
+    assert [t.id for t in targets] == [1, 2, 4]
+    assert not hasattr(targets[0], "__dict__")
+    assert targets[0].ip == "10.0.0.1" and targets[0].colector == "api"
+    assert targets[0].bounds[0] == 120
+
+def test_writer_publishes_in_batches(Session):
+    db = Session()
+    targets = load_poll_targets(db, [1, 2])
+    db.close()
+    producer = ListProducer()
+    writer = PollResultWriter(batch_size=3, producer=producer)
+    health = {"cpu_load": 5, "memory_total": 100, "memory_used": 40, "uptime": "1d"}
+    logs = [{"time": "10:00:00", "topics": "system,info", "message": "ok", "severity": "info"}]
+
+    writer.add(targets[0], health, logs, [Alert(equipo_id=1, estado="Aviso", titulo="a")])
+    assert producer.batches == []
+    writer.add(targets[1], health, logs * 2)
+    # Los logs repetidos comparten clave: el escritor los deduplica al insertar
+    assert len(producer.batches) == 1
+    batch = producer.batches[0]
+    assert batch["health"][1] | {"fecha": 0} == {
+        "equipo_id": 2, "fecha": 0, "cpu_load": 5, "memoria_pct": 40.0, "uptime": "1d", "interfaces": None
+    }
+    assert batch["logs"][1]["clave"] == batch["logs"][2]["clave"] != batch["logs"][0]["clave"]
+    assert batch["alerts"][0]["equipo"] == "r1" and len(batch["alerts"][0]["clave"]) == 32
+
+    producer.shed = ["logs"]
+    writer.add(targets[0], health, logs)
+    writer.flush()
+    assert writer.published == {"health": 3, "logs": 3, "alerts": 1}
+    assert writer.shed == 1
+
+class FakeRouterOS:
+    @staticmethod
+    def get_health(device):
+        return {"cpu_load": 5, "memory_total": 100, "memory_used": 40, "uptime": "1d",
+                "version": "7.14", "board_name": "RB"}
+
+    @staticmethod
+    def get_logs(device, limit=100):
+        return []
+
+def test_shard_isolates_per_device_errors(Session, redis_client, monkeypatch):
+    monkeypatch.setattr(redis_module, "_client", redis_client)
+    monkeypatch.setattr(worker, "SessionLocal", Session)
+    monkeypatch.setattr(worker, "mikrotik", FakeRouterOS)
+    acquire = LeaseManager.acquire
+
+    def flaky_acquire(self, name, ttl):
+        if name == "device:2":
+            raise redis.ConnectionError("connection reset")
+        return acquire(self, name, ttl)
+
+    monkeypatch.setattr(LeaseManager, "acquire", flaky_acquire)
+    # Sin autoretry: el error de un equipo no repite la consulta de los demás
+    summary = worker.poll_device_shard([1, 2, 4])
+    assert summary["polled"] == 2 and summary["errors"] == 1
+    assert DeviceStateCache(redis_client).device_ids_for_user(1) == [1, 4]
+
+def test_results_survive_a_lease_taken_after_release(Session, redis_client, monkeypatch):
+    monkeypatch.setattr(redis_module, "_client", redis_client)
+    monkeypatch.setattr(worker, "SessionLocal", Session)
+    monkeypatch.setattr(worker, "mikrotik", FakeRouterOS)
+    release = LeaseManager.release
+
+    def release_and_retake(self, lease):
+        # Otro worker toma el equipo en cuanto se libera, antes del flush del shard
+        released = release(self, lease)
+        assert self.acquire(lease.name, ttl=5).fence > lease.fence
+        return released
+
+    monkeypatch.setattr(LeaseManager, "release", release_and_retake)
+    summary = worker.poll_device_shard([1, 2])
+    assert summary["polled"] == 2 and summary["locked"] == 0
+    [(_, fields)] = redis_client.xrange(IngestProducer(redis_client).keys["health"])
+    assert [record["equipo_id"] for record in json.loads(fields["data"])] == [1, 2]
@@ -0,0 +1,124 @@
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.services import rate_limit
+from app.services.rate_limit import Bucket, TokenBucketLimiter
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def client(async_redis_client):
+    return async_redis_client
+
+@pytest.fixture
+async def limiter(client):
+    prefix = f"test:rl:{uuid.uuid4().hex}"
+    yield TokenBucketLimiter(client, prefix=prefix, clock=FakeClock())
+    async for key in client.scan_iter(f"{prefix}:*"):
+        await client.delete(key)
+
+@pytest.mark.anyio
+async def test_burst_then_retry_after(limiter):
+    bucket = Bucket("ip:1.2.3.4", per_minute=60, burst=3)
+    results = [await limiter.hit([bucket]) for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[2].remaining == 0
+    # 60/min = un token por segundo
+    assert results[3].retry_after == pytest.approx(1.0)
+
+    limiter.clock.now += 1
+    assert (await limiter.hit([bucket])).allowed
+
+@pytest.mark.anyio
+async def test_rejected_request_does_not_consume_other_buckets(limiter):
+    ip = Bucket("ip:1.2.3.4", per_minute=600, burst=5)
+    user = Bucket("user:a@b.c", per_minute=60, burst=1)
+
+    assert (await limiter.hit([ip, user])).allowed
+    assert not (await limiter.hit([ip, user])).allowed
+    # El IP solo gastó el token de la primera petición
+    assert (await limiter.hit([ip])).remaining == 3
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.middleware("http")(rate_limit.rate_limit_middleware)
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.get("/api/alerts/")
+    def alerts():
+        return []
+
+    return app
+
+@pytest.mark.anyio
+async def test_sheds_load_when_pool_wait_is_high(monkeypatch):
+    monkeypatch.setattr(rate_limit.db_router, "pool_wait_ms", lambda: settings.LOAD_SHED_POOL_WAIT_MS + 1)
+    async with httpx.AsyncClient(app=_app(), base_url="http://test") as http:
+        shed = await http.get("/api/alerts/")
+        health = await http.get("/health")
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == str(settings.LOAD_SHED_RETRY_AFTER)
+    assert health.status_code == 200
+
+@pytest.mark.anyio
+async def test_middleware_returns_429(monkeypatch, limiter):
+    monkeypatch.setattr(rate_limit, "_limiter", limiter)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_BURST", 2)
+    async with httpx.AsyncClient(app=_app(), base_url="http://test") as http:
+        statuses = [(await http.get("/api/alerts/")).status_code for _ in range(3)]
+        limited = await http.get("/api/alerts/")
+
+    assert statuses == [200, 200, 429]
+    assert int(limited.headers["Retry-After"]) >= 1
+
+@pytest.mark.anyio
+async def test_plan_lookup_failure_falls_back_to_default_limits(monkeypatch, limiter):
+    def broken(email):
+        raise OperationalError("SELECT", {}, Exception("connection refused"))
+
+    monkeypatch.setattr(rate_limit, "_limiter", limiter)
+    monkeypatch.setattr(rate_limit, "plan_limits", rate_limit.PlanLimits())
+    monkeypatch.setattr(rate_limit.plan_limits, "_load", broken)
+    monkeypatch.setattr(rate_limit, "token_subject", lambda request: "a@b.c")
+    async with httpx.AsyncClient(app=_app(), base_url="http://test") as http:
+        response = await http.get("/api/alerts/")
+
+    assert response.status_code == 200
+    assert await rate_limit.plan_limits.get("a@b.c") == (
+        settings.RATE_LIMIT_USER_PER_MINUTE, settings.RATE_LIMIT_USER_BURST
+    )
+
+@pytest.mark.anyio
+async def test_plan_cache_is_bounded_and_expires():
+    loads = []
+
+    def load(email):
+        loads.append(email)
+        return len(loads), 10
+
+    limits = rate_limit.PlanLimits(ttl=60, max_size=2)
+    limits._load = load
+    for email in ("a", "b", "a", "c", "a", "b"):
+        await limits.get(email)
+    # "b" fue el menos usado al entrar "c": se desaloja y se vuelve a cargar
+    assert loads == ["a", "b", "c", "b"]
+
+    # Caducado el TTL se relee el plan (p. ej. tras un cambio de plan)
+    limits.ttl = 0
+    await limits.get("x")
+    assert await limits.get("x") == (6, 10)
@@ -0,0 +1,137 @@
+import random
+import uuid
+from collections import Counter
+
+import pytest
+
+from app.services.scheduler import AdaptiveIntervalPolicy, DueTimeScheduler, RedisDueTimeScheduler, resolve_bounds
+
+TICK = 15
+INTERVAL = 180
+DEVICES = 2000
+
+def _scheduler(seed: int = 42) -> DueTimeScheduler:
+    policy = AdaptiveIntervalPolicy(default_interval=INTERVAL, jitter=0.1, rng=random.Random(seed))
+    return DueTimeScheduler(policy)
+
+def _simulate(scheduler: DueTimeScheduler, ticks: int, alerting=frozenset()) -> Counter:
+    """Avanza el reloj en ticks y cuenta cuántas consultas caen en cada uno"""
+    load: Counter = Counter()
+    for tick in range(1, ticks + 1):
+        now = tick * TICK
+        for device_id in scheduler.pop_due(now):
+            load[tick] += 1
+            scheduler.complete(device_id, now, alerting=device_id in alerting)
+    return load
+
+def test_initial_load_is_spread_over_interval():
+    scheduler = _scheduler()
+    scheduler.sync({i: (60.0, 900.0) for i in range(DEVICES)}, now=0)
+    load = _simulate(scheduler, INTERVAL // TICK)
+
+    # Con crontab fijo los 2000 equipos caen en el mismo tick
+    expected = DEVICES / (INTERVAL // TICK)
+    assert sum(load.values()) == DEVICES
+    assert max(load.values()) < expected * 1.5
+
+def test_steady_state_load_stays_smooth():
+    scheduler = _scheduler()
+    bounds = {i: (180.0, 180.0) for i in range(DEVICES)}
+    scheduler.sync(bounds, now=0)
+    load = _simulate(scheduler, 20 * INTERVAL // TICK)
+
+    # Descartar los dos primeros ciclos y comparar pico contra media
+    steady = [load[t] for t in range(2 * INTERVAL // TICK + 1, 20 * INTERVAL // TICK + 1)]
+    mean = sum(steady) / len(steady)
+    assert max(steady) < mean * 1.5
+    assert min(steady) > mean * 0.5
+
+def test_alerting_devices_speed_up_and_stable_ones_slow_down():
+    scheduler = _scheduler()
+    scheduler.sync({1: (60.0, 900.0), 2: (60.0, 900.0)}, now=0)
+    load = Counter()
+    for tick in range(1, 400):
+        now = tick * TICK
+        for device_id in scheduler.pop_due(now):
+            load[device_id] += 1
+            scheduler.complete(device_id, now, alerting=device_id == 1)
+
+    assert scheduler.intervals[1] == 60.0
+    assert scheduler.intervals[2] == 900.0
+    assert load[1] > load[2] * 5
+
+def test_volatile_device_speeds_up():
+    scheduler = _scheduler()
+    scheduler.sync({1: (60.0, 900.0)}, now=0)
+    scheduler.pop_due(INTERVAL)
+    assert scheduler.complete(1, INTERVAL, volatile=True) == INTERVAL / 2
+
+def test_sync_removes_inactive_devices():
+    scheduler = _scheduler()
+    scheduler.sync({1: (60.0, 900.0), 2: (60.0, 900.0)}, now=0)
+    scheduler.sync({2: (60.0, 900.0)}, now=0)
+
+    assert len(scheduler) == 1
+    assert scheduler.pop_due(10_000) == [2]
+
+def test_resolve_bounds_prefers_device_then_plan():
+    assert resolve_bounds(30, 120, 60, 600) == (30.0, 120.0)
+    assert resolve_bounds(None, None, 60, 600) == (60.0, 600.0)
+    low, high = resolve_bounds(None, None, None, None)
+    assert low <= high
+
+@pytest.fixture
+def redis_scheduler(redis_client):
+    policy = AdaptiveIntervalPolicy(default_interval=INTERVAL, jitter=0.1, rng=random.Random(42))
+    prefix = f"test:sched:{uuid.uuid4().hex}"
+    yield RedisDueTimeScheduler(redis_client, policy, claim_ttl=600, prefix=prefix)
+    for key in redis_client.scan_iter(f"{prefix}:*"):
+        redis_client.delete(key)
+
+def test_redis_initial_load_is_spread_and_claimed_once(redis_scheduler):
+    devices = 600
+    bounds = (60.0, 900.0)
+    redis_scheduler.sync({i: bounds for i in range(devices)}, now=0)
+
+    load = Counter()
+    for tick in range(1, INTERVAL // TICK + 1):
+        now = tick * TICK
+        due = redis_scheduler.pop_due(now)
+        load[tick] = len(due)
+        for device_id in due:
+            redis_scheduler.complete(device_id, bounds, now)
+    assert sum(load.values()) == devices
+    assert max(load.values()) < devices / (INTERVAL // TICK) * 1.5
+
+def test_redis_due_orders_by_lateness_and_claim_hides_until_ttl(redis_scheduler):
+    redis_scheduler.sync({1: (60.0, 900.0), 2: (60.0, 900.0), 3: (60.0, 900.0)}, now=0)
+    due = redis_scheduler.due(1000)
+    # Sin reclamar: una segunda lectura ve lo mismo
+    assert redis_scheduler.due(1000) == due
+    assert [score for _, score in due] == sorted(score for _, score in due)
+    assert len(redis_scheduler.due(1000, limit=2)) == 2
+
+    redis_scheduler.claim([due[0][0]], now=1000)
+    assert due[0][0] not in dict(redis_scheduler.due(1000))
+    # Un shard que muere sin completar: vuelve a vencer pasado claim_ttl
+    assert due[0][0] in dict(redis_scheduler.due(1000 + 600))
+
+def test_redis_complete_adapts_interval(redis_scheduler):
+    bounds = (60.0, 900.0)
+    redis_scheduler.sync({1: bounds, 2: bounds, 3: bounds}, now=0)
+    assert sorted(redis_scheduler.pop_due(1000)) == [1, 2, 3]
+
+    assert redis_scheduler.complete(1, bounds, 1000, alerting=True) == INTERVAL / 2
+    assert redis_scheduler.complete(2, bounds, 1000) == INTERVAL * 1.25
+    # Volátil: salto de CPU respecto a la consulta anterior
+    redis_scheduler.complete(3, bounds, 1000, cpu_load=5)
+    assert redis_scheduler.complete(3, bounds, 2000, cpu_load=90) == INTERVAL * 1.25 / 2
+
+def test_redis_sync_removes_and_complete_does_not_resurrect(redis_scheduler):
+    bounds = (60.0, 900.0)
+    assert redis_scheduler.sync({1: bounds, 2: bounds}, now=0) == []
+    redis_scheduler.pop_due(1000)
+    assert redis_scheduler.sync({2: bounds}, now=1000) == [1]
+
+    redis_scheduler.complete(1, bounds, 1000)
+    assert [device_id for device_id, _ in redis_scheduler.due(10_000)] == [2]
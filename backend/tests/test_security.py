@@ -0,0 +1,96 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.security import (
+    create_access_token, create_refresh_token, create_token, decode_token, get_current_user_id, hash_password,
+    verify_password
+)
+from app.core.vault import CredentialCache, FernetVault, vault
+
+def test_password_hash():
+    password = "secretpassword123"
+    hashed = hash_password(password)
+    assert verify_password(password, hashed)
+    assert not verify_password("wrongpassword", hashed)
+
+def test_access_token():
+    email = "test@example.com"
+    token = create_access_token(email)
+    payload = decode_token(token)
+    assert payload["sub"] == email
+    assert payload["scope"] == "access"
+
+def test_refresh_token():
+    email = "test@example.com"
+    token = create_refresh_token(email)
+    payload = decode_token(
+        token, 
+        secret_key=settings.REFRESH_SECRET_KEY or settings.SECRET_KEY
+    )
+    assert payload["sub"] == email
+    assert payload["scope"] == "refresh"
+
+def test_token_expiration():
+    email = "test@example.com"
+    token = create_token(
+        subject=email,
+        expires_delta=timedelta(seconds=-1)
+    )
+    with pytest.raises(HTTPException):
+        decode_token(token)
+
+def test_fernet_vault():
+    secret = "mysecret123"
+    encrypted = vault.encrypt(secret)
+    assert encrypted != secret
+    decrypted = vault.decrypt(encrypted)
+    assert decrypted == secret
+
+    # Test rotación
+    rotated = vault.rotate(encrypted)
+    assert vault.decrypt(rotated) == secret
+
+def test_user_id_comes_from_the_token():
+    token = create_access_token("test@example.com", user_id=42)
+    assert asyncio.run(get_current_user_id(token)) == 42
+
+    # Tokens sin uid o de refresco no valen para la identidad sin BD
+    for token in (create_access_token("test@example.com"), create_refresh_token("test@example.com")):
+        with pytest.raises(HTTPException):
+            asyncio.run(get_current_user_id(token))
+
+def test_credential_cache_evicts_least_recently_used():
+    cache = CredentialCache(max_size=2, ttl=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    # "b" era el menos usado
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+def test_credential_cache_expires_entries():
+    cache = CredentialCache(max_size=2, ttl=0.05)
+    cache.set("a", "1")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert not cache._data
+
+def test_decrypt_cached_reuses_plaintext_per_token():
+    old, new = Fernet.generate_key(), Fernet.generate_key()
+    cached = FernetVault([new, old], cache=CredentialCache(max_size=10, ttl=60))
+    token = FernetVault([old]).encrypt("secret")
+
+    assert cached.decrypt_cached(token) == "secret"
+    assert cached.cache.get(token) == "secret"
+    # Tras rotar, el token nuevo es otra entrada; el antiguo caduca solo
+    rotated = cached.rotate(token)
+    assert cached.decrypt_cached(rotated) == "secret"
+    assert len(cached.cache._data) == 2
+    assert FernetVault([new]).decrypt_cached(rotated) == "secret"
@@ -0,0 +1,37 @@
+from collections import Counter
+
+import pytest
+
+from app.services.sharding import ConsistentHashRing
+
+DEVICES = range(1, 20001)
+
+@pytest.mark.parametrize("shards", [4, 8, 16])
+def test_devices_are_spread_evenly(shards):
+    ring = ConsistentHashRing(shards)
+    counts = Counter(ring.shard_for(device_id) for device_id in DEVICES)
+    mean = len(DEVICES) / shards
+    assert len(counts) == shards
+    # 64 nodos virtuales por shard: ningún shard se aleja más de ~1/3 de la media
+    assert all(0.65 * mean <= count <= 1.35 * mean for count in counts.values())
+
+def test_adding_a_shard_only_moves_devices_to_it():
+    before, after = ConsistentHashRing(8), ConsistentHashRing(9)
+    moved = [d for d in DEVICES if before.shard_for(d) != after.shard_for(d)]
+    assert {after.shard_for(d) for d in moved} == {8}
+    # Lo ideal es 1/9 de la flota
+    assert len(moved) / len(DEVICES) == pytest.approx(1 / 9, abs=0.04)
+
+def test_removing_a_shard_only_moves_its_devices():
+    before, after = ConsistentHashRing(9), ConsistentHashRing(8)
+    moved = {d for d in DEVICES if before.shard_for(d) != after.shard_for(d)}
+    assert moved == {d for d in DEVICES if before.shard_for(d) == 8}
+
+def test_partition_is_stable_and_skips_empty_shards():
+    ring = ConsistentHashRing(16)
+    buckets = ring.partition([5, 1, 3])
+    assert sorted(d for bucket in buckets for d in bucket) == [1, 3, 5]
+    assert all(bucket for bucket in buckets)
+    assert ConsistentHashRing(16).partition([5, 1, 3]) == buckets
+    with pytest.raises(ValueError):
+        ConsistentHashRing(0)
@@ -0,0 +1,84 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.vault import vault
+from app.services import snmp
+from benchmarks.snmp_agent import routeros_mib, start_agent, start_fleet
+
+def _device(device_id: int, port: int, community: str = "public"):
+    return SimpleNamespace(
+        id=device_id, ip="127.0.0.1", snmp_puerto=port, snmp_comunidad_enc=vault.encrypt(community)
+    )
+
+@pytest.mark.parametrize("oid", [(1, 3, 6, 1, 2, 1, 1, 3, 0), (1, 3, 6, 1, 4, 1, 14988, 1, 1, 7, 8, 0), (2, 999, 3)])
+def test_oid_roundtrip(oid):
+    message = snmp.encode_message("public", snmp.GET_REQUEST, 7, 0, 0, [(oid, snmp.encode_value(snmp.NULL))])
+    assert snmp.decode_message(message).varbinds == [(oid, None)]
+
+@pytest.mark.parametrize("tag,value", [
+    (snmp.INTEGER, -129), (snmp.INTEGER, 128), (snmp.COUNTER64, 2 ** 64 - 1),
+    (snmp.TIMETICKS, 0), (snmp.OCTET_STRING, "RouterOS"), (snmp.IP_ADDRESS, "10.0.0.1"),
+])
+def test_value_roundtrip(tag, value):
+    message = snmp.encode_message("public", snmp.RESPONSE, 1, 0, 0, [((1, 3, 6), snmp.encode_value(tag, value))])
+    assert snmp.decode_message(message).varbinds[0][1] == value
+
+def test_format_uptime():
+    assert snmp.format_uptime(93784 * 100) == "1d2h3m4s"
+    assert snmp.format_uptime(0) == "0s"
+
+@pytest.mark.anyio
+async def test_health_from_simulator():
+    agent = await start_agent(routeros_mib(cpu_loads=(10, 30), interfaces=30))
+    try:
+        results = await snmp.collect_health_many([_device(1, agent.port)])
+    finally:
+        agent.transport.close()
+
+    health = results[1]
+    assert health["cpu_load"] == 20
+    assert health["memory_total"] == 256 * 1024 * 1024
+    assert health["memory_used"] == 64 * 1024 * 1024
+    assert health["uptime"] == "1d2h3m4s"
+    assert health["version"] == "7.12"
+    assert health["board_name"] == "RB750Gr3"
+    # 30 interfaces > max-repetitions: el recorrido necesita varias peticiones
+    assert [i["name"] for i in health["interfaces"]] == [f"ether{n}" for n in range(1, 31)]
+    assert health["interfaces"][0] == {"name": "ether1", "running": True, "rx_bytes": 10 ** 9, "tx_bytes": 10 ** 8}
+    assert health["interfaces"][3]["running"] is False
+    assert health["interfaces"][29] == {
+        "name": "ether30", "running": True, "rx_bytes": 30 * 10 ** 9, "tx_bytes": 30 * 10 ** 8
+    }
+    assert agent.requests == 2
+
+@pytest.mark.anyio
+async def test_failures_do_not_abort_the_batch():
+    agent = await start_agent(routeros_mib())
+    client = snmp.SnmpClient(timeout=0.2, retries=0)
+    try:
+        async with client:
+            results = await snmp.collect_health_many(
+                [_device(1, agent.port), _device(2, agent.port, community="wrong")], client=client
+            )
+    finally:
+        agent.transport.close()
+
+    assert results[1]["cpu_load"] == 12
+    assert isinstance(results[2], snmp.SnmpError)
+
+@pytest.mark.anyio
+async def test_many_devices_concurrently():
+    agents = await start_fleet(300, latency=0.05)
+    try:
+        started = time.perf_counter()
+        results = await snmp.collect_health_many([_device(i, agent.port) for i, agent in enumerate(agents)])
+        elapsed = time.perf_counter() - started
+    finally:
+        for agent in agents:
+            agent.transport.close()
+
+    assert not [r for r in results.values() if isinstance(r, Exception)]
+    # En serie serían 300 x 50 ms = 15 s
+    assert elapsed < 5
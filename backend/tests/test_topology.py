@@ -0,0 +1,39 @@
+import time
+
+from app.services.topology import NO_PARENT, TopologyIndex, build_parent_index
+
+def test_parents_follow_shortest_path_from_flagged_root():
+    # 1 - 2 - 3 - 4 y un atajo 1 - 4; 5 - 6 en otro componente sin raíz
+    edges = [(1, 2), (2, 3), (3, 4), (1, 4), (5, 6)]
+    parents = build_parent_index(range(1, 7), edges, roots=[1])
+
+    assert parents[1] == NO_PARENT
+    assert parents[2] == 1 and parents[4] == 1 and parents[3] in (2, 4)
+    # Sin raíz marcada: el de mayor grado, y a igualdad el de menor id
+    assert parents[5] == NO_PARENT and parents[6] == 5
+
+def test_descendants_point_to_nearest_down_ancestor():
+    index = TopologyIndex({1: NO_PARENT, 2: 1, 3: 2, 4: 3, 5: 1, 6: NO_PARENT})
+
+    assert index.descendant_count(1) == 4
+    assert index.depth(4) == 3
+    assert index.down_ancestor(4, {1}) == 1
+    assert index.down_ancestor(4, {1, 3}) == 3
+    assert index.down_ancestor(1, {1}) is None
+    assert sorted(index.descendants(1)) == [2, 3, 4, 5]
+    assert [index.down_ancestor(i, {6}) for i in range(1, 7)] == [None] * 6
+
+def test_traversal_stays_fast_for_large_fleets():
+    # 50k equipos: árbol con 10 hijos por nodo y enlaces redundantes
+    size = 50_000
+    edges = [(i, (i - 1) // 10) for i in range(1, size)]
+    edges += [(i, i + 1) for i in range(0, size - 1, 97)]
+
+    started = time.perf_counter()
+    index = TopologyIndex(build_parent_index(range(size), edges, roots=[0]))
+    ancestors = [index.down_ancestor(i, {1, 2, 3}) for i in range(size)]
+    elapsed = time.perf_counter() - started
+
+    assert len(index) == size
+    assert sum(a is not None for a in ancestors) == sum(index.descendant_count(i) for i in (1, 2, 3))
+    assert elapsed < 2.0